@@ -0,0 +1,85 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Memory per gunicorn worker for a growing number of workers
+# usage: python benchmark_worker_memory.py 1 2 4 8
+
+BIND = os.environ.get("BENCHMARK_BIND", "127.0.0.1:8765")
+
+
+def memory(pid: int) -> dict:
+    # kB values from smaps_rollup: rss, pss (shared pages split between processes) and private (uss)
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def children(pid: int) -> list:
+    # parent pid is the 4th field of /proc/<pid>/stat, after the parenthesized command
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def wait_ready(master: subprocess.Popen, workers: int, timeout: float = 600):
+    # every worker forked and one of them answers ready
+    start = time.time()
+    while time.time() - start < timeout:
+        if master.poll() is not None:
+            raise Exception(f"gunicorn exited with {master.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://{BIND}/health/ready") as res:
+                if res.status == 200 and len(children(master.pid)) >= workers:
+                    return
+        except Exception:
+            pass
+        time.sleep(1)
+    raise Exception("server not ready")
+
+
+def run(workers: int):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=BIND)
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"], env=env)
+    try:
+        wait_ready(master, workers)
+        time.sleep(2)
+        pids = children(master.pid)
+        usage = [memory(pid) for pid in pids]
+        mb = 1024
+        print(f"{workers:>7} {memory(master.pid)['rss'] / mb:>10.1f}"
+              f" {sum(u['rss'] for u in usage) / len(usage) / mb:>10.1f}"
+              f" {sum(u['pss'] for u in usage) / len(usage) / mb:>10.1f}"
+              f" {sum(u['uss'] for u in usage) / len(usage) / mb:>10.1f}")
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait()
+
+
+if __name__ == "__main__":
+    counts = [int(n) for n in sys.argv[1:]] or [1, 2, 4, 8]
+    print(f"preload_app={os.environ.get('PRELOAD_APP', 'true')}")
+    print(f"{'workers':>7} {'master MB':>10} {'rss MB':>10} {'pss MB':>10} {'uss MB':>10}")
+    for n in counts:
+        run(n)
@@ -0,0 +1,22 @@
+from dotenv import load_dotenv
+import sqlalchemy
+import os
+import sys
+from src.predictor import Predictior
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(dotenv_path)
+
+DB_HOST = os.environ.get("DB_HOST")
+DB_USERNAME = os.environ.get("DB_USERNAME")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+MODEL_PATH = os.environ.get("MODEL_PATH")
+
+# Write the current version 0 models of GN and GP to one bundle file
+# usage: python export_bundle.py [output.zip]
+if __name__ == "__main__":
+    conn = sqlalchemy.create_engine(
+        f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/antimicrobial_system")
+    predictor = Predictior(conn, MODEL_PATH, lazy=True)
+    path = predictor.export_bundle(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"exported {path}")
@@ -0,0 +1,32 @@
+import gc
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# main.py splits CPU_BUDGET between the workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Load models and tables once in the master, workers share them copy-on-write
+preload_app = os.environ.get("PRELOAD_APP", "true").lower() == "true"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import main
+    from src import repository
+
+    # lazy mode would only load after the fork, load everything in the master
+    if not main.warmed_up():
+        main.warm_up()
+
+    # runs in the master before the first fork, pooled connections must not be shared with workers
+    repository.dispose()
+
+    # keep the garbage collector from touching (and copying) the shared objects
+    gc.collect()
+    gc.freeze()
+    server.log.info("models and tables preloaded, %d objects frozen",
+                    gc.get_freeze_count())
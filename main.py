@@ -1,21 +1,42 @@
-from fastapi import Depends, FastAPI, File, UploadFile, BackgroundTasks
+from fastapi import Depends, FastAPI, File, UploadFile, BackgroundTasks, Request, Response
 import pandas as pd
 from dotenv import load_dotenv
-import sqlalchemy
 import os
 import time
 import datetime
 import copy
 import shutil
 import asyncio
+import logging
+import queue
+import threading
+import anyio
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
 from src.utility import cleanSubmittedSample
 from src.model import PetDetail
-from src.predictor import Predictior
+from src.predictor import Predictior, PredictorState, EXPLAIN_TOP_MAX
+from src.predict_dispatcher import PredictDispatcher
+from src.prediction_cache import PredictionCache
+from src.model_group_registry import ModelGroupRegistry
+from src.shadow_scorer import ShadowScorer
+from src.thread_budget import ThreadBudget
+from src.admission_control import AdmissionControl, Overloaded
+from src.background_executor import BackgroundExecutor
+from src.answer_table import AnswerTable, report_inputs
+from src.prediction_log import PredictionLog
+from src.drift_monitor import DriftMonitor
+from src.metrics import metrics, instrument_engine, MetricsMiddleware
+from src.reference_cache import ReferenceCache
 from src.table_to_csv import TableToCsv
 from src.upload_validator import UploadValidator
 from src.upload_tranformation import UploadTranformation
 from src.model_training import ModelRetraining
 from src.retraining_status import check_retraining_status
+from src.submitted_sample_latest import load_submitted_sample_latest
+from src.json_response import FastJSONResponse
+from src import repository
+from src.repository import fetch_all, fetch_scalar, fetch_column, fetch_frame, run, run_many, append_frame
 from fastapi.middleware.cors import CORSMiddleware
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -26,6 +47,48 @@ DB_USERNAME = os.environ.get("DB_USERNAME")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
 ORIGINS = os.environ.get("ORIGINS")
 MODEL_PATH = os.environ.get("MODEL_PATH")
+PREDICT_BATCHING = os.environ.get("PREDICT_BATCHING", "false").lower() == "true"
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 3))
+PREDICT_BATCH_SIZE = int(os.environ.get("PREDICT_BATCH_SIZE", 32))
+PREDICT_QUEUE_SIZE = int(os.environ.get("PREDICT_QUEUE_SIZE", 1024))
+PREDICT_CACHE_SIZE = int(os.environ.get("PREDICT_CACHE_SIZE", 4096))
+PREDICT_CACHE_TTL = float(os.environ.get("PREDICT_CACHE_TTL", 3600))
+STARTUP_WORKERS = int(os.environ.get("STARTUP_WORKERS", 4))
+STARTUP_LAZY = os.environ.get("STARTUP_MODE", "eager").lower() == "lazy"
+PREDICTOR_BUNDLE = os.environ.get("PREDICTOR_BUNDLE")
+PREDICT_ENGINE = os.environ.get("PREDICT_ENGINE", "xgboost").lower() == "tree"
+CPU_BUDGET = int(os.environ.get("CPU_BUDGET", os.cpu_count() or 1))
+# gunicorn.conf.py sets it for the workers, a single uvicorn process is 1
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 1))
+TRAINING_THREADS = int(os.environ.get("TRAINING_THREADS", 0)) or None
+PREDICT_MAX_IN_FLIGHT = int(os.environ.get("PREDICT_MAX_IN_FLIGHT", 0)) or None
+PREDICT_MAX_WAITING = int(os.environ.get("PREDICT_MAX_WAITING", 64))
+PREDICT_WAIT_TIMEOUT = float(os.environ.get("PREDICT_WAIT_TIMEOUT", 1))
+PREDICT_RETRY_AFTER = int(os.environ.get("PREDICT_RETRY_AFTER", 1))
+BACKGROUND_WORKERS = int(os.environ.get("BACKGROUND_WORKERS", 4))
+BACKGROUND_NICE = int(os.environ.get("BACKGROUND_NICE", 10))
+ANSWER_TABLE_SIZE = int(os.environ.get("ANSWER_TABLE_SIZE", 1000))
+EXPLAIN_CACHE_SIZE = int(os.environ.get("EXPLAIN_CACHE_SIZE", 1024))
+PREDICTION_LOG_SIZE = int(os.environ.get("PREDICTION_LOG_SIZE", 10000))
+PREDICTION_LOG_BATCH = int(os.environ.get("PREDICTION_LOG_BATCH", 500))
+PREDICTION_LOG_INTERVAL = float(os.environ.get("PREDICTION_LOG_INTERVAL", 1))
+DRIFT_CHECKPOINT_INTERVAL = float(os.environ.get("DRIFT_CHECKPOINT_INTERVAL", 300))
+REFERENCE_CACHE_TTL = float(os.environ.get("REFERENCE_CACHE_TTL", 300))
+MODEL_REGISTRY_MEMORY_MB = float(os.environ.get("MODEL_REGISTRY_MEMORY_MB", 512))
+SHADOW_WORKERS = int(os.environ.get("SHADOW_WORKERS", 2))
+SHADOW_FLUSH_INTERVAL = float(os.environ.get("SHADOW_FLUSH_INTERVAL", 60))
+SHADOW_QUEUE_SIZE = int(os.environ.get("SHADOW_QUEUE_SIZE", 256))
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", 32))
+# one connection per request thread, the overflow covers the background threads
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", THREADPOOL_SIZE))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", BACKGROUND_WORKERS + SHADOW_WORKERS + STARTUP_WORKERS + 2))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_PREPARE = os.environ.get("DB_PREPARE", "true").lower() == "true"
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -39,33 +102,188 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-conn = sqlalchemy.create_engine(
-    f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/antimicrobial_system")
+app.add_middleware(MetricsMiddleware)
 
-predictor = Predictior(conn, MODEL_PATH)
+# the engine lives in the repository, every query of the app goes through it
+repository.configure(
+    f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/antimicrobial_system",
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_PREPARE)
+instrument_engine(repository.engine, metrics)
 
-table_csv = {'GN': TableToCsv(conn, 1), 'GP': TableToCsv(conn, 2)}
+# other workers see a new reference row after the TTL at most
+reference_cache = ReferenceCache(REFERENCE_CACHE_TTL, composites=("bootstrap",))
 
+thread_budget = ThreadBudget(CPU_BUDGET, INFERENCE_THREADS, TRAINING_THREADS, WEB_CONCURRENCY)
+# admission limit derived from the budget unless set, only thread limits set over the budget stop the start
+PREDICT_MAX_IN_FLIGHT = PREDICT_MAX_IN_FLIGHT or thread_budget.max_in_flight()
+thread_budget.check(PREDICT_MAX_IN_FLIGHT, strict=any(
+    name in os.environ for name in ["INFERENCE_THREADS", "TRAINING_THREADS", "PREDICT_MAX_IN_FLIGHT"]))
 
-@app.get("/api/species")
-def species():
-    species = pd.read_sql_query(
-        "SELECT id , name FROM public.species", conn)
+admission = AdmissionControl(
+    PREDICT_MAX_IN_FLIGHT, PREDICT_MAX_WAITING, PREDICT_WAIT_TIMEOUT)
+
+# uploading and training run here instead of the request threadpool
+background_executor = BackgroundExecutor(BACKGROUND_WORKERS, BACKGROUND_NICE)
+
+prediction_cache = PredictionCache(
+    PREDICT_CACHE_SIZE, PREDICT_CACHE_TTL) if PREDICT_CACHE_SIZE > 0 else None
+
+explain_cache = PredictionCache(
+    EXPLAIN_CACHE_SIZE, PREDICT_CACHE_TTL) if EXPLAIN_CACHE_SIZE > 0 else None
+
+answer_table = AnswerTable(ANSWER_TABLE_SIZE)
+
+
+def answer_inputs(v_id: int):
+    # most frequent inputs of the reports the served models were trained on get a precomputed answer
+    table = table_csv[['GN', 'GP'][v_id]].ensure_startup().table
+    file_id = fetch_column(repository.engine, repository.query_current_model_group_file, v_id=v_id + 1)
+    return report_inputs(table[table["file_id"].isin(file_id)])
+
+
+# inference nodes started from a bundle have no reports
+predictor = Predictior(repository.engine, MODEL_PATH, prediction_cache,
+                       STARTUP_WORKERS, lazy=True, bundle=PREDICTOR_BUNDLE, engine=PREDICT_ENGINE,
+                       thread_budget=thread_budget, answer_table=answer_table,
+                       answer_inputs=answer_inputs if ANSWER_TABLE_SIZE > 0 and PREDICTOR_BUNDLE is None else None,
+                       explain_cache=explain_cache)
+
+table_csv = {'GN': TableToCsv(repository.engine, 1, STARTUP_WORKERS, lazy=True),
+             'GP': TableToCsv(repository.engine, 2, STARTUP_WORKERS, lazy=True)}
+
+model_registry = ModelGroupRegistry(predictor, MODEL_REGISTRY_MEMORY_MB)
+
+# the candidate version is stored in the database, inference nodes started from a bundle have none
+shadow_scorer = ShadowScorer(predictor, model_registry, repository.engine, SHADOW_WORKERS,
+                             SHADOW_FLUSH_INTERVAL, SHADOW_QUEUE_SIZE) if PREDICTOR_BUNDLE is None else None
+
+dispatcher = PredictDispatcher(predictor, PREDICT_BATCH_WINDOW_MS, PREDICT_BATCH_SIZE,
+                               PREDICT_QUEUE_SIZE) if PREDICT_BATCHING else None
+
+# inference nodes started from a bundle do not write to the database
+prediction_log = PredictionLog(repository.engine, PREDICTION_LOG_SIZE, PREDICTION_LOG_BATCH,
+                               PREDICTION_LOG_INTERVAL) if PREDICTION_LOG_SIZE > 0 and PREDICTOR_BUNDLE is None else None
+
+drift_monitor = DriftMonitor(
+    repository.engine, DRIFT_CHECKPOINT_INTERVAL) if PREDICTOR_BUNDLE is None else None
+
+startup_status = {"error": None}
+
+
+def warmed_up() -> bool:
+    return predictor.ready() and (PREDICTOR_BUNDLE is not None or all(
+        table.loaded for table in table_csv.values()))
+
+
+def warm_up():
+    # Load models and tables in parallel
+    startup_time = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(predictor.warm_up)]
+            # inference nodes started from a bundle do not touch the database
+            if PREDICTOR_BUNDLE is None:
+                futures += [executor.submit(table.ensure_startup)
+                            for table in table_csv.values()]
+            for future in futures:
+                future.result()
+    except Exception as ex:
+        startup_status["error"] = str(ex)
+        logger.exception("startup failed")
+        raise
+    logger.info("startup finished in %.2fs",
+                time.perf_counter() - startup_time)
+
+
+# Eager mode loads everything before serving, lazy mode warms up in the background
+if not STARTUP_LAZY:
+    warm_up()
+
+
+@app.on_event("startup")
+async def set_threadpool_size():
+    # sync endpoints run in the anyio threadpool, the connection pool is sized to it
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+@app.on_event("startup")
+def start_warm_up():
+    # nothing left to load in a worker forked from a preloaded master
+    if STARTUP_LAZY and not warmed_up():
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def flush_shadow_scores():
+    if shadow_scorer is not None:
+        shadow_scorer.flush()
+
+
+@app.on_event("shutdown")
+def flush_prediction_log():
+    if prediction_log is not None:
+        prediction_log.flush()
+    if drift_monitor is not None:
+        drift_monitor.checkpoint()
+
+
+# ---------- HEALTH ----------
+
+
+@app.get("/health/live")
+def health_live():
+    return {
+        "status": "success"
+    }
+
+
+@app.get("/health/ready")
+def health_ready(response: Response):
+    ready = warmed_up()
+    if not ready:
+        response.status_code = 503
+    return {
+        "status": "success" if ready else "fail",
+        "data": {
+            "models": predictor.ready(),
+            "tables": {vitek: table.loaded for vitek, table in table_csv.items()},
+            "error": startup_status["error"]
+        }
+    }
+
+
+def reference_response(request: Request, response: Response, key: tuple, loader):
+    # Cached payload with a strong ETag, a matching If-None-Match gets 304
+    payload, etag = reference_cache.get(key, loader)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and (if_none_match.strip() == "*" or etag in [
+            tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return payload
+
+
+def load_species():
+    species = fetch_all(repository.engine, repository.query_species)
     return {
         "status": "success",
         "data": {
             "species": [{
                 'id': row[0],
                 'name': row[1]
-            } for row in species.values]
+            } for row in species]
         }
     }
 
 
-@app.get("/api/vitek_id")
-def vitek_id():
-    vitek_id = pd.read_sql_query(
-        "SELECT id , name FROM public.vitek_id_card", conn)
+@app.get("/api/species")
+def species(request: Request, response: Response):
+    return reference_response(request, response, ("species",), load_species)
+
+
+def load_vitek_id():
+    vitek_id = fetch_all(repository.engine, repository.query_vitek_id)
     return {
         "status": "success",
         "data": {
@@ -73,16 +291,19 @@ def vitek_id():
                 {
                     'id': row[0],
                     'name': row[1]
-                } for row in vitek_id.values
+                } for row in vitek_id
             ]
         }
     }
 
 
-@app.get("/api/bacteria_genus")
-def bacteria_genus():
-    bacteria_genus = pd.read_sql_query(
-        "SELECT id , name FROM public.bacteria_genus", conn)
+@app.get("/api/vitek_id")
+def vitek_id(request: Request, response: Response):
+    return reference_response(request, response, ("vitek_id",), load_vitek_id)
+
+
+def load_bacteria_genus():
+    bacteria_genus = fetch_all(repository.engine, repository.query_bacteria_genus)
     return {
         "status": "success",
         "data": {
@@ -90,63 +311,37 @@ def bacteria_genus():
                 {
                     'id': row[0],
                     'name': row[1]
-                } for row in bacteria_genus.values
+                } for row in bacteria_genus
             ]
         }
     }
 
 
-@app.get("/api/submitted_sample")
-def submitted_sample():
-    submitted_sample_binning_latest = pd.read_sql_query(
-        """
-        SELECT public.submitted_sample_binning_model_group.schema
-	    FROM public.submitted_sample_binning_model_group
-	    INNER JOIN public.model_group ON public.model_group.id = public.submitted_sample_binning_model_group.model_group_id
-	    WHERE (public.model_group.vitek_id , public.model_group.version) IN (
-		    SELECT vitek_id , MAX(version)
-		    FROM public.model_group
-		    GROUP BY vitek_id);
-        """, conn)
-
-    submitted_all = set()
-    for sub_sam in submitted_sample_binning_latest.values:
-        submitted_all.update(set(eval(sub_sam[0])))
-
-    query = sqlalchemy.text(
-        "SELECT id , name FROM public.submitted_sample WHERE name IN :sub_all")
-
-    submitted_sample = pd.read_sql_query(
-        query, conn, params={'sub_all': tuple(submitted_all)})
+@app.get("/api/bacteria_genus")
+def bacteria_genus(request: Request, response: Response):
+    return reference_response(request, response, ("bacteria_genus",), load_bacteria_genus)
 
+
+def load_submitted_sample():
     return {
         "status": "success",
         "data": {
-            "submitted_sample": [
-                {
-                    'id': row[0],
-                    'name': row[1]
-                } for row in submitted_sample.values
-            ]
+            "submitted_sample": load_submitted_sample_latest(repository.engine)
         }
     }
 
 
-@app.get("/api/antimicrobial_sir")
-def antimicrobial_sir(v_id):
-    query = sqlalchemy.text(
-        "SELECT id , name , sir_type_id FROM public.antimicrobial_sir WHERE vitek_id = :v_id")
-    antimicrobial_sir = pd.read_sql_query(query, conn, params={"v_id": v_id})
+@app.get("/api/submitted_sample")
+def submitted_sample(request: Request, response: Response):
+    return reference_response(request, response, ("submitted_sample",), load_submitted_sample)
 
-    query = sqlalchemy.text(
-        "SELECT id , name FROM public.sir_type WHERE id IN :sir_type")
-    sir_type = pd.read_sql_query(
-        query, con=conn, params={"sir_type": tuple(int(i) for i in antimicrobial_sir["sir_type_id"].unique())})
 
-    query = sqlalchemy.text(
-        "SELECT id , sir_type_id ,  symbol FROM public.sir_sub_type WHERE sir_type_id IN :sir_sub_type")
-    sir_sub_type = pd.read_sql_query(
-        query, con=conn, params={"sir_sub_type": tuple(int(i) for i in antimicrobial_sir["sir_type_id"].unique())})
+def load_antimicrobial_sir(v_id):
+    antimicrobial_sir = fetch_all(repository.engine, repository.query_antimicrobial_sir, v_id=v_id)
+
+    sir_type_id = tuple(sorted(set(row[2] for row in antimicrobial_sir)))
+    sir_type = fetch_all(repository.engine, repository.query_sir_type, sir_type=sir_type_id)
+    sir_sub_type = fetch_all(repository.engine, repository.query_sir_sub_type, sir_sub_type=sir_type_id)
 
     return {
         "status": "success",
@@ -156,7 +351,7 @@ def antimicrobial_sir(v_id):
                     "id": row[0],
                     "name": row[1],
                     "sir_type": row[2]
-                } for row in antimicrobial_sir.values],
+                } for row in antimicrobial_sir],
             "sir_type": [
                 {
                     "id": row[0],
@@ -166,16 +361,44 @@ def antimicrobial_sir(v_id):
                             "id": sub_row[0],
                             "name": sub_row[2]
                         }
-                        for sub_row in sir_sub_type.values if sub_row[1] == row[0]
+                        for sub_row in sir_sub_type if sub_row[1] == row[0]
                     ]
-                } for row in sir_type.values]
+                } for row in sir_type]
         }
     }
 
 
-@app.post("/api/predict")
-def predict(petDetail: PetDetail):
+@app.get("/api/antimicrobial_sir")
+def antimicrobial_sir(v_id, request: Request, response: Response):
+    return reference_response(request, response, ("antimicrobial_sir", str(v_id)),
+                              lambda: load_antimicrobial_sir(v_id))
+
+
+def load_bootstrap():
+    # Every part comes from its own cache entry, only the missing ones are queried
+    vitek_id = reference_cache.get(("vitek_id",), load_vitek_id)[0]
+    return {
+        "status": "success",
+        "data": {
+            "species": reference_cache.get(("species",), load_species)[0]["data"]["species"],
+            "vitek_id": vitek_id["data"]["vitek_id"],
+            "bacteria_genus": reference_cache.get(("bacteria_genus",), load_bacteria_genus)[0]["data"]["bacteria_genus"],
+            "submitted_sample": reference_cache.get(("submitted_sample",), load_submitted_sample)[0]["data"]["submitted_sample"],
+            "antimicrobial_sir": {
+                str(row["id"]): reference_cache.get(("antimicrobial_sir", str(row["id"])),
+                                                    lambda: load_antimicrobial_sir(row["id"]))[0]["data"]
+                for row in vitek_id["data"]["vitek_id"]
+            }
+        }
+    }
+
+
+@app.get("/api/bootstrap")
+def bootstrap(request: Request, response: Response):
+    return reference_response(request, response, ("bootstrap",), load_bootstrap)
 
+
+def to_predict_data(petDetail: PetDetail):
     species = petDetail.species.lower().strip()
     bact_genus = petDetail.bact_genus.lower().strip()
     submitted_sample = cleanSubmittedSample(petDetail.submitted_sample.lower(
@@ -193,23 +416,275 @@ def predict(petDetail: PetDetail):
                                                 'NEG': '-'}.get(value, value)
 
     v_id = {"GN": 0, "GP": 1}.get(vitek_id, -1)
+    return data, v_id
+
+
+def predict_scores(data: dict, v_id: int, state: PredictorState = None) -> dict:
+    # Score of every antimicrobial, the caller keeps the state and logs its model group with the scores
+    if dispatcher is not None:
+        try:
+            return dispatcher.predict(data, v_id, state)
+        except queue.Full:
+            pass
+    return predictor.score_batch([data], v_id, state)[0]
+
+
+def overloaded(response: Response):
+    response.status_code = 503
+    response.headers["Retry-After"] = str(PREDICT_RETRY_AFTER)
+    return {
+        "status": "fail",
+        "message": "server is busy, retry later."
+    }
+
+
+@app.post("/api/predict")
+def predict(petDetail: PetDetail, response: Response, version: int = None):
+    with metrics.timer("predictor_stage_duration_seconds", stage="normalize"):
+        data, v_id = to_predict_data(petDetail)
+
+    if v_id == -1:
+        return {
+            "status": "fail",
+            "message": "vitek_id must have GN or GP only."
+        }
+
+    if version is not None and version < 0:
+        return {
+            "status": "fail",
+            "message": "version must be 0 or more."
+        }
 
     # predict answer
-    if v_id != -1:
-        result = predictor.predict(pd.Series(data), v_id)
+    start = time.perf_counter()
+    try:
+        with admission.admit():
+            if version is None or version == 0:
+                state = predictor.ensure_state()
+                scores = predict_scores(data, v_id, state)
+                # candidate version scores the same input in the background
+                if shadow_scorer is not None:
+                    shadow_scorer.submit(data, v_id)
+            else:
+                # historical model group
+                state = model_registry.get(v_id, version)
+                if state is None:
+                    return {
+                        "status": "fail",
+                        "message": f"version {version} not found."
+                    }
+                scores = predict_scores(data, v_id, state)
+    except Overloaded:
+        return overloaded(response)
+    result = predictor.answers([scores], state)[0]
+    if prediction_log is not None:
+        # every score of the model group, not only the recommended ones
+        prediction_log.record(data, v_id, state.model_groups[v_id], scores, result,
+                              time.perf_counter() - start)
+    if drift_monitor is not None:
+        drift_monitor.update(data, v_id)
+    return {
+        "status": "success",
+        "data":
+        {
+            "answers": result
+        }
+    }
+
+
+@app.post("/api/predict_explain")
+def predict_explain(petDetail: PetDetail, response: Response, top: int = 5, version: int = None):
+    data, v_id = to_predict_data(petDetail)
+
+    if v_id == -1:
         return {
-            "status": "success",
-            "data":
-            {
-                "answers": result
+            "status": "fail",
+            "message": "vitek_id must have GN or GP only."
+        }
+
+    if top < 1 or top > EXPLAIN_TOP_MAX:
+        return {
+            "status": "fail",
+            "message": f"top must be between 1 and {EXPLAIN_TOP_MAX}."
+        }
+
+    if version is not None and version < 0:
+        return {
+            "status": "fail",
+            "message": "version must be 0 or more."
+        }
+
+    # contributions of each recommended antimicrobial
+    try:
+        with admission.admit():
+            state = None
+            if version is not None and version != 0:
+                state = model_registry.get(v_id, version)
+                if state is None:
+                    return {
+                        "status": "fail",
+                        "message": f"version {version} not found."
+                    }
+            result = predictor.explain_batch([data], v_id, top, state)[0]
+    except Overloaded:
+        return overloaded(response)
+    return {
+        "status": "success",
+        "data":
+        {
+            "explanations": result
+        }
+    }
+
+
+@app.post("/api/predict_batch")
+def predict_batch(petDetails: List[PetDetail], response: Response):
+    results = [{
+        "status": "fail",
+        "message": "vitek_id must have GN or GP only."
+    } for _ in petDetails]
+
+    # group by vitek, one feature matrix per vitek
+    batch = {}
+    for i, petDetail in enumerate(petDetails):
+        data, v_id = to_predict_data(petDetail)
+        if v_id != -1:
+            batch.setdefault(v_id, []).append((i, data))
+
+    # predict answer
+    try:
+        with admission.admit():
+            for v_id, items in batch.items():
+                answers = predictor.predict_batch(
+                    [data for _, data in items], v_id)
+                for (i, _), answer in zip(items, answers):
+                    results[i] = {
+                        "status": "success",
+                        "answers": answer
+                    }
+    except Overloaded:
+        return overloaded(response)
+
+    return {
+        "status": "success",
+        "data":
+        {
+            "results": results
+        }
+    }
+
+
+def component_stats():
+    return {
+        "dispatcher": dispatcher.stats() if dispatcher is not None else None,
+        "cache": prediction_cache.stats() if prediction_cache is not None else None,
+        "explain_cache": explain_cache.stats() if explain_cache is not None else None,
+        "answer_table": answer_table.stats() if predictor.answer_table is not None else None,
+        "registry": model_registry.stats(),
+        "threads": thread_budget.stats(),
+        "prediction_log": prediction_log.stats() if prediction_log is not None else None,
+        "drift": drift_monitor.stats() if drift_monitor is not None else None,
+        "admission": admission.stats(),
+        "reference_cache": reference_cache.stats(),
+        "background": background_executor.stats(),
+        "db_pool": repository.stats(repository.engine),
+        "tree_engine": {vitek: predictor.state is not None and predictor.state.engines[v_id] is not None
+                        for v_id, vitek in enumerate(["GN", "GP"])}
+    }
+
+
+@app.get("/api/predict_stats")
+def predict_stats():
+    return {
+        "status": "success",
+        "data": component_stats()
+    }
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Prometheus text format, latency histograms plus the component stats
+    gauges = component_stats()
+    if shadow_scorer is not None:
+        gauges["shadow"] = shadow_scorer.stats()
+    return Response(content=metrics.render(gauges),
+                    media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/drift")
+def drift(vitek_id: int, hours: float = 24):
+    if drift_monitor is None or vitek_id not in [1, 2]:
+        return {
+            "status": "fail",
+        }
+
+    # value counts of the latest model group, computed when the table or models load
+    training = table_csv[['GN', 'GP'][vitek_id - 1]].ensure_startup().training
+
+    since = datetime.datetime.now() - datetime.timedelta(hours=hours)
+    live = drift_monitor.live(vitek_id - 1, since)
+    return {
+        "status": "success",
+        "data": {
+            "since": since,
+            "features": drift_monitor.compare(live, training)
+        }
+    }
+
+
+# ---------- SHADOW ----------
+
+
+@app.post("/api/shadow_candidate")
+def shadow_candidate(vitek_id: int, version: int = None):
+    v_id = vitek_id - 1
+    if shadow_scorer is None:
+        return {
+            "status": "fail",
+        }
+
+    if v_id not in [0, 1]:
+        return {
+            "status": "fail",
+            "message": "vitek_id must have 1 or 2 only."
+        }
+
+    if version is not None and version < 0:
+        return {
+            "status": "fail",
+            "message": "version must be 0 or more."
+        }
+
+    if version is not None and version != 0:
+        state = model_registry.get(v_id, version)
+        if state is None:
+            return {
+                "status": "fail",
+                "message": f"version {version} not found."
             }
+    shadow_scorer.set_candidate(v_id, version)
+    return {
+        "status": "success",
+        "data": {
+            "candidates": shadow_scorer.stats()["candidates"]
         }
-    else:
+    }
+
+
+@app.get("/api/shadow_stats")
+def shadow_stats():
+    if shadow_scorer is None:
         return {
             "status": "fail",
-            "message": "vitek_id must have GN or GP only."
         }
 
+    shadow_scorer.flush()
+    shadow_scorer.refresh_candidates()
+    return {
+        "status": "success",
+        "data": shadow_scorer.stats()
+    }
+
 
 # ---------- UPLOAD  ----------
 
@@ -217,45 +692,28 @@ def uploading(vitek_id: int, uploadfile: dict):
     # uploadfile = {"id": id_upload, "filename": in_file.filename,
     #               "filepath": filepath}
     def first_queue():
-        with conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-            SELECT MIN(id)
-            FROM public.upload_file_log 
-            WHERE vitek_id = :v_id AND (status = 'pending' OR status = 'uploading')
-            """)
-            rs = con.execute(
-                query, id=uploadfile["id"], v_id=vitek_id)
-            for row in rs:
-                file_id = row[0]
-        return file_id
+        return fetch_scalar(repository.engine, repository.query_first_upload, v_id=vitek_id)
 
     while uploadfile['id'] != first_queue():
         time.sleep(30)
 
     uploadfile["start_date"] = datetime.datetime.now()
-    with conn.connect() as con:
-        query = sqlalchemy.text(
-            """
-            UPDATE public.upload_file_log
-            SET start_date=:s_date, status='uploading'
-            WHERE id = :id""")
-        con.execute(query, id=uploadfile["id"],
-                    s_date=uploadfile['start_date'])
+    run(repository.engine, repository.query_start_upload, id=uploadfile["id"],
+        s_date=uploadfile['start_date'])
 
     def upload_result_func(detail: list, type: str, log_id: int):
         res = pd.DataFrame(detail, columns=["detail"])
         res["type"] = type
         res["upload_file_log_id"] = log_id
-        res.to_sql('upload_file_result', schema='public',
-                   con=conn, if_exists='append', index=False)
+        append_frame(repository.engine, 'upload_file_result', res)
 
     file_upload = pd.read_csv(uploadfile["filepath"])
     # reset index
     file_upload.index = file_upload.index + 2  # start at 1 + header
 
     vitek = ['GN', 'GP'][vitek_id - 1]
-    upload_validator = UploadValidator(table_csv[vitek], vitek_id)
+    upload_validator = UploadValidator(
+        table_csv[vitek].ensure_startup(), vitek_id)
     result = upload_validator.validate(file_upload)
     if result[0]:
         # File Result
@@ -263,24 +721,16 @@ def uploading(vitek_id: int, uploadfile: dict):
             upload_result_func(result[2], result[1], uploadfile["id"])
 
         # File
-        with conn.connect() as con:
-            query = sqlalchemy.text(
-                "INSERT INTO public.file(name, upload_at,active,vitek_id) VALUES (:name, :date, true , :v_id) RETURNING id;")
-            rs = con.execute(query, name=uploadfile["filename"],
-                             date=uploadfile["start_date"], v_id=vitek_id)
-            for row in rs:
-                file_id = row[0]
+        file_id = fetch_scalar(repository.engine, repository.query_insert_file, name=uploadfile["filename"],
+                               date=uploadfile["start_date"], v_id=vitek_id)
 
         # Report
-        uploader = UploadTranformation(vitek_id, conn)
+        uploader = UploadTranformation(vitek_id, repository.engine, reference_cache)
         try:
             row_count = uploader.upload(file_upload, file_id)
 
             # Add Row Count File
-            with conn.connect() as con:
-                query = sqlalchemy.text(
-                    "UPDATE public.file SET amount_row = :count WHERE id = :id")
-                rs = con.execute(query, count=row_count, id=file_id)
+            run(repository.engine, repository.query_file_amount_row, count=row_count, id=file_id)
 
             # Reload Table
             table_csv[vitek].startup()
@@ -298,14 +748,8 @@ def uploading(vitek_id: int, uploadfile: dict):
     # Update Filelog
     finish_date = datetime.datetime.now()
     delta_time = (finish_date - uploadfile["start_date"]).seconds
-    with conn.connect() as con:
-        query = sqlalchemy.text(
-            """
-            UPDATE public.upload_file_log
-            SET finish_date=:f_date, "time"=:time, amount_row=:count, status=:status
-            WHERE id = :id""")
-        rs = con.execute(query, id=uploadfile["id"], f_date=finish_date,
-                         time=delta_time, count=row_count, status=status)
+    run(repository.engine, repository.query_finish_upload, id=uploadfile["id"], f_date=finish_date,
+        time=delta_time, count=row_count, status=status)
 
     # Delete Temp File
     os.remove(uploadfile["filepath"])
@@ -314,7 +758,7 @@ def uploading(vitek_id: int, uploadfile: dict):
 
 @app.post("/api/upload")
 def upload(vitek_id: int, background_tasks: BackgroundTasks, in_file: UploadFile = File(...)):
-    if vitek_id not in pd.read_sql_query("SELECT id FROM public.vitek_id_card", conn).values:
+    if vitek_id not in [row[0] for row in fetch_all(repository.engine, repository.query_vitek_id)]:
         return {
             "status": "fail",
         }
@@ -323,16 +767,12 @@ def upload(vitek_id: int, background_tasks: BackgroundTasks, in_file: UploadFile
     filepath = f"./upload_file/{hash(start_time)}_{in_file.filename}"
     with open(filepath, mode="wb") as out_file:
         shutil.copyfileobj(in_file.file, out_file)
-    with conn.connect() as con:
-        query = sqlalchemy.text(
-            "INSERT INTO public.upload_file_log(filename,status , vitek_id) VALUES (:filename, 'pending' , :vitek_id) RETURNING id;")
-        rs = con.execute(query, filename=in_file.filename, vitek_id=vitek_id)
-        for row in rs:
-            id_upload = row[0]
+    id_upload = fetch_scalar(repository.engine, repository.query_insert_upload_file_log,
+                             filename=in_file.filename, vitek_id=vitek_id)
     uploadfile = {"id": id_upload, "filename": in_file.filename,
                   "filepath": filepath}
     background_tasks.add_task(
-        uploading, vitek_id, uploadfile)
+        background_executor.submit, uploading, vitek_id, uploadfile)
     return {
         "status": "success",
         "data":
@@ -342,285 +782,182 @@ def upload(vitek_id: int, background_tasks: BackgroundTasks, in_file: UploadFile
     }
 
 
-@app.get("/api/upload_logs")
+@app.get("/api/upload_logs", response_class=FastJSONResponse)
 def upload_logs(page: int = 1):
     # show list
     AMOUNT_PER_PAGE = 10
     offset = (page - 1) * AMOUNT_PER_PAGE
 
     if offset < 0:
-        return {
+        return FastJSONResponse({
             "status": "fail",
-        }
+        })
 
     # select count
-    with conn.connect() as con:
-        rs = con.execute("SELECT COUNT(*) FROM public.upload_file_log ")
-        for row in rs:
-            count = row[0]
+    count = fetch_scalar(repository.engine, repository.query_count_upload_file_log)
 
     if count == 0:
-        return {
+        return FastJSONResponse({
             "status": "success",
             "data":
             {
                 "logs": [],
                 "total": count
             }
-        }
-
-    query = sqlalchemy.text("""
-        SELECT up.id , up.filename , up.start_date , up.finish_date , up.time , up.amount_row ,up.status , vi.name AS vitek_id
-        FROM public.upload_file_log AS up
-        INNER JOIN public.vitek_id_card AS vi ON up.vitek_id = vi.id
-        ORDER BY finish_date DESC , start_date
-        LIMIT :app
-        OFFSET :offset
-        """)
-    upload_file_logs = pd.read_sql(
-        query, conn, params={"app": AMOUNT_PER_PAGE, "offset": offset})
-
-    query = sqlalchemy.text("""
-        SELECT *
-        FROM public.upload_file_result
-        WHERE upload_file_log_id IN :log_id
-        """)
-
-    upload_file_results = pd.read_sql(
-        query, conn, params={"log_id": tuple(upload_file_logs["id"].tolist())})
-
-    logs = []
-    upload_file_logs = upload_file_logs.set_index("id")
-    for _id in upload_file_logs.index:
-        result_fetch = upload_file_results[upload_file_results["upload_file_log_id"] == _id]
-        result = dict()
-        if len(result_fetch) == 0:
-            result["type"] = "success"
-            result["detail"] = []
-        else:
-            result["type"] = result_fetch["type"].iloc[0]
-            result["detail"] = result_fetch["detail"].tolist()
-        logs.append({
-            "id": int(_id),
-            "filename": upload_file_logs.loc[_id, "filename"],
-            "start_date": upload_file_logs.loc[_id, "start_date"].strftime("%d-%b-%Y %H:%M:%S") if pd.notna(upload_file_logs.loc[_id, "start_date"]) else '-',
-            "finish_date": upload_file_logs.loc[_id, "finish_date"].strftime("%d-%b-%Y %H:%M:%S") if pd.notna(upload_file_logs.loc[_id, "finish_date"]) else '-',
-            "time": int(upload_file_logs.loc[_id, "time"]) if pd.notna(upload_file_logs.loc[_id, "time"]) else '-',
-            "amount_row": int(upload_file_logs.loc[_id, "amount_row"]) if pd.notna(upload_file_logs.loc[_id, "amount_row"]) else '-',
-            "status": upload_file_logs.loc[_id, "status"],
-            "result": result,
-            "vitek_id": upload_file_logs.loc[_id, "vitek_id"]
         })
 
-    return {
+    upload_file_logs = fetch_all(repository.engine, repository.query_upload_logs, app=AMOUNT_PER_PAGE, offset=offset)
+
+    upload_file_results = {}
+    log_ids = tuple(row[0] for row in upload_file_logs)
+    for log_id, result_type, detail in fetch_all(repository.engine, repository.query_upload_file_results, log_id=log_ids) if log_ids else []:
+        result = upload_file_results.setdefault(
+            log_id, {"type": result_type, "detail": []})
+        result["detail"].append(detail)
+
+    logs = [{
+        "id": _id,
+        "filename": filename,
+        "start_date": start_date,
+        "finish_date": finish_date,
+        "time": int(time) if time is not None else '-',
+        "amount_row": int(amount_row) if amount_row is not None else '-',
+        "status": status,
+        "result": upload_file_results.get(_id, {"type": "success", "detail": []}),
+        "vitek_id": vitek_id
+    } for _id, filename, start_date, finish_date, time, amount_row, status, vitek_id in upload_file_logs]
+
+    return FastJSONResponse({
         "status": "success",
         "data":
         {
             "logs": logs,
             "total": count
         }
-    }
+    })
 
 # ---------- VIEW FILENAME  ----------
 
 
-@app.get("/api/view_filename")
+@app.get("/api/view_filename", response_class=FastJSONResponse)
 def view_filename(model_group_id: int):
-    query = sqlalchemy.text("""
-        SELECT f.id , f.name , f.upload_at , f.amount_row
-        FROM public.file AS f
-        INNER JOIN public.model_group_file AS mgf ON f.id = mgf.file_id
-        WHERE mgf.model_group_id = :mg_id
-        ORDER BY upload_at DESC
-        """)
-
-    files_fetch = pd.read_sql_query(query, con=conn, params={
-                                    "mg_id": model_group_id})
-
-    files = []
-    files_fetch = files_fetch.set_index("id")
-    for _id in files_fetch.index:
-        files.append({
-            "id": int(_id),
-            "name": files_fetch.loc[_id, "name"],
-            "timestamp": files_fetch.loc[_id, "upload_at"].strftime("%d-%b-%Y %H:%M:%S"),
-            "amount_row": int(files_fetch.loc[_id, "amount_row"]),
-        })
-    return {
+    files = [{
+        "id": _id,
+        "name": name,
+        "timestamp": timestamp,
+        "amount_row": int(amount_row),
+    } for _id, name, timestamp, amount_row in fetch_all(repository.engine, repository.query_view_filename, mg_id=model_group_id)]
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "files": files,
         }
-    }
+    })
 # ---------- VIEW FILE  ----------
 
 
-@app.get("/api/view_all_files")
+@app.get("/api/view_all_files", response_class=FastJSONResponse)
 def view_all_files(page: int = 1):
     # show list
     AMOUNT_PER_PAGE = 10
     offset = (page - 1) * AMOUNT_PER_PAGE
 
     if offset < 0:
-        return {
+        return FastJSONResponse({
             "status": "fail",
-        }
+        })
 
     # select count
-    with conn.connect() as con:
-        rs = con.execute("SELECT COUNT(*) FROM public.file ")
-        for row in rs:
-            count = row[0]
-
-    query = sqlalchemy.text("""
-        SELECT public.file.*, public.vitek_id_card.name as vitek_id_name
-        FROM public.file
-        INNER JOIN public.vitek_id_card ON public.vitek_id_card.id = public.file.vitek_id
-        WHERE active AND amount_row IS NOT NULL
-        ORDER BY upload_at DESC
-        LIMIT :app
-        OFFSET :offset
-        """)
-    file_logs = pd.read_sql(
-        query, conn, params={"app": AMOUNT_PER_PAGE, "offset": offset})
-
-    files = []
-    file_logs = file_logs.set_index("id")
-    for _id in file_logs.index:
-        files.append({
-            "id": int(_id),
-            "name": file_logs.loc[_id, "name"],
-            "vitek_id": file_logs.loc[_id, "vitek_id_name"],
-            "upload_at": file_logs.loc[_id, "upload_at"].strftime("%d-%b-%Y %H:%M:%S"),
-            "amount_row": int(file_logs.loc[_id, "amount_row"]),
-            "can_delete": file_logs.loc[_id, "upload_at"].year > 2021
-        })
-    return {
+    count = fetch_scalar(repository.engine, repository.query_count_file)
+
+    files = [{
+        "id": _id,
+        "name": name,
+        "vitek_id": vitek_id_name,
+        "upload_at": upload_at,
+        "amount_row": int(amount_row),
+        "can_delete": can_delete
+    } for _id, name, vitek_id_name, upload_at, amount_row, can_delete in fetch_all(repository.engine, 
+        repository.query_view_all_files, app=AMOUNT_PER_PAGE, offset=offset)]
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "files": files,
             "total_row": count
         }
-    }
+    })
 
  # ---------- VIEW FILE RETRAINING LOG  ----------
 
 
-@app.get("/api/view_file_retraining_log")
+@app.get("/api/view_file_retraining_log", response_class=FastJSONResponse)
 def view_file_retraining_log(retraining_log_id: int):
-    query = sqlalchemy.text("""
-        SELECT file_id, name, upload_at, amount_row
-        FROM public.file_retraining_log AS file_re_log
-        INNER JOIN public.file AS file ON file.id = file_re_log.file_id
-        WHERE retraining_log_id = :re_log_id
-        ORDER BY upload_at DESC
-        """)
-
-    files_fetch = pd.read_sql_query(query, con=conn, params={
-                                    "re_log_id": retraining_log_id})
-
-    files = []
-    files_fetch = files_fetch.set_index("file_id")
-    for _id in files_fetch.index:
-        files.append({
-            "id": int(_id),
-            "name": files_fetch.loc[_id, "name"],
-            "timestamp": files_fetch.loc[_id, "upload_at"].strftime("%d-%b-%Y %H:%M:%S"),
-            "amount_row": int(files_fetch.loc[_id, "amount_row"]),
-        })
-    return {
+    files = [{
+        "id": _id,
+        "name": name,
+        "timestamp": timestamp,
+        "amount_row": int(amount_row),
+    } for _id, name, timestamp, amount_row in fetch_all(repository.engine, repository.query_view_file_retraining_log, re_log_id=retraining_log_id)]
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "files": files,
         }
-    }
+    })
 
 # ---------- RETRAINING ----------
 
 
 def training(vitek_id: int, table_report: pd.DataFrame, retraining_id: int):
     # cancel before training
-    if check_retraining_status(retraining_id, conn):
+    if check_retraining_status(retraining_id, repository.engine):
         date = datetime.datetime.now()
-        with conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                UPDATE public.retraining_log
-                SET start_date=:date, status='cancel' , finish_date=:date, time=0
-                WHERE id = :id
-                """)
-            con.execute(query, date=date, id=retraining_id)
+        run(repository.engine, repository.query_cancel_pending_retraining, date=date, id=retraining_id)
         return
 
     # start training
     start_date = datetime.datetime.now()
-    with conn.connect() as con:
-        query = sqlalchemy.text(
-            """
-            UPDATE public.retraining_log
-            SET start_date=:start_date, status='training'
-            WHERE id = :id
-            """)
-        con.execute(query, start_date=start_date, id=retraining_id)
+    run(repository.engine, repository.query_start_retraining, start_date=start_date, id=retraining_id)
 
     # Retraining
     model_retraining = ModelRetraining(
-        table_report, vitek_id, conn, MODEL_PATH)
-    model_group_id = model_retraining.training(retraining_id)
+        table_report, vitek_id, repository.engine, MODEL_PATH, thread_budget)
+    with thread_budget.training():
+        model_group_id = model_retraining.training(retraining_id)
+
+    # Versions may have been added or removed
+    model_registry.clear()
+    # latest submitted_sample binning may have changed
+    reference_cache.invalidate("submitted_sample")
 
     # cancel after training
     if model_group_id == -1:
         finish_date = datetime.datetime.now()
         delta_time = (finish_date - start_date).seconds
-        with conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                UPDATE public.retraining_log
-                SET status='cancel' , finish_date=:finish_date, time=:time
-                WHERE id = :id
-                """)
-            con.execute(query, finish_date=finish_date,
-                        time=delta_time, id=retraining_id)
+        run(repository.engine, repository.query_cancel_retraining, finish_date=finish_date,
+            time=delta_time, id=retraining_id)
         return
 
     # finish training
     finish_date = datetime.datetime.now()
     delta_time = (finish_date - start_date).seconds
-    with conn.connect() as con:
-        query = sqlalchemy.text(
-            """
-            UPDATE public.retraining_log
-            SET finish_date=:finish_date, time=:time, status='success', model_group_id=:mg_id
-            WHERE id = :id
-            """)
-        con.execute(query, finish_date=finish_date, time=delta_time,
-                    mg_id=model_group_id, id=retraining_id)
+    run(repository.engine, repository.query_finish_retraining, finish_date=finish_date, time=delta_time,
+        mg_id=model_group_id, id=retraining_id)
 
     # Reload Models
     predictor.startup()
+    # training distribution of the new model group for /api/drift
+    if table_csv[['GN', 'GP'][vitek_id - 1]].loaded:
+        table_csv[['GN', 'GP'][vitek_id - 1]].refresh_training()
 
 
 def add_retraining_log(vitek_id: int, file_id_list: list):
     # INSERT retraining log
-    with conn.connect() as con:
-        query = sqlalchemy.text(
-            """INSERT INTO public.retraining_log(vitek_id, status , cancel)
-            VALUES (:vitek_id, 'pending' , true)
-            RETURNING id;
-            """)
-        rs = con.execute(query, vitek_id=vitek_id)
-        for row in rs:
-            retraining_id = row[0]
+    retraining_id = fetch_scalar(repository.engine, repository.query_insert_retraining_log, vitek_id=vitek_id)
 
     # INSERT file_retraining_log
-    with conn.connect() as con:
-        query = sqlalchemy.text(
-            """INSERT INTO public.file_retraining_log(retraining_log_id, file_id)
-            VALUES (:retraining_log_id, :file_id)
-            """)
-        for file_id in file_id_list:
-            rs = con.execute(
-                query, retraining_log_id=retraining_id, file_id=file_id)
+    run_many(repository.engine, repository.query_insert_file_retraining_log, [
+        {"retraining_log_id": retraining_id, "file_id": int(file_id)} for file_id in file_id_list])
 
     return retraining_id
 
@@ -629,11 +966,7 @@ def add_retraining_log(vitek_id: int, file_id_list: list):
 def model_retraining(background_tasks: BackgroundTasks):
 
     # Check training status
-    count_training_status = pd.read_sql_query(
-        """ SELECT COUNT(*)
-            FROM public.retraining_log
-            WHERE status = 'training'
-        """, conn).values[0][0]
+    count_training_status = fetch_scalar(repository.engine, repository.query_count_training)
 
     if count_training_status != 0:
         return {
@@ -645,11 +978,7 @@ def model_retraining(background_tasks: BackgroundTasks):
         }
 
     # Check upload pending status
-    count_pending_status = pd.read_sql_query(
-        """ SELECT COUNT(*)
-            FROM public.upload_file_log
-            WHERE status = 'uploading'
-        """, conn).values[0][0]
+    count_pending_status = fetch_scalar(repository.engine, repository.query_count_uploading)
 
     if count_pending_status != 0:
         return {
@@ -661,20 +990,11 @@ def model_retraining(background_tasks: BackgroundTasks):
         }
 
     # Check last model_group's file
-    file_query = sqlalchemy.text(
-        """ SELECT file_id
-            FROM public.model_group as mg
-            INNER JOIN public.model_group_file as mgf ON mgf.model_group_id = mg.id
-            WHERE mg.vitek_id = :v_id AND version = (SELECT MAX(version) 
-				                                FROM public.model_group
-				                                WHERE vitek_id = :v_id)
-        """)
     count_training = 0
-    table_copy = {"GN": copy.copy(table_csv["GN"]), "GP": copy.copy(table_csv["GP"])}
+    table_copy = {"GN": copy.copy(table_csv["GN"].ensure_startup()), "GP": copy.copy(table_csv["GP"].ensure_startup())}
     for vitek_id in [1, 2]:
         vitek = ["GN", "GP"][vitek_id - 1]
-        file_id_list = list(pd.read_sql_query(file_query, conn, params={
-                            "v_id": vitek_id})["file_id"].values)
+        file_id_list = fetch_column(repository.engine, repository.query_latest_model_group_file, v_id=vitek_id)
 
         # sort list
         file_id_list.sort()
@@ -686,7 +1006,7 @@ def model_retraining(background_tasks: BackgroundTasks):
             retraining_id = add_retraining_log(
                 vitek_id, table_copy[vitek].file_id)
             background_tasks.add_task(
-                training, vitek_id, table_copy[vitek], retraining_id)
+                background_executor.submit, training, vitek_id, table_copy[vitek], retraining_id)
 
     if count_training >= 2:
         return {
@@ -707,244 +1027,149 @@ def model_retraining(background_tasks: BackgroundTasks):
     }
 
 
-@app.get("/api/retraining_logs")
+@app.get("/api/retraining_logs", response_class=FastJSONResponse)
 def retraining_logs(page: int = 1):
     # show list
     AMOUNT_PER_PAGE = 10
     offset = (page - 1) * AMOUNT_PER_PAGE
 
     if offset < 0:
-        return {
+        return FastJSONResponse({
             "status": "fail",
-        }
+        })
 
     # select count
-    with conn.connect() as con:
-        rs = con.execute("SELECT COUNT(*) FROM public.retraining_log")
-        for row in rs:
-            count = row[0]
+    count = fetch_scalar(repository.engine, repository.query_count_retraining_log)
 
     if count == 0:
-        return {
+        return FastJSONResponse({
             "status": "success",
             "data":
             {
                 "logs": [],
                 "total": count
             }
-        }
-
-    query = sqlalchemy.text("""
-        SELECT log.id, log.start_date, log.finish_date, log.time, log.status, mg.version, vi.id AS vitek_id, vi.name AS vitek_name , log.cancel
-        FROM public.retraining_log AS log 
-        INNER JOIN public.vitek_id_card AS vi ON log.vitek_id = vi.id
-        LEFT JOIN public.model_group AS mg ON mg.id = log.model_group_id
-        ORDER BY finish_date DESC, start_date
-        LIMIT :app
-        OFFSET :offset
-        """)
-    retraining_logs = pd.read_sql(
-        query, conn, params={"app": AMOUNT_PER_PAGE, "offset": offset})
-
-    logs = []
-    retraining_logs = retraining_logs.set_index("id")
-    for _id in retraining_logs.index:
-        logs.append({
-            "id": int(_id),
-            "vitek_id": int(retraining_logs.loc[_id, "vitek_id"]),
-            "vitek_name": retraining_logs.loc[_id, "vitek_name"],
-            "start_date": retraining_logs.loc[_id, "start_date"].strftime("%d-%b-%Y %H:%M:%S") if pd.notna(retraining_logs.loc[_id, "start_date"]) else '-',
-            "finish_date": retraining_logs.loc[_id, "finish_date"].strftime("%d-%b-%Y %H:%M:%S") if pd.notna(retraining_logs.loc[_id, "finish_date"]) else '-',
-            "time": int(retraining_logs.loc[_id, "time"]) if pd.notna(retraining_logs.loc[_id, "time"]) else '-',
-            "status": retraining_logs.loc[_id, "status"],
-            "version": int(retraining_logs.loc[_id, "version"]) if pd.notna(retraining_logs.loc[_id, "version"]) else None,
-            "cancel": bool(retraining_logs.loc[_id, "cancel"])
         })
 
-    return {
+    logs = [{
+        "id": _id,
+        "vitek_id": vitek_id,
+        "vitek_name": vitek_name,
+        "start_date": start_date,
+        "finish_date": finish_date,
+        "time": int(time) if time is not None else '-',
+        "status": status,
+        "version": version,
+        "cancel": bool(cancel)
+    } for _id, vitek_id, vitek_name, start_date, finish_date, time, status, version, cancel in fetch_all(repository.engine, 
+        repository.query_retraining_logs, app=AMOUNT_PER_PAGE, offset=offset)]
+
+    return FastJSONResponse({
         "status": "success",
         "data":
         {
             "logs": logs,
             "total": count
         }
-    }
+    })
 
 
 # ---------- DASHBOARD ----------
 
-@app.get("/api/lastest_version")
+@app.get("/api/lastest_version", response_class=FastJSONResponse)
 def lastest_version(vitek_id):
-    query = sqlalchemy.text(
-        """ SELECT MAX(version)
-            FROM public.model_group
-            WHERE vitek_id = :vitek_id
-        """)
-    lastest_version = pd.read_sql_query(
-        query, conn, params={"vitek_id": vitek_id})
+    lastest_version = fetch_all(repository.engine, repository.query_lastest_version, vitek_id=vitek_id)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
-            "lastest_version": int(lastest_version.values[0][0])
+            "lastest_version": int(lastest_version[0][0])
         }
-    }
+    })
 
 
-@app.get("/api/antimicrobial_model")
+@app.get("/api/antimicrobial_model", response_class=FastJSONResponse)
 def antimicrobial_model(vitek_id):
-    query = sqlalchemy.text(
-        """ SELECT public.antimicrobial_answer.id, public.antimicrobial_answer.name
-            FROM public.model
-            INNER JOIN public.model_group_model ON model.id = model_group_model.model_id
-            INNER JOIN public.model_group ON public.model_group_model.model_group_id = public.model_group.id
-            INNER JOIN public.antimicrobial_answer ON public.model.antimicrobial_id = public.antimicrobial_answer.id
-            WHERE public.model_group.vitek_id = :vitek_id
-            GROUP BY public.antimicrobial_answer.id, public.antimicrobial_answer.name
-            ORDER BY public.antimicrobial_answer.name
-        """)
-    antimicrobial = pd.read_sql_query(
-        query, conn, params={"vitek_id": vitek_id})
+    antimicrobial = fetch_all(repository.engine, repository.query_antimicrobial_model, vitek_id=vitek_id)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "antimicrobial": [{
                 'id': row[0],
                 'name': row[1]
-            } for row in antimicrobial.values]
+            } for row in antimicrobial]
         }
-    }
+    })
 
 # ---------- DATASET DASHBOARD ----------
 
 
-@app.get("/api/dashboard_case")
+@app.get("/api/dashboard_case", response_class=FastJSONResponse)
 def dashboard_case(vitek_id, version):
-    query = sqlalchemy.text(
-        """ SELECT to_char(public.report.report_issued_date, 'YYYY-MM'), COUNT(public.report.id)
-            FROM public.model_group
-            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
-            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
-            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
-            GROUP BY to_char(public.report.report_issued_date, 'YYYY-MM')
-            ORDER BY 1
-        """)
-    case = pd.read_sql_query(query, conn, params={
-                             "vitek_id": vitek_id, "version": version})
+    case = fetch_all(repository.engine, repository.query_dashboard_case, vitek_id=vitek_id, version=version)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "cases": [{
                 'date': row[0],
                 'count': row[1]
-            } for row in case.values]
+            } for row in case]
         }
-    }
+    })
 
 
-@app.get("/api/dashboard_species")
+@app.get("/api/dashboard_species", response_class=FastJSONResponse)
 def dashboard_species(vitek_id, version):
-    query = sqlalchemy.text(
-        """ SELECT public.species.name, COUNT(public.report.id)
-            FROM public.model_group
-            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
-            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
-            INNER JOIN public.species ON public.report.species_id = public.species.id
-            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
-            GROUP BY public.species.name
-            ORDER BY COUNT(public.report.id) DESC
-        """)
-    species = pd.read_sql_query(
-        query, conn, params={"vitek_id": vitek_id, "version": version})
+    species = fetch_all(repository.engine, repository.query_dashboard_species, vitek_id=vitek_id, version=version)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "species": [{
                 'name': row[0],
                 'count': row[1]
-            } for row in species.values]
+            } for row in species]
         }
-    }
+    })
 
 
-@app.get("/api/dashboard_bacteria_genus")
+@app.get("/api/dashboard_bacteria_genus", response_class=FastJSONResponse)
 def dashboard_bacteria_genus(vitek_id, version):
-    query = sqlalchemy.text(
-        """ SELECT public.bacteria_genus.name, COUNT(public.report.id)
-            FROM public.model_group
-            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
-            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
-            INNER JOIN public.bacteria_genus ON public.report.bacteria_genus_id = public.bacteria_genus.id
-            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
-            GROUP BY public.bacteria_genus.name
-            ORDER BY COUNT(public.report.id) DESC
-        """)
-    bacteria_genus = pd.read_sql_query(
-        query, conn, params={"vitek_id": vitek_id, "version": version})[:10]
+    bacteria_genus = fetch_all(repository.engine, repository.query_dashboard_bacteria_genus, vitek_id=vitek_id, version=version)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "bacteria_genus": [{
                 'name': row[0],
                 'count': row[1]
-            } for row in bacteria_genus.values]
+            } for row in bacteria_genus]
         }
-    }
+    })
 
 
-@app.get("/api/dashboard_submitted_sample")
+@app.get("/api/dashboard_submitted_sample", response_class=FastJSONResponse)
 def dashboard_submitted_sample(vitek_id, version):
-    query = sqlalchemy.text(
-        """ SELECT public.submitted_sample.name, COUNT(public.report.id)
-            FROM public.model_group
-            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
-            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
-            INNER JOIN public.submitted_sample ON public.report.submitted_sample_id = public.submitted_sample.id
-            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
-            GROUP BY public.submitted_sample.name
-            ORDER BY COUNT(public.report.id) DESC
-        """)
-    submitted_sample = pd.read_sql_query(
-        query, conn, params={"vitek_id": vitek_id, "version": version})[:10]
+    submitted_sample = fetch_all(repository.engine, repository.query_dashboard_submitted_sample, vitek_id=vitek_id, version=version)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "submitted_sample": [{
                 'name': row[0],
                 'count': row[1]
-            } for row in submitted_sample.values]
+            } for row in submitted_sample]
         }
-    }
+    })
 
 
-@app.get("/api/dashboard_antimicrobial_sir")
+@app.get("/api/dashboard_antimicrobial_sir", response_class=FastJSONResponse)
 def dashboard_antimicrobial_sir(vitek_id, version):
-    query = sqlalchemy.text(
-        """ SELECT public.antimicrobial_sir.name,
-	            COUNT(CASE WHEN public.sir_sub_type.id=1 THEN 1 END) as "POS",
-	            COUNT(CASE WHEN public.sir_sub_type.id=2 THEN 1 END) as "NEG",
- 	            COUNT(CASE WHEN public.sir_sub_type.id=3 THEN 1 END) as "S",
-	            COUNT(CASE WHEN public.sir_sub_type.id=4 THEN 1 END) as "I",
-	            COUNT(CASE WHEN public.sir_sub_type.id=5 THEN 1 END) as "R"
-            FROM public.model_group
-            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
-            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
-            INNER JOIN public.report_sir ON public.report.id = public.report_sir.report_id
-            INNER JOIN public.antimicrobial_sir ON public.report_sir.antimicrobial_id = public.antimicrobial_sir.id
-            INNER JOIN public.sir_sub_type ON public.report_sir.sir_sub_id = public.sir_sub_type.id
-            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
-            GROUP BY public.antimicrobial_sir.name
-            ORDER BY public.antimicrobial_sir.name
-        """)
-    antimicrobial_sir = pd.read_sql_query(
-        query, conn, params={"vitek_id": vitek_id, "version": version})
+    antimicrobial_sir = fetch_all(repository.engine, repository.query_dashboard_antimicrobial_sir, vitek_id=vitek_id, version=version)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "antimicrobial_sir": [{
@@ -956,53 +1181,33 @@ def dashboard_antimicrobial_sir(vitek_id, version):
                     'i': row[4],
                     'r': row[5]
                 }
-            } for row in antimicrobial_sir.values]
+            } for row in antimicrobial_sir]
         }
-    }
+    })
 
 
-@app.get("/api/dashboard_antimicrobial_answer")
+@app.get("/api/dashboard_antimicrobial_answer", response_class=FastJSONResponse)
 def dashboard_antimicrobial_answer(vitek_id, version):
-    query = sqlalchemy.text(
-        """ SELECT public.antimicrobial_answer.name, COUNT(public.report.id)
-            FROM public.model_group
-            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
-            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
-            INNER JOIN public.report_answer ON public.report.id = public.report_answer.report_id
-            INNER JOIN public.antimicrobial_answer ON antimicrobial_answer.id = public.report_answer.antimicrobial_id
-            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
-            GROUP BY public.antimicrobial_answer.name
-            ORDER BY COUNT(public.report.id) DESC
-        """)
-    antimicrobial_answer = pd.read_sql_query(
-        query, conn, params={"vitek_id": vitek_id, "version": version})[:11]
+    antimicrobial_answer = fetch_all(repository.engine, repository.query_dashboard_antimicrobial_answer, vitek_id=vitek_id, version=version)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "antimicrobial_answers": [{
                 'name': row[0],
                 'count': row[1]
-            } for row in antimicrobial_answer.values]
+            } for row in antimicrobial_answer]
         }
-    }
+    })
 
 # ---------- PERFORMANCE DASHBOARD ----------
 
 
-@app.get("/api/dashboard_performance_by_antimicrobial")
+@app.get("/api/dashboard_performance_by_antimicrobial", response_class=FastJSONResponse)
 def dashboard_performance_by_antimicrobial(antimicrobial_id):
-    query = sqlalchemy.text(
-        """ SELECT mg.version, m.accuracy, m.precision, m.recall, m.f1
-            FROM public.model as m
-            INNER JOIN public.model_group_model ON m.id = public.model_group_model.model_id
-            INNER JOIN public.model_group AS mg ON public.model_group_model.model_group_id =  mg.id
-            WHERE m.antimicrobial_id = :antimicrobial_id AND mg.version > 0
-        """)
-    performance = pd.read_sql_query(
-        query, conn, params={"antimicrobial_id": antimicrobial_id})
+    performance = fetch_all(repository.engine, repository.query_dashboard_performance_by_antimicrobial, antimicrobial_id=antimicrobial_id)
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "performances": [{
@@ -1011,68 +1216,22 @@ def dashboard_performance_by_antimicrobial(antimicrobial_id):
                 'precision': row[2],
                 'recall': row[3],
                 'f1': row[4]
-            } for row in performance.values]
+            } for row in performance]
         }
-    }
+    })
 
 
-@app.get("/api/dashboard_performance_by_version")
+@app.get("/api/dashboard_performance_by_version", response_class=FastJSONResponse)
 def dashboard_performance_by_version(vitek_id, version):
-    query = sqlalchemy.text(
-        """ SELECT public.antimicrobial_answer.name, m_group.version, m.accuracy, m.precision, m.recall, m.f1, m.performance, m_group.model_group_id
-            FROM public.model_group as mg
-            INNER JOIN public.model_group_model as mgm ON mg.id = mgm.model_group_id
-            INNER JOIN public.model as m ON mgm.model_id = m.id
-            INNER JOIN public.antimicrobial_answer ON m.antimicrobial_id = public.antimicrobial_answer.id
-            INNER JOIN (
-            	SELECT *
-            	FROM public.model_group_model
-            	INNER JOIN public.model_group ON public.model_group_model.model_group_id = public.model_group.id
-             	WHERE public.model_group.version > 0
-            	) as m_group ON m.id = m_group.model_id
-            WHERE mg.vitek_id = :vitek_id AND mg.version = :version
-            ORDER BY public.antimicrobial_answer.name
-        """)
-
-    query_current = sqlalchemy.text(
-        """ SELECT 
-            anti_answer.name, m_group.version, model_current.accuracy , model_current.precision , model_current.recall , model_current.f1, '-' as performance, m_group.model_group_id
-            FROM public.model_current AS model_current
-            INNER JOIN public.model AS model ON model.id = model_current.model_id
-            INNER JOIN public.antimicrobial_answer AS anti_answer ON anti_answer.id = model.antimicrobial_id
-            INNER JOIN public.vitek_id_card AS vitek_id_card ON vitek_id_card.id = anti_answer.vitek_id
-            INNER JOIN (
-                        	SELECT *
-                        	FROM public.model_group_model
-                        	INNER JOIN public.model_group ON public.model_group_model.model_group_id = public.model_group.id
-                         	WHERE public.model_group.version > 0
-                        	) as m_group ON model.id = m_group.model_id
-            WHERE vitek_id_card.id = :vitek_id AND model_current.version = (SELECT MAX(model_current.version) 
-            													   	FROM public.model_current AS model_current
-            														INNER JOIN public.model AS model ON model.id = model_current.model_id
-            														INNER JOIN public.antimicrobial_answer AS anti_answer ON anti_answer.id = model.antimicrobial_id
-            														INNER JOIN public.vitek_id_card AS vitek_id_card ON vitek_id_card.id = anti_answer.vitek_id
-            													   	WHERE vitek_id_card.id = :vitek_id)
-            ORDER BY model_current.id ASC
-        """)
-
-    query_test_by_case = sqlalchemy.text(
-        """ SELECT 'All Model (Test By Case)' as name, mg.version, mg.accuracy, mg.precision, mg.recall, mg.f1, '-' as performance, mg.id as model_group_id
-            FROM public.model_group as mg
-            WHERE mg.vitek_id = :vitek_id AND mg.version = :version
-        """
-    )
-
     params = {"vitek_id": vitek_id, "version": version}
     if int(version) == 0:
-        performance = pd.read_sql_query(
-            query_current, conn, params={"vitek_id": vitek_id})
+        performance = fetch_all(repository.engine, repository.query_dashboard_performance_current, vitek_id=vitek_id)
     else:
-        performance = pd.read_sql_query(query, conn, params=params)
-    test_by_case = pd.read_sql_query(query_test_by_case, conn, params=params)
-    performance = performance.append(test_by_case)
+        performance = fetch_all(repository.engine, repository.query_dashboard_performance_by_version, **params)
+    test_by_case = fetch_all(repository.engine, repository.query_dashboard_performance_test_by_case, **params)
+    performance = performance + test_by_case
 
-    return {
+    return FastJSONResponse({
         "status": "success",
         "data": {
             "performances": [{
@@ -1084,21 +1243,16 @@ def dashboard_performance_by_version(vitek_id, version):
                 'f1': row[5],
                 'performance': row[6],
                 'model_group_id': row[7]
-            } for row in performance.values]
+            } for row in performance]
         }
-    }
+    })
 
 # ---------- CONFIGURATION ----------
 
 
 @app.get("/api/configuration_xgb_parameter")
 def configuration_xgb_parameter(vitek_id):
-    query = sqlalchemy.text("""
-    SELECT anti.name , n_estimators, gamma, max_depth, subsample, colsample_bytree, learning_rate,  random_state
-    FROM public.model_configuration AS mc
-    INNER JOIN public.antimicrobial_answer AS anti ON anti.id = mc.antimicrobial_id
-    WHERE vitek_id = :v_id;""")
-    configs = pd.read_sql_query(query, conn, params={"v_id": vitek_id})
+    configs = fetch_frame(repository.engine, repository.query_configuration_xgb_parameter, v_id=vitek_id)
     xgb_params = {}
 
     def to_params(params: pd.Series):
@@ -1120,12 +1274,7 @@ def configuration_xgb_parameter(vitek_id):
 
 @app.get("/api/configuration_smote")
 def configuration_smote(vitek_id):
-    query = sqlalchemy.text("""
-    SELECT anti.name , smote
-    FROM public.model_configuration AS mc
-    INNER JOIN public.antimicrobial_answer AS anti ON anti.id = mc.antimicrobial_id
-    WHERE vitek_id = :v_id;""")
-    configs = pd.read_sql_query(query, conn, params={"v_id": vitek_id})
+    configs = fetch_frame(repository.engine, repository.query_configuration_smote, v_id=vitek_id)
     xgb_params = {}
 
     def to_params(params: pd.Series):
@@ -1144,15 +1293,12 @@ def configuration_smote(vitek_id):
 
 
 def delete_file_db(file_id: int):
-    with conn.connect() as con:
-        query = sqlalchemy.text("DELETE FROM public.file WHERE id = :id;")
-        con.execute(query, id=file_id)
+    run(repository.engine, repository.query_delete_file, id=file_id)
 
 
 @app.delete("/api/delete_file")
 def delete_file(file_id: int, background_tasks: BackgroundTasks):
-    retraining_status = pd.read_sql_query(
-        "SELECT DISTINCT status FROM public.retraining_log", conn).values
+    retraining_status = fetch_column(repository.engine, repository.query_retraining_statuses)
     if "pending" in retraining_status or "training" in retraining_status:
         return {
             "status": "fail",
@@ -1161,26 +1307,20 @@ def delete_file(file_id: int, background_tasks: BackgroundTasks):
             }
         }
 
-    files = pd.read_sql_query("SELECT id FROM public.file", conn)
-    if file_id not in files["id"].values:
+    files = fetch_column(repository.engine, repository.query_file_id)
+    if file_id not in files:
         return {
             "status": "fail",
         }
-    files_used = pd.read_sql_query(
-        "SELECT DISTINCT file_id FROM public.model_group_file", conn)
+    files_used = fetch_column(repository.engine, repository.query_model_group_file_id)
 
     # DELETE FILE SET STATUS
-    with conn.connect() as con:
-        query = sqlalchemy.text(
-            "UPDATE public.file SET active = false WHERE id = :id RETURNING vitek_id;")
-        rs = con.execute(query, id=file_id)
-        for row in rs:
-            vitek_id = row[0]
-        vitek = ['GN', 'GP'][vitek_id - 1]
-        table_csv[vitek].startup()
+    vitek_id = fetch_scalar(repository.engine, repository.query_deactivate_file, id=file_id)
+    vitek = ['GN', 'GP'][vitek_id - 1]
+    table_csv[vitek].startup()
 
     # DELETE FILE IN DATABASE
-    if file_id not in files_used['file_id'].values:
+    if file_id not in files_used:
         background_tasks.add_task(delete_file_db, file_id=file_id)
 
     return {
@@ -1192,24 +1332,16 @@ def delete_file(file_id: int, background_tasks: BackgroundTasks):
 
 @app.get("/api/cancel_retraining")
 def cancel_retraining(retraining_id: int):
-    retrains = pd.read_sql_query("""
-    SELECT id , cancel 
-    FROM public.retraining_log 
-    WHERE status = 'pending' OR status = 'training' 
-    """, conn)
+    retrains = dict(fetch_all(repository.engine, repository.query_running_retraining))
 
     # retrain_id not found.
-    if retraining_id not in retrains["id"].values:
+    if retraining_id not in retrains:
         return {
             "status": "fail",
         }
 
-    retrains = retrains.set_index("id")
-    if retrains.loc[retraining_id, "cancel"]:
-        with conn.connect() as con:
-            query = sqlalchemy.text(
-                "UPDATE public.retraining_log SET status = 'canceling' , cancel = false WHERE id = :id;")
-            con.execute(query, id=retraining_id)
+    if retrains[retraining_id]:
+        run(repository.engine, repository.query_request_cancel_retraining, id=retraining_id)
         return {
             "status": "success",
         }
@@ -0,0 +1,19 @@
+from dotenv import load_dotenv
+import sqlalchemy
+import os
+from src.model_store import migrate_joblib_models
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(dotenv_path)
+
+DB_HOST = os.environ.get("DB_HOST")
+DB_USERNAME = os.environ.get("DB_USERNAME")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+MODEL_PATH = os.environ.get("MODEL_PATH")
+
+# Convert every joblib and JSON model to the binary XGBoost format and write the missing metadata sidecars, old files are kept
+if __name__ == "__main__":
+    conn = sqlalchemy.create_engine(
+        f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/antimicrobial_system")
+    count = migrate_joblib_models(conn, MODEL_PATH)
+    print(f"migrated {count} models")
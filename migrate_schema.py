@@ -0,0 +1,20 @@
+from dotenv import load_dotenv
+import sqlalchemy
+import os
+from src.schema import MIGRATIONS, migrate
+from src.submitted_sample_latest import backfill_submitted_sample_latest
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(dotenv_path)
+
+DB_HOST = os.environ.get("DB_HOST")
+DB_USERNAME = os.environ.get("DB_USERNAME")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+
+# Create the tables written by the backend (drift_sketch, ...), safe to run again
+if __name__ == "__main__":
+    conn = sqlalchemy.create_engine(
+        f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/antimicrobial_system")
+    migrate(conn)
+    print(f"migrated {len(MIGRATIONS)} statements")
+    print(f"submitted_sample_latest backfilled for {backfill_submitted_sample_latest(conn)} vitek")
@@ -0,0 +1,71 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionControl:
+    """Bounded number of predictions in flight, the others wait in a bounded queue or are rejected."""
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 64, queue_timeout: float = 1) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slots = threading.Semaphore(max_in_flight)
+
+        # metrics
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    @contextmanager
+    def admit(self):
+        with self.lock:
+            # fail fast, a full queue would only grow the latency
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded()
+            self.waiting += 1
+
+        start = time.monotonic()
+        acquired = self.slots.acquire(timeout=self.queue_timeout)
+        wait_time = time.monotonic() - start
+        with self.lock:
+            self.waiting -= 1
+            if not acquired:
+                self.timeouts += 1
+                self.rejected += 1
+                raise Overloaded()
+            self.in_flight += 1
+            self.admitted += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "wait_ms_mean": self.wait_time_total * 1000 / self.admitted if self.admitted else 0,
+                "wait_ms_max": self.wait_time_max * 1000,
+            }
@@ -0,0 +1,81 @@
+import threading
+from collections import Counter
+from typing import Dict
+import pandas as pd
+
+
+def report_inputs(table: pd.DataFrame) -> list:
+    # Report rows of TableToCsv in the same form as the /api/predict data
+    sir_columns = [col for col in table.columns if col.startswith("S/I/R_")]
+    columns = ["species", "bacteria_genus", "submitted_sample", "vitek_id"] + sir_columns
+    inputs = []
+    for row in table[columns].values:
+        data = {
+            "species": str(row[0]).lower().strip(),
+            "bact_genus": str(row[1]).lower().strip(),
+            "submitted_sample": str(row[2]).lower().strip(),
+            "vitek_id": str(row[3]).upper().strip(),
+        }
+        for col, value in zip(sir_columns, row[4:]):
+            if value != "":
+                data["S/I/R_" + col[len("S/I/R_"):].lower().strip()] = str(value).upper()
+        inputs.append(data)
+    return inputs
+
+
+class AnswerTable:
+    """Scores of the most frequent report inputs, computed once per predictor state."""
+    GN = 0
+    GP = 1
+
+    def __init__(self, size: int = 1000) -> None:
+        self.size = size
+        self.tables = [{}, {}]
+        self.coverage = [0.0, 0.0]
+
+        # metrics
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def build(self, state, inputs: list):
+        # Inputs are counted by cache key, so only values that reach the models matter
+        tables = [{}, {}]
+        coverage = [0.0, 0.0]
+        for vitek_id in [self.GN, self.GP]:
+            if len(state.anti_names[vitek_id]) == 0 or len(inputs[vitek_id]) == 0:
+                continue
+            counts = Counter()
+            samples = {}
+            for data in inputs[vitek_id]:
+                key = state.cache_key(data, vitek_id)
+                counts[key] += 1
+                samples.setdefault(key, data)
+            top = counts.most_common(self.size)
+            scores = state.scores(
+                [samples[key] for key, _ in top], vitek_id)
+            tables[vitek_id] = {key: row for (key, _), row in zip(top, scores)}
+            coverage[vitek_id] = sum(count for _, count in top) / len(inputs[vitek_id])
+        self.tables = tables
+        self.coverage = coverage
+
+    def get(self, key: tuple, vitek_id):
+        scores = self.tables[vitek_id].get(key)
+        with self.lock:
+            if scores is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return scores
+
+    def stats(self) -> Dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": self.size,
+                "entries": {"GN": len(self.tables[self.GN]), "GP": len(self.tables[self.GP])},
+                "report_coverage": {"GN": self.coverage[self.GN], "GP": self.coverage[self.GP]},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0,
+            }
@@ -0,0 +1,79 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundExecutor:
+    """Upload and training tasks on their own threads, at a lower CPU priority than the requests."""
+
+    def __init__(self, workers: int = 4, nice: int = 10) -> None:
+        self.workers = workers
+        self.nice = nice
+
+        # metrics
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+        # started by the first call of each process, threads do not survive a gunicorn fork
+        self.pid = None
+        self.executor = None
+
+    def start(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="background", initializer=self.lower_priority)
+                self.pending = 0
+                self.running = 0
+                self.pid = os.getpid()
+
+    def lower_priority(self):
+        # On Linux the nice value belongs to the thread, the request threads keep theirs
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+        except (AttributeError, OSError):
+            logger.warning("background: cannot lower the thread priority")
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        if self.pid != os.getpid():
+            self.start()
+        with self.lock:
+            self.pending += 1
+        return self.executor.submit(self.run, func, *args, **kwargs)
+
+    def run(self, func, *args, **kwargs):
+        with self.lock:
+            self.pending -= 1
+            self.running += 1
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            logger.exception("background: %s failed", func.__name__)
+            with self.lock:
+                self.failed += 1
+            raise
+        else:
+            with self.lock:
+                self.completed += 1
+            return result
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "nice": self.nice,
+                "pending": self.pending,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
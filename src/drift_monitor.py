@@ -0,0 +1,255 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# live key -> TableToCsv column
+TRAINING_COLUMNS = {"species": "species", "bact_genus": "bacteria_genus",
+                    "submitted_sample": "submitted_sample"}
+
+
+class CountMinSketch:
+    """Approximate counts of an unbounded set of values in a fixed depth x width table."""
+
+    def __init__(self, width: int = 512, depth: int = 4, table: np.ndarray = None) -> None:
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.int64)
+
+    def columns(self, value: str):
+        # one salted blake2b per row, stable across processes so checkpoints of every worker can be merged
+        # (crc32 with a per-row seed collides in every row once it collides in one)
+        data = value.encode()
+        return [int.from_bytes(hashlib.blake2b(data, digest_size=8, salt=row.to_bytes(16, "little")).digest(),
+                               "little") % self.width for row in range(self.depth)]
+
+    def add(self, value: str, count: int = 1):
+        for row, col in enumerate(self.columns(value)):
+            self.table[row, col] += count
+
+    def estimate(self, value: str) -> int:
+        return int(min(self.table[row, col] for row, col in enumerate(self.columns(value))))
+
+    def merge(self, other):
+        self.table += other.table
+
+
+class FeatureSketch:
+    """Live values of one feature, exact up to max_values distinct values then in the sketch only."""
+
+    def __init__(self, max_values: int = 512, width: int = 512, depth: int = 4) -> None:
+        self.max_values = max_values
+        self.total = 0
+        # every value counted in counts holds all of its occurrences
+        self.counts = Counter()
+        # False once a value was counted in the sketch only
+        self.exact = True
+        self.sketch = CountMinSketch(width, depth)
+
+    def add(self, value: str, count: int = 1):
+        self.total += count
+        if value in self.counts:
+            self.counts[value] += count
+        elif self.exact and len(self.counts) < self.max_values:
+            self.counts[value] = count
+        else:
+            self.exact = False
+        self.sketch.add(value, count)
+
+    def estimate(self, value: str) -> int:
+        if value in self.counts:
+            return self.counts[value]
+        if self.exact:
+            return 0
+        return self.sketch.estimate(value)
+
+    def merge(self, other):
+        # a value stays exact only if neither window may hold it in the sketch only
+        counts = Counter()
+        for value in set(self.counts) | set(other.counts):
+            if value in self.counts and value in other.counts:
+                counts[value] = self.counts[value] + other.counts[value]
+            elif value in self.counts and other.exact:
+                counts[value] = self.counts[value]
+            elif value in other.counts and self.exact:
+                counts[value] = other.counts[value]
+        exact = self.exact and other.exact and len(counts) == len(set(self.counts) | set(other.counts))
+        if len(counts) > self.max_values:
+            counts = Counter(dict(counts.most_common(self.max_values)))
+            exact = False
+        self.total += other.total
+        self.counts = counts
+        self.exact = exact
+        self.sketch.merge(other.sketch)
+
+
+def training_distribution(table: pd.DataFrame) -> Dict:
+    # Value counts of the training reports, same normalization as /api/predict
+    distribution = {}
+    for key, col in TRAINING_COLUMNS.items():
+        distribution[key] = table[col].astype(str).str.lower().str.strip().value_counts()
+    for col in table.columns[table.columns.str.startswith("S/I/R_")]:
+        values = table.loc[table[col] != "", col].astype(str).str.upper()
+        distribution["S/I/R_" + col[len("S/I/R_"):].lower().strip()] = values.value_counts()
+    return distribution
+
+
+class DriftMonitor:
+    """Streaming counts of the live predict inputs, checkpointed to the database and compared with the training reports."""
+
+    def __init__(self, conn: Engine, checkpoint_interval: float = 300, max_values: int = 512, width: int = 512, depth: int = 4) -> None:
+        self.conn = conn
+        self.checkpoint_interval = checkpoint_interval
+        self.max_values = max_values
+        self.width = width
+        self.depth = depth
+        self.lock = threading.Lock()
+        # (vitek index, feature) -> FeatureSketch since the last checkpoint
+        self.window = {}
+
+        # metrics
+        self.updates = 0
+        self.checkpoints = 0
+        self.errors = 0
+
+        # started by the first call of each process, threads do not survive a gunicorn fork
+        self.pid = None
+
+    def start(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                threading.Thread(target=self.run, name="drift-checkpoint",
+                                 daemon=True).start()
+                self.window = {}
+                self.pid = os.getpid()
+
+    def new_sketch(self) -> FeatureSketch:
+        return FeatureSketch(self.max_values, self.width, self.depth)
+
+    def update(self, data: Dict, vitek_id):
+        # O(1) per input, one counter and depth sketch cells per feature
+        if self.pid != os.getpid():
+            self.start()
+        with self.lock:
+            self.updates += 1
+            for key, value in data.items():
+                if key == 'vitek_id':
+                    continue
+                feature = self.window.get((vitek_id, key))
+                if feature is None:
+                    feature = self.window[(vitek_id, key)] = self.new_sketch()
+                feature.add(str(value))
+
+    def run(self):
+        while True:
+            time.sleep(self.checkpoint_interval)
+            self.checkpoint()
+
+    def checkpoint(self):
+        # Counts since the last checkpoint, every worker writes its own rows
+        with self.lock:
+            window = self.window
+            self.window = {}
+        if len(window) == 0:
+            return
+        create_at = datetime.datetime.now()
+        rows = [{
+            "create_at": create_at,
+            "vitek_id": vitek_id + 1,
+            "feature": key,
+            "total": feature.total,
+            "counts": json.dumps(feature.counts),
+            "sketch": feature.sketch.table.astype(np.int64).tobytes(),
+        } for (vitek_id, key), feature in window.items()]
+        try:
+            with self.conn.connect() as con:
+                con.execute(sqlalchemy.text(
+                    """
+                    INSERT INTO public.drift_sketch(create_at, vitek_id, feature, total, counts, sketch)
+                    VALUES (:create_at, :vitek_id, :feature, :total, :counts, :sketch)
+                    """), rows)
+            with self.lock:
+                self.checkpoints += 1
+        except Exception:
+            logger.exception("drift: checkpoint failed")
+            with self.lock:
+                self.errors += 1
+                # kept for the next checkpoint
+                for key, feature in window.items():
+                    current = self.window.get(key)
+                    if current is not None:
+                        feature.merge(current)
+                    self.window[key] = feature
+
+    def live(self, vitek_id, since: datetime.datetime) -> Dict:
+        # Checkpoints of every worker since the date plus this worker's current window
+        features = {}
+        query = sqlalchemy.text(
+            """
+            SELECT feature , total , counts , sketch
+            FROM public.drift_sketch
+            WHERE vitek_id = :v_id AND create_at >= :since
+            """)
+        with self.conn.connect() as con:
+            rows = list(con.execute(query, v_id=vitek_id + 1, since=since))
+        for key, total, counts, sketch in rows:
+            checkpoint = self.new_sketch()
+            checkpoint.total = total
+            checkpoint.counts = Counter(counts if isinstance(counts, dict) else json.loads(counts))
+            # the window overflowed max_values when some values are in the sketch only
+            checkpoint.exact = sum(checkpoint.counts.values()) == total
+            checkpoint.sketch.table = np.frombuffer(bytes(sketch), dtype=np.int64).reshape(
+                self.depth, self.width).copy()
+            features.setdefault(key, self.new_sketch()).merge(checkpoint)
+        with self.lock:
+            for (v_id, key), feature in self.window.items():
+                if v_id == vitek_id:
+                    features.setdefault(key, self.new_sketch()).merge(feature)
+        return features
+
+    def compare(self, live: Dict, training: Dict, epsilon: float = 1e-4) -> list:
+        # Population stability index and total variation distance per feature
+        result = []
+        for key, counts in training.items():
+            feature = live.get(key)
+            if feature is None or feature.total == 0 or counts.sum() == 0:
+                continue
+            expected = (counts / counts.sum()).to_dict()
+            actual = {value: feature.estimate(value) / feature.total for value in expected}
+            # values never seen in training share one bucket
+            expected["__unseen__"] = 0.0
+            actual["__unseen__"] = max(0.0, 1 - sum(actual.values()))
+            psi = sum((actual[value] - expected[value]) * np.log(
+                (actual[value] + epsilon) / (expected[value] + epsilon)) for value in expected)
+            unseen = sorted(((value, count) for value, count in feature.counts.items()
+                             if value not in counts.index), key=lambda item: item[1], reverse=True)
+            result.append({
+                "feature": key,
+                "live_count": feature.total,
+                "training_count": int(counts.sum()),
+                "psi": round(float(psi), 4),
+                "tvd": round(float(sum(abs(actual[value] - expected[value]) for value in expected) / 2), 4),
+                "unseen_share": round(actual["__unseen__"], 4),
+                "top_unseen": [{"value": value, "count": count} for value, count in unseen[:5]],
+            })
+        return sorted(result, key=lambda item: item["psi"], reverse=True)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "updates": self.updates,
+                "checkpoints": self.checkpoints,
+                "errors": self.errors,
+                "window_features": len(self.window),
+            }
@@ -0,0 +1,22 @@
+import decimal
+from typing import Any
+import numpy as np
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+def default(obj):
+    # types orjson does not serialize itself, NUMERIC columns come back as Decimal
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson response for handlers that return it directly, skipping jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
@@ -0,0 +1,179 @@
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict
+from sqlalchemy import event
+
+# seconds, same as the Prometheus client defaults with finer steps below 5ms
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Metrics:
+    """Histograms and counters kept in memory and rendered in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # (name, labels) -> Histogram / count
+        self.histograms = {}
+        self.counters = {}
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def render(self, gauges: Dict = None) -> str:
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        names = set()
+        for (name, labels), histogram in histograms:
+            if name not in names:
+                lines.append(f"# TYPE {name} histogram")
+                names.add(name)
+            with histogram.lock:
+                counts = list(histogram.counts)
+                total = histogram.sum
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], counts):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        for (name, labels), value in counters:
+            if name not in names:
+                lines.append(f"# TYPE {name} counter")
+                names.add(name)
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        # numeric fields of the component stats() dicts
+        for name, value in flatten(gauges or {}, "antimicrobial"):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: tuple) -> str:
+    if len(labels) == 0:
+        return ""
+    values = ",".join(f'{key}="{escape(value)}"' for key, value in labels)
+    return "{" + values + "}"
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def flatten(stats: Dict, prefix: str) -> list:
+    values = []
+    for key, value in stats.items():
+        name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+        if isinstance(value, dict):
+            values += flatten(value, name)
+        elif isinstance(value, bool):
+            values.append((name, int(value)))
+        elif isinstance(value, (int, float)):
+            values.append((name, value))
+    return values
+
+
+@lru_cache(maxsize=1024)
+def query_name(statement: str) -> str:
+    # "<verb> <first table>", e.g. "select public.model_group", prepared statements by name
+    verb = statement.split(None, 1)[0].lower() if statement.strip() else "unknown"
+    pattern = {"insert": r"\binto\s+([\w.\"]+)", "update": r"^\s*update\s+([\w.\"]+)",
+               "create": r"\btable\s+(?:if\s+not\s+exists\s+)?([\w.\"]+)",
+               "prepare": r"^\s*prepare\s+(\w+)", "execute": r"^\s*execute\s+(\w+)"}.get(verb, r"\bfrom\s+([\w.\"]+)")
+    table = re.search(pattern, statement, re.IGNORECASE)
+    return f"{verb} {table.group(1).lower()}" if table else verb
+
+
+def instrument_engine(conn, metrics: Metrics):
+    # SQL timings from the engine events, labelled by query name
+    @event.listens_for(conn, "before_cursor_execute")
+    def before_cursor_execute(con, cursor, statement, parameters, context, executemany):
+        con.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(conn, "after_cursor_execute")
+    def after_cursor_execute(con, cursor, statement, parameters, context, executemany):
+        start = con.info["query_start"].pop()
+        metrics.observe("db_query_duration_seconds",
+                        time.perf_counter() - start, query=query_name(statement))
+
+    @event.listens_for(conn, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute is not called for a failed query
+        if context.connection is not None and context.connection.info.get("query_start"):
+            context.connection.info["query_start"].pop()
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request, labelled by route path and status."""
+
+    def __init__(self, app, metrics: Metrics = metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+        self.paths = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # the router puts the matched endpoint in the scope
+            if self.paths is None and "app" in scope:
+                self.paths = {route.endpoint: route.path for route in scope["app"].routes
+                              if hasattr(route, "endpoint")}
+            path = (self.paths or {}).get(scope.get("endpoint"), "unmatched")
+            self.metrics.observe("http_request_duration_seconds", time.perf_counter() - start,
+                                 method=scope["method"], path=path, status=status[0])
@@ -0,0 +1,82 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ModelGroupRegistry:
+    """Historical model group versions of one vitek kept in memory, least recently used evicted over the memory budget."""
+
+    def __init__(self, predictor, memory_budget_mb: float = 512) -> None:
+        self.predictor = predictor
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.states = OrderedDict()
+        self.sizes = {}
+        self.loading = {}
+        self.loads = 0
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, vitek_id, version: int):
+        # only the requested vitek is loaded, a GN request never holds the GP models
+        key = (vitek_id, version)
+        with self.lock:
+            state = self.states.get(key)
+            if state is not None:
+                self.states.move_to_end(key)
+                self.hits += 1
+                return state
+            self.misses += 1
+            version_lock = self.loading.setdefault(key, threading.Lock())
+
+        # Only one request loads a version, the others wait for it
+        with version_lock:
+            with self.lock:
+                state = self.states.get(key)
+            if state is not None:
+                return state
+            # a fresh generation per load keeps cached answers of a replaced version unreachable
+            with self.lock:
+                self.loads += 1
+                generation = self.loads
+            state = self.predictor.load_state(generation, version, vitek_id)
+            if len(state.anti_names[vitek_id]) == 0:
+                with self.lock:
+                    self.loading.pop(key, None)
+                return None
+            state.load_models(self.predictor.workers)
+            size = state.memory_size()
+            logger.info("registry: vitek %d version %d loaded, %.1f MB",
+                        vitek_id + 1, version, size / 1024 / 1024)
+            with self.lock:
+                self.states[key] = state
+                self.sizes[key] = size
+                self.loading.pop(key, None)
+                while len(self.states) > 1 and sum(self.sizes.values()) > self.memory_budget:
+                    evicted, _ = self.states.popitem(last=False)
+                    self.sizes.pop(evicted)
+                    self.evictions += 1
+            return state
+
+    def clear(self):
+        with self.lock:
+            self.states = OrderedDict()
+            self.sizes = {}
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "memory_budget_mb": self.memory_budget / 1024 / 1024,
+                "memory_mb": sum(self.sizes.values()) / 1024 / 1024,
+                # [vitek_id, version] of the loaded groups
+                "versions": [[vitek_id + 1, version] for vitek_id, version in self.states.keys()],
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
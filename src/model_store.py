@@ -0,0 +1,115 @@
+import ast
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.engine import Engine
+from xgboost import Booster, XGBClassifier
+
+# Native binary XGBoost format, schema and binning in a small sidecar next to it
+MODEL_EXTENSION = ".model"
+METADATA_EXTENSION = ".meta.json"
+# JSON models written before the binary format, still loadable
+NATIVE_EXTENSIONS = (MODEL_EXTENSION, ".bst", ".json")
+
+
+def metadata_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + METADATA_EXTENSION
+
+
+def save_model(model: XGBClassifier, model_location, model_path: str, schema: list, submitted_sample_binning: list):
+    model.get_booster().save_model(f'{model_location}/{model_path}')
+    save_metadata(model_location, model_path, schema, submitted_sample_binning)
+
+
+def save_metadata(model_location, model_path: str, schema: list, submitted_sample_binning: list):
+    # the artifact can be read without the database
+    with open(f'{model_location}/{metadata_path(model_path)}', "w") as f:
+        json.dump({
+            "schema": list(schema),
+            "submitted_sample_binning": list(submitted_sample_binning),
+        }, f)
+
+
+def load_metadata(model_location, model_path: str) -> dict:
+    with open(f'{model_location}/{metadata_path(model_path)}') as f:
+        return json.load(f)
+
+
+def load_booster(model_location, model_path: str, nthread: int = None) -> Booster:
+    if not model_path.endswith(NATIVE_EXTENSIONS):
+        raise Exception(
+            f"{model_path} is not a native XGBoost model, run migrate_models.py first.")
+    return set_nthread(Booster(model_file=f'{model_location}/{model_path}'), nthread)
+
+
+def load_booster_raw(content: bytes, nthread: int = None) -> Booster:
+    # Binary or JSON model already in memory, XGBoost reads the format from the content
+    booster = Booster()
+    booster.load_model(bytearray(content))
+    return set_nthread(booster, nthread)
+
+
+def set_nthread(booster: Booster, nthread: int = None) -> Booster:
+    # explicit thread count, XGBoost would use every core for each call
+    if nthread is not None:
+        booster.set_param("nthread", nthread)
+    return booster
+
+
+def remove_model(model_location, model_path: str):
+    for path in [model_path, metadata_path(model_path)]:
+        if os.path.exists(f'{model_location}/{path}'):
+            os.remove(f'{model_location}/{path}')
+
+
+def predict_proba(booster: Booster, X) -> np.ndarray:
+    # Probability of the positive class, same as XGBClassifier.predict_proba(X)[:, 1]
+    if isinstance(X, pd.DataFrame):
+        X = X.values
+    return booster.inplace_predict(np.asarray(X, dtype=np.float32))
+
+
+def predict(booster: Booster, X) -> np.ndarray:
+    # Same as XGBClassifier.predict for a binary model
+    return (predict_proba(booster, X) > 0.5).astype(np.int64)
+
+
+def migrate_joblib_models(conn: Engine, model_location) -> int:
+    # One-time conversion of joblib pickles and JSON models to the binary format, every model gets its sidecar
+    query = sqlalchemy.text("""SELECT DISTINCT ON (m.id) m.id , m.schema , m.model_path , sub_binning.schema AS submitted_sample_binning
+        FROM public.model AS m
+        INNER JOIN public.model_group_model AS mgm ON mgm.model_id = m.id
+        INNER JOIN public.model_group AS mg ON mg.id = mgm.model_group_id
+        INNER JOIN public.submitted_sample_binning_model_group AS sub_binning ON sub_binning.model_group_id = mg.id
+        WHERE mg.version > 0
+        ORDER BY m.id , mg.version""")
+    models = pd.read_sql_query(query, conn)
+
+    query_update = sqlalchemy.text(
+        "UPDATE public.model SET model_path = :model_path WHERE id = :id")
+    migrated = 0
+    for model_id, schema, model_path, submitted_sample_binning in models.values:
+        if model_path.endswith((".joblib", ".json")):
+            new_path = os.path.splitext(model_path)[0] + MODEL_EXTENSION
+            if model_path.endswith(".joblib"):
+                joblib.load(f'{model_location}/{model_path}').get_booster().save_model(
+                    f'{model_location}/{new_path}')
+            else:
+                Booster(model_file=f'{model_location}/{model_path}').save_model(
+                    f'{model_location}/{new_path}')
+            with conn.connect() as con:
+                con.execute(query_update, model_path=new_path, id=int(model_id))
+            model_path = new_path
+            migrated += 1
+        if not os.path.exists(f'{model_location}/{metadata_path(model_path)}'):
+            save_metadata(model_location, model_path, parse_list(schema),
+                          parse_list(submitted_sample_binning))
+    return migrated
+
+
+def parse_list(value: str) -> list:
+    # schema columns are stored as str(list), read back without eval
+    return list(ast.literal_eval(value))
@@ -1,16 +1,29 @@
 import numpy as np
 import pandas as pd
-import sqlalchemy
 from sqlalchemy.engine import Engine
 from xgboost import XGBClassifier
 from imblearn.over_sampling import SMOTE, ADASYN, BorderlineSMOTE, SVMSMOTE
 from sklearn.metrics import precision_score, recall_score, f1_score, accuracy_score
 from typing import Dict
-import joblib
 import datetime
 import os
 from src.rsmote import RSmoteKClasses
 from src.retraining_status import check_retraining_status
+from src.model_store import MODEL_EXTENSION, save_model, load_booster, remove_model, predict_proba, predict, parse_list
+from src.thread_budget import ThreadBudget
+from src.submitted_sample_latest import refresh_submitted_sample_latest
+from src.repository import (fetch_column, fetch_scalar, fetch_all, fetch_frame, run, append_frame, transaction, execute,
+                            query_model_group_measure, query_current_model_group_measure, query_lock_retraining,
+                            query_insert_model, query_insert_model_group, query_insert_model_group_model,
+                            query_insert_model_group_file, query_insert_submitted_sample_binning,
+                            query_update_model_group_model, query_model_current_version, query_model_group_models,
+                            query_delete_model, query_delete_model_group, query_report_train_id, query_report_test_id,
+                            query_report_test_by_case_id, query_ordered_antimicrobial_answer, query_model_group_model_files,
+                            query_model_group_lastest_version, query_model_group_performance, query_model_group_id,
+                            query_model_group_model_id, query_model_configuration)
+
+# model_configuration.algorithm -> classifier
+ALGORITHMS = {"XGBClassifier": XGBClassifier}
 
 # SMOTE
 
@@ -32,11 +45,12 @@ class SMOTERounding:
 
 
 class ModelRetraining:
-    def __init__(self, db, vitek_id: int, conn: Engine, model_location) -> None:
+    def __init__(self, db, vitek_id: int, conn: Engine, model_location, thread_budget: ThreadBudget = None) -> None:
         self.db = db
         self.vitek_id = vitek_id
         self.conn = conn
         self.model_location = model_location
+        self.thread_budget = thread_budget or ThreadBudget()
 
     def training(self, retraining_id: int):
         vitek = ["GN", "GP"][self.vitek_id - 1]
@@ -91,15 +105,18 @@ class ModelRetraining:
             model.fit(X_resampling, y_resampling)
 
             # Evaluate model
-            measure = self.evaluation(X_test_dummies, y_test, model)
+            measure = self.evaluation(
+                X_test_dummies, y_test, model.get_booster())
 
             # Dump model
-            model_path = dir_path + f"/{anti_name.replace('/','_')}.joblib"
-            joblib.dump(model, f'{self.model_location}/{model_path}')
+            model_path = dir_path + \
+                f"/{anti_name.replace('/','_')}{MODEL_EXTENSION}"
+            save_model(model, self.model_location, model_path,
+                       X_test_dummies.columns, submitted_sample_binning)
 
             # Compare new model with current model and evaluate new current
             compare_result, eval_current_new = self.evaluate_compare_model(X_test, y_test, current_model.loc[anti_id],
-                                                      eval(current_model.loc[anti_id]["schema"]), eval_new=measure)
+                                                      parse_list(current_model.loc[anti_id]["schema"]), eval_new=measure)
             eval_current_new["anti_id"] = anti_id
             current_evaluation = current_evaluation.append(eval_current_new, ignore_index=True)
             
@@ -129,17 +146,10 @@ class ModelRetraining:
         test_by_case_measure = self.test_by_case(last_ver+1)
 
         # UPDATE model_group
-        with self.conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                UPDATE public.model_group
-                SET accuracy=:accuracy, precision=:precision, recall=:recall, f1=:f1
-                WHERE id = :id
-                """)
-            rs = con.execute(query, accuracy=test_by_case_measure["accuracy"],
-                             precision=test_by_case_measure["precision"],
-                             recall=test_by_case_measure["recall"],
-                             f1=test_by_case_measure["f1"], id=model_group_id)
+        run(self.conn, query_model_group_measure, accuracy=test_by_case_measure["accuracy"],
+            precision=test_by_case_measure["precision"],
+            recall=test_by_case_measure["recall"],
+            f1=test_by_case_measure["f1"], id=model_group_id)
 
         # if cancel final check
         if check_retraining_status(retraining_id, self.conn):
@@ -147,14 +157,7 @@ class ModelRetraining:
             return -1
         else :
             # not be able to cancel
-            with self.conn.connect() as con:
-                query = sqlalchemy.text(
-                    """
-                    UPDATE public.retraining_log
-                    SET cancel = false
-                    WHERE id = :id
-                    """)
-                con.execute(query, id=retraining_id)
+            run(self.conn, query_lock_retraining, id=retraining_id)
         
         # UPDATE model current version
         self.update_model_current_version(current_evaluation.set_index('anti_id'))
@@ -182,7 +185,7 @@ class ModelRetraining:
                         'f1': lambda true, pred: f1_score(true, [p >= threshold for p in pred]),
                         }
 
-        return {key: value(y, [ctrue for _, ctrue in model.predict_proba(X)]) for key, value in measures.items()}
+        return {key: value(y, list(predict_proba(model, X))) for key, value in measures.items()}
 
     def test_by_case(self, version: int):
         # antimicrobial answer startswith "ans_"
@@ -194,7 +197,7 @@ class ModelRetraining:
         y_bycase = test_bycase[list(
             test_bycase.columns[test_bycase.columns.isin(anti_ans)])]  # answer
 
-        models = [["ans_" + row[0], joblib.load(f"{self.model_location}/{row[1]}"), eval(row[2])]
+        models = [["ans_" + row[0], load_booster(self.model_location, row[1], self.thread_budget.training_threads), parse_list(row[2])]
                   for row in self.get_model(version).values]  # load model
         df_predict = pd.DataFrame()
 
@@ -202,7 +205,7 @@ class ModelRetraining:
             df_schema = pd.DataFrame(columns=model[2])  # create schema
             X_dummies = self.get_dummies_dataframe_columns(
                 df_schema, pd.get_dummies(X_bycase))  # one-hot
-            df_predict[model[0]] = model[1].predict(X_dummies)  # predict
+            df_predict[model[0]] = predict(model[1], X_dummies)  # predict
 
         return self.evaluate_by_case(y_bycase, df_predict)
 
@@ -245,7 +248,7 @@ class ModelRetraining:
         X_test_dummies = self.get_dummies_dataframe_columns(
             df_schema, pd.get_dummies(X_test))
         eval_current = self.evaluation(
-            X_test_dummies, y_test, joblib.load(f'{self.model_location}/{model_old["model_path"]}'))
+            X_test_dummies, y_test, load_booster(self.model_location, model_old["model_path"], self.thread_budget.training_threads))
         if eval_new["f1"] > eval_current["f1"]:
             performance = "better"
             eval_current_new = eval_new
@@ -260,64 +263,34 @@ class ModelRetraining:
 
     def insert_into_db(self, rows: list, submitted_sample_binning: list, version: int):
         # INSERT model
-        with self.conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                INSERT INTO public.model(antimicrobial_id, schema, model_path, create_at, performance, accuracy, precision, recall, f1) 
-                VALUES (:antimicrobial_id, :schema, :model_path, :create_at, :performance, :accuracy, :precision, :recall, :f1) 
-                RETURNING id;
-                """)
-
-            model_id_list = []
-            for new_row in rows:
-                rs = con.execute(query, **new_row)
-                for row in rs:
-                    model_id_list.append(row[0])
-
-        # INSERT model_group
-        with self.conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                INSERT INTO public.model_group(version, vitek_id) 
-                VALUES (:version, :vitek_id) 
-                RETURNING id;
-                """)
-            rs = con.execute(query, version=version, vitek_id=self.vitek_id)
-
-            for row in rs:
-                model_group_id = row[0]
-
-        # INSERT model_group_model
-        with self.conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                INSERT INTO public.model_group_model(model_group_id, model_id) 
-                VALUES (:model_group_id, :model_id) 
-                """)
+        # model, model_group and its links in one transaction
+        def insert(con):
+            model_id_list = [execute(con, query_insert_model, **new_row).scalar()
+                             for new_row in rows]
+
+            # INSERT model_group
+            model_group_id = execute(con, query_insert_model_group,
+                                     version=version, vitek_id=self.vitek_id).scalar()
+
+            # INSERT model_group_model
             for model_id in model_id_list:
-                rs = con.execute(
-                    query, model_group_id=model_group_id, model_id=model_id)
-
-        # INSERT model_group_file
-        with self.conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                INSERT INTO public.model_group_file(file_id, model_group_id) 
-                VALUES (:file_id, :model_group_id) 
-                """)
+                execute(con, query_insert_model_group_model,
+                        model_group_id=model_group_id, model_id=model_id)
+
+            # INSERT model_group_file
             for file_id in self.db.file_id:
-                rs = con.execute(query, file_id=file_id,
-                                 model_group_id=model_group_id)
-
-        # INSERT submitted_sample_binning_model_group
-        with self.conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                INSERT INTO public.submitted_sample_binning_model_group(model_group_id, schema) 
-                VALUES (:model_group_id, :schema) 
-                """)
-            con.execute(query, model_group_id=model_group_id,
-                        schema=str(submitted_sample_binning))
+                execute(con, query_insert_model_group_file, file_id=int(file_id),
+                        model_group_id=model_group_id)
+
+            # INSERT submitted_sample_binning_model_group
+            execute(con, query_insert_submitted_sample_binning, model_group_id=model_group_id,
+                    schema=str(submitted_sample_binning))
+            return model_group_id
+
+        model_group_id = transaction(self.conn, insert)
+
+        # materialize the latest submitted_sample vocabulary of the vitek
+        refresh_submitted_sample_latest(self.conn, self.vitek_id)
 
         return model_group_id
 
@@ -330,109 +303,54 @@ class ModelRetraining:
                 current_evaluation.loc[int(perf["anti_id"]), "model_id"] = perf["model_id"]
                 mgm_id = self.get_model_group_model_id(
                     mg_id=current_model_group_id, anti_id=perf["anti_id"])
-                with self.conn.connect() as con:
-                    query = sqlalchemy.text(
-                        """
-                        UPDATE public.model_group_model
-                        SET model_id = :model_id
-                        WHERE id = :id
-                        """)
-                    rs = con.execute(
-                        query, model_id=perf["model_id"], id=mgm_id)
+                run(self.conn, query_update_model_group_model, model_id=perf["model_id"], id=mgm_id)
         
         # INSERT model_current
-        query_current_ver = sqlalchemy.text(
-                """
-                SELECT MAX(model_current.version) 
-                FROM public.model_current AS model_current
-                INNER JOIN public.model AS model ON model.id = model_current.model_id
-                INNER JOIN public.antimicrobial_answer AS anti_answer ON anti_answer.id = model.antimicrobial_id
-                INNER JOIN public.vitek_id_card AS vitek_id_card ON vitek_id_card.id = anti_answer.vitek_id
-                WHERE vitek_id_card.id = :vitek_id
-                """)
-        current_ver = int(pd.read_sql_query(query_current_ver, self.conn, params={"vitek_id": self.vitek_id}).values[0][0])      
+        current_ver = int(fetch_scalar(self.conn, query_model_current_version, vitek_id=self.vitek_id))
         current_evaluation["version"] = [current_ver+1]*len(current_evaluation)
-        current_evaluation.to_sql('model_current', schema='public',
-                            con=self.conn, if_exists='append', index=False)
+        append_frame(self.conn, 'model_current', current_evaluation)
         
         # Test By Case
         test_by_case_measure = self.test_by_case(0)
         
         # UPDATE model_group
-        with self.conn.connect() as con:
-            query = sqlalchemy.text(
-                """
-                UPDATE public.model_group
-                SET accuracy=:accuracy, precision=:precision, recall=:recall, f1=:f1
-                WHERE vitek_id = :vitek_id AND version = 0
-                """)
-            con.execute(query, accuracy=test_by_case_measure["accuracy"],
-                        precision=test_by_case_measure["precision"],
-                        recall=test_by_case_measure["recall"],
-                        f1=test_by_case_measure["f1"], vitek_id=self.vitek_id)
+        run(self.conn, query_current_model_group_measure, accuracy=test_by_case_measure["accuracy"],
+            precision=test_by_case_measure["precision"],
+            recall=test_by_case_measure["recall"],
+            f1=test_by_case_measure["f1"], vitek_id=self.vitek_id)
 
     def remove_model_group(self, model_group_id):
         # DELETE model
-        with self.conn.connect() as con:
-            query_get_model = sqlalchemy.text(
-                """
-                SELECT m.id , m.model_path FROM public.model_group_model AS mgm
-                INNER JOIN public.model AS m ON m.id = mgm.model_id
-                WHERE model_group_id = :id;
-                """)
-            rs = con.execute(query_get_model, id=model_group_id)
-
-            query_del_model = sqlalchemy.text(
-                """
-                DELETE FROM public.model
-                WHERE id = :id;
-                """)
-
-            for row in rs:
-                model_id = row[0]
-                model_path = row[1]
-                con.execute(query_del_model, id=model_id)
-                os.remove(model_path)
-
-            query_del_model_group = sqlalchemy.text(
-                """
-                DELETE FROM public.model_group
-                WHERE id = :id;
-                """)
-
-            con.execute(query_del_model_group, id=model_group_id)
+        models = fetch_all(self.conn, query_model_group_models, id=model_group_id)
+
+        def delete(con):
+            for model_id, _ in models:
+                execute(con, query_delete_model, id=model_id)
+            execute(con, query_delete_model_group, id=model_group_id)
+        transaction(self.conn, delete)
+
+        # files go once the rows are gone
+        for _, model_path in models:
+            remove_model(self.model_location, model_path)
+
+        refresh_submitted_sample_latest(self.conn, self.vitek_id)
 
     ########### Query ##########
 
     def get_train_test(self, anti_id: int):
-        query_train_id = sqlalchemy.text("""
-                                         SELECT report_id 
-                                         FROM public.report_train
-                                         INNER JOIN public.report ON public.report.id = public.report_train.report_id
-                                         WHERE sub_type = 'train' AND antimicrobial_id = :anti_id AND file_id = :file_id
-                                         """)
-        query_test_id = sqlalchemy.text("""
-                                        SELECT report_id
-                                        FROM public.report_train
-                                        INNER JOIN public.report ON public.report.id = public.report_train.report_id
-                                        WHERE sub_type = 'test' AND antimicrobial_id = :anti_id AND file_id = :file_id
-                                        """)
         train_id = []
         test_id = []
         for file_id in self.db.file_id:
-            train_id.extend(pd.read_sql_query(query_train_id, self.conn, params={
-                            "anti_id": anti_id, "file_id": file_id})["report_id"])
-            test_id.extend(pd.read_sql_query(query_test_id, self.conn, params={
-                           "anti_id": anti_id, "file_id": file_id})["report_id"])
+            train_id.extend(fetch_column(self.conn, query_report_train_id,
+                                         anti_id=anti_id, file_id=file_id))
+            test_id.extend(fetch_column(self.conn, query_report_test_id,
+                                        anti_id=anti_id, file_id=file_id))
         df_train = self.db.table.loc[train_id]
         df_test = self.db.table.loc[test_id]
         return df_train, df_test
 
     def get_antimicrobial_ans(self) -> Dict:
-        query_ans = sqlalchemy.text(
-            "SELECT id, name FROM public.antimicrobial_answer WHERE vitek_id = :v_id ORDER BY id")
-        ans_name = pd.read_sql_query(query_ans, self.conn, params={
-                                     "v_id": self.vitek_id})
+        ans_name = fetch_frame(self.conn, query_ordered_antimicrobial_answer, v_id=self.vitek_id)
         anti_id_range = [
             np.arange(1, 12),  # GN
             np.arange(12, 23),  # GP
@@ -442,83 +360,37 @@ class ModelRetraining:
         return anti_ans
 
     def get_test_bycase(self):
-        query_test_id = sqlalchemy.text("""
-                                        SELECT public.report.id 
-                                        FROM public.report
-                                        WHERE type = 'test' AND public.report.vitek_id = :v_id AND file_id = :file_id
-                                        """)
         test_id = []
         for file_id in self.db.file_id:
-            test_id.extend(pd.read_sql_query(query_test_id, self.conn, params={
-                           "v_id": self.vitek_id, "file_id":  file_id})['id'])
+            test_id.extend(fetch_column(self.conn, query_report_test_by_case_id,
+                                        v_id=self.vitek_id, file_id=file_id))
         df_test = self.db.table.loc[test_id]
         return df_test
 
     def get_model(self, version: int):
-        query_model = sqlalchemy.text("""SELECT ans.id, ans.name, model_path, schema, m.id as model_id
-            FROM public.model_group as mg
-            INNER JOIN public.model_group_model as mgm ON mgm.model_group_id = mg.id
-            INNER JOIN public.model as m ON m.id = mgm.model_id
-            INNER JOIN public.antimicrobial_answer as ans ON ans.id = m.antimicrobial_id
-            WHERE mg.version = :version AND mg.vitek_id = :v_id
-            ORDER BY ans.name""")
-        model = pd.read_sql_query(query_model, self.conn, params={
-                                  "version": version, "v_id": self.vitek_id})
+        model = fetch_frame(self.conn, query_model_group_model_files, version=version, v_id=self.vitek_id)
         model.set_index("id", inplace=True)
         return model
 
     def lastest_version(self):
-        query = sqlalchemy.text(
-            """ SELECT MAX(version)
-                FROM public.model_group
-                WHERE vitek_id = :vitek_id
-            """)
-        lastest_version = pd.read_sql_query(
-            query, self.conn, params={"vitek_id": self.vitek_id}).values[0][0]
+        lastest_version = fetch_scalar(self.conn, query_model_group_lastest_version, vitek_id=self.vitek_id)
         return int(lastest_version)
 
     def get_performance_model(self, version: int) -> Dict:
-        query = sqlalchemy.text(
-            """
-            SELECT m.id, m.antimicrobial_id, m.performance
-            FROM public.model_group as mg
-            INNER JOIN public.model_group_model as mgm ON mgm.model_group_id = mg.id
-            INNER JOIN public.model as m ON m.id = mgm.model_id
-            WHERE vitek_id = :v_id AND version = :version
-            """)
-        performance = pd.read_sql_query(query, self.conn, params={
-                                        "v_id": self.vitek_id, "version": version})
-        return [{"model_id": row[0], "anti_id": row[1], "performance": row[2]} for row in performance.values]
+        performance = fetch_all(self.conn, query_model_group_performance, v_id=self.vitek_id, version=version)
+        return [{"model_id": row[0], "anti_id": row[1], "performance": row[2]} for row in performance]
 
     def get_current_model_group_id(self, version: int):
-        query = sqlalchemy.text(
-            """
-            SELECT id
-            FROM public.model_group
-            WHERE vitek_id = :v_id AND version = :version
-            """)
-        model_group_id = pd.read_sql_query(query, self.conn, params={
-                                           "v_id": self.vitek_id, "version": version}).values[0][0]
+        model_group_id = fetch_scalar(self.conn, query_model_group_id, v_id=self.vitek_id, version=version)
         return int(model_group_id)
 
     def get_model_group_model_id(self, mg_id: int, anti_id: int):
-        query = sqlalchemy.text(
-            """
-            SELECT mgm.id
-            FROM public.model_group_model as mgm
-            INNER JOIN public.model as m ON m.id = mgm.model_id
-            WHERE model_group_id = :mg_id AND antimicrobial_id = :anti_id
-            """)
-        mgm_id = pd.read_sql_query(query, self.conn, params={
-                                   "mg_id": mg_id, "anti_id": anti_id}).values[0][0]
+        mgm_id = fetch_scalar(self.conn, query_model_group_model_id, mg_id=mg_id, anti_id=anti_id)
         return int(mgm_id)
 
     def get_model_configuration(self, anti_id: int):
-        query = sqlalchemy.text(
-            "SELECT * FROM public.model_configuration WHERE antimicrobial_id = :anti_id")
-        config = pd.read_sql_query(query, self.conn, params={
-                                   "anti_id": anti_id}).iloc[0]
-        model = eval(config["algorithm"])(eval_metric=f1_score,
+        config = fetch_frame(self.conn, query_model_configuration, anti_id=anti_id).iloc[0]
+        model = ALGORITHMS[config["algorithm"]](eval_metric=f1_score,
                                           verbosity=0,
                                           use_label_encoder=False,
                                           random_state=int(
@@ -531,7 +403,8 @@ class ModelRetraining:
                                           colsample_bytree=float(
                                               config["colsample_bytree"]),
                                           learning_rate=float(
-                                              config["learning_rate"])
+                                              config["learning_rate"]),
+                                          n_jobs=self.thread_budget.training_threads
                                           )
         smote_algo = {
             "SMOTE": SMOTE,
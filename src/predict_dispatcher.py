@@ -0,0 +1,102 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict
+
+
+class PredictDispatcher:
+    """Collect concurrent predict calls and score them together with score_batch."""
+
+    def __init__(self, predictor, window_ms: float = 3, max_batch: int = 32, max_queue: int = 1024) -> None:
+        self.predictor = predictor
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+
+        # metrics
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.rejected = 0
+        self.batch_size_max = 0
+        self.wait_time_total = 0.0
+
+        # started by the first call of each process, threads do not survive a gunicorn fork
+        self.pid = None
+        self.queue = None
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue(maxsize=self.max_queue)
+                self.thread = threading.Thread(
+                    target=self.run, args=(self.queue,), name="predict-dispatcher", daemon=True)
+                self.thread.start()
+                self.pid = os.getpid()
+
+    def predict(self, data: Dict, vitek_id, state=None) -> Dict:
+        if self.pid != os.getpid():
+            self.start()
+        future = Future()
+        try:
+            self.queue.put_nowait((data, vitek_id, state, future, time.monotonic()))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise
+        return future.result()
+
+    def run(self, requests: queue.Queue):
+        while True:
+            items = [requests.get()]
+            deadline = time.monotonic() + self.window
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.dispatch(items)
+
+    def dispatch(self, items: list):
+        now = time.monotonic()
+        with self.lock:
+            self.requests += len(items)
+            self.batches += 1
+            self.batch_size_max = max(self.batch_size_max, len(items))
+            self.wait_time_total += sum(now - item[4] for item in items)
+
+        # one score_batch per vitek and state
+        batch = {}
+        for data, vitek_id, state, future, _ in items:
+            batch.setdefault((vitek_id, state), []).append((data, future))
+        for (vitek_id, state), group in batch.items():
+            try:
+                scores = self.predictor.score_batch(
+                    [data for data, _ in group], vitek_id, state)
+            except Exception as ex:
+                for _, future in group:
+                    future.set_exception(ex)
+                continue
+            for (_, future), row in zip(group, scores):
+                future.set_result(row)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+                "requests": self.requests,
+                "batches": self.batches,
+                "rejected": self.rejected,
+                "batch_size_mean": self.requests / self.batches if self.batches else 0,
+                "batch_size_max": self.batch_size_max,
+                "wait_ms_mean": self.wait_time_total * 1000 / self.requests if self.requests else 0,
+            }
@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+
+class PredictionCache:
+    """Bounded LRU cache with TTL for final predict answers."""
+
+    def __init__(self, max_size: int = 4096, ttl: float = 3600) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.flushes = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if item[0] < now:
+                del self.items[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        expire = time.monotonic() + self.ttl
+        with self.lock:
+            self.items[key] = (expire, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.items = OrderedDict()
+            self.flushes += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "size": len(self.items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "flushes": self.flushes,
+            }
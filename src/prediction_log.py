@@ -0,0 +1,131 @@
+import csv
+import datetime
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionLog:
+    """Write-behind log of predictions, written in batches with COPY by a background thread."""
+
+    def __init__(self, conn: Engine, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 1) -> None:
+        self.conn = conn
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # metrics
+        self.lock = threading.Lock()
+        self.logged = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.write_time_total = 0.0
+
+        # started by the first call of each process, threads do not survive a gunicorn fork
+        self.pid = None
+        self.queue = None
+
+    def start(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue(maxsize=self.max_queue)
+                threading.Thread(target=self.run, args=(self.queue,),
+                                 name="prediction-log", daemon=True).start()
+                self.pid = os.getpid()
+
+    def record(self, data: Dict, vitek_id, model_group: tuple, scores: Dict, answers: Dict, latency: float):
+        # Never blocks, a full buffer drops the record
+        if self.pid != os.getpid():
+            self.start()
+        # (id, version) of the model group that answered, None writes NULL
+        model_group_id, version = model_group or (None, None)
+        try:
+            self.queue.put_nowait((datetime.datetime.now(), vitek_id + 1, model_group_id, version,
+                                   data, scores, answers, latency * 1000))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def run(self, records: queue.Queue):
+        while True:
+            rows = [records.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(records.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.write(rows)
+
+    def flush(self):
+        # Write what is still buffered, called on shutdown
+        if self.queue is None or self.pid != os.getpid():
+            return
+        rows = []
+        while True:
+            try:
+                rows.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(rows) == self.batch_size:
+                self.write(rows)
+                rows = []
+        if len(rows) > 0:
+            self.write(rows)
+
+    def write(self, rows: list):
+        start = time.perf_counter()
+        # serialized here, off the request thread
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            (create_at, vitek_id, model_group_id, version, json.dumps(data),
+             json.dumps({anti.replace("_", "/"): float(score) for anti, score in scores.items()}),
+             json.dumps(answers), latency_ms)
+            for create_at, vitek_id, model_group_id, version, data, scores, answers, latency_ms in rows)
+        buffer.seek(0)
+        try:
+            # COPY through the psycopg2 connection, one round trip per batch
+            con = self.conn.raw_connection()
+            try:
+                with con.cursor() as cursor:
+                    cursor.copy_expert(
+                        "COPY public.prediction_log (create_at, vitek_id, model_group_id, version, input, scores, answers, latency_ms) FROM STDIN WITH (FORMAT csv)",
+                        buffer)
+                con.commit()
+            finally:
+                con.close()
+        except Exception:
+            logger.exception("prediction log: %d records lost", len(rows))
+            with self.lock:
+                self.errors += 1
+                self.dropped += len(rows)
+            return
+        with self.lock:
+            self.logged += len(rows)
+            self.batches += 1
+            self.write_time_total += time.perf_counter() - start
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "max_queue": self.max_queue,
+                "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+                "logged": self.logged,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "errors": self.errors,
+                "batch_size_mean": self.logged / self.batches if self.batches else 0,
+                "write_ms_mean": self.write_time_total * 1000 / self.batches if self.batches else 0,
+            }
@@ -1,23 +1,332 @@
+import numpy as np
 import pandas as pd
-import joblib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
 from sqlalchemy.engine import Engine
+from xgboost import DMatrix
 import sqlalchemy
+from src.prediction_cache import PredictionCache
+from src.model_store import load_booster, load_booster_raw, predict_proba, parse_list
+from src.predictor_bundle import export_bundle, load_bundle
+from src.tree_engine import TreeEngine
+from src.thread_budget import ThreadBudget
+from src.answer_table import AnswerTable
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STAGE = "predictor_stage_duration_seconds"
+# contributions kept per recommended antimicrobial, the explain cache holds this many
+EXPLAIN_TOP_MAX = 20
+# columns of the model metadata queries
+STATE_COLUMNS = ["name", "model_schema", "model_path", "submitted_sample_binning",
+                 "model_group_id", "model_group_version"]
+
+
+class PredictorState:
+    """Models of one reload, never modified after it is built (models may be loaded on demand)."""
+    GN = 0
+    GP = 1
+
+    def __init__(self, generation: int, anti_names: list, models_schema: list, submitted_sample_binning: list, model_paths: list, loader, version: int = 0, engine: bool = False, model_groups: list = None) -> None:
+        self.generation = generation
+        self.version = version
+        # (model_group id, version) the models of each vitek were trained in, logged with every prediction
+        self.model_groups = model_groups or [None, None]
+        self.engine = engine
+        # TreeEngine of each vitek, built once all its models are loaded
+        self.engines = [None, None]
+        self.anti_names = anti_names
+        self.models_schema = models_schema
+        self.submitted_sample_binning = submitted_sample_binning
+        self.model_paths = model_paths
+        self.loader = loader
+        self.models = [{}, {}]
+        self.models_lock = [{anti: threading.Lock() for anti in self.model_paths[self.GN]},
+                            {anti: threading.Lock() for anti in self.model_paths[self.GP]}]
+
+        schema_all = [set(), set()]
+
+        for schema in self.models_schema[self.GN].values():
+            schema_all[self.GN].update(schema)
+        for schema in self.models_schema[self.GP].values():
+            schema_all[self.GP].update(schema)
+
+        # Feature vocabulary shared by every model of a vitek
+        self.features = [sorted(schema_all[self.GN]),
+                         sorted(schema_all[self.GP])]
+        self.features_index = [{col: i for i, col in enumerate(self.features[self.GN])},
+                               {col: i for i, col in enumerate(self.features[self.GP])}]
+
+        # Column indexes of each model's schema inside the vocabulary
+        self.models_index = [{anti: np.array([self.features_index[self.GN][col] for col in schema], dtype=np.intp)
+                              for anti, schema in self.models_schema[self.GN].items()},
+                             {anti: np.array([self.features_index[self.GP][col] for col in schema], dtype=np.intp)
+                              for anti, schema in self.models_schema[self.GP].items()}]
+
+        # Every submitted sample known by at least one binning
+        self.submitted_sample_all = [set().union(*self.submitted_sample_binning[self.GN].values()),
+                                     set().union(*self.submitted_sample_binning[self.GP].values())]
+
+    def model(self, vitek_id, anti):
+        # Load a single model the first time it is needed
+        model = self.models[vitek_id].get(anti)
+        if model is None:
+            with self.models_lock[vitek_id][anti]:
+                model = self.models[vitek_id].get(anti)
+                if model is None:
+                    model = self.loader(self.model_paths[vitek_id][anti])
+                    self.models[vitek_id][anti] = model
+        return model
+
+    def load_models(self, workers: int):
+        # Model artifacts in parallel
+        start = time.perf_counter()
+        keys = [(vitek_id, anti) for vitek_id in [self.GN, self.GP]
+                for anti in self.anti_names[vitek_id]]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda key: self.model(*key), keys))
+        logger.info("predictor: %d models loaded in %.2fs", len(keys),
+                    time.perf_counter() - start)
+        if self.engine:
+            for vitek_id in [self.GN, self.GP]:
+                self.build_engine(vitek_id)
+
+    def build_engine(self, vitek_id):
+        # Parity with XGBoost is checked by tests/test_tree_engine.py, unsupported models are called one by one
+        if len(self.anti_names[vitek_id]) == 0 or self.engines[vitek_id] is not None:
+            return
+        boosters = [self.model(vitek_id, anti) for anti in self.anti_names[vitek_id]]
+        features_maps = [self.models_index[vitek_id][anti] for anti in self.anti_names[vitek_id]]
+        try:
+            self.engines[vitek_id] = TreeEngine(boosters, features_maps)
+        except Exception:
+            logger.exception("predictor: tree engine not supported")
+
+    def memory_size(self) -> int:
+        # Serialized size of the loaded boosters, close to their memory use
+        return sum(len(model.save_raw()) for vitek_id in [self.GN, self.GP]
+                   for model in self.models[vitek_id].values())
+
+    def loaded(self) -> bool:
+        return all(len(self.models[vitek_id]) == len(self.model_paths[vitek_id]) for vitek_id in [self.GN, self.GP])
+
+    def cache_key(self, data: Dict, vitek_id) -> tuple:
+        # Only values that reach the encoded row are part of the key
+        features_index = self.features_index[vitek_id]
+        submitted_sample = data['submitted_sample']
+        if not submitted_sample in self.submitted_sample_all[vitek_id]:
+            submitted_sample = "other"
+        features = tuple(sorted(
+            (key, value) for key, value in data.items()
+            if key != 'submitted_sample' and f'{key}_{value}' in features_index))
+        return (self.generation, self.version, vitek_id, submitted_sample, features)
+
+    def encode(self, data: Dict, vitek_id) -> np.ndarray:
+        # One-hot row over the vocabulary, same columns as pd.get_dummies (submitted_sample excluded)
+        features_index = self.features_index[vitek_id]
+        row = np.zeros(len(features_index), dtype=np.float32)
+        for key, value in data.items():
+            if key == 'submitted_sample':
+                continue
+            col = features_index.get(f'{key}_{value}')
+            if col is not None:
+                row[col] = 1
+        return row
+
+    def predict_batch(self, data: list, vitek_id) -> list:
+        scores = self.scores(data, vitek_id)
+        with metrics.timer(STAGE, stage="answer"):
+            return [self.answer(row) for row in scores]
+
+    def sample_columns(self, data: list, vitek_id) -> list:
+        # submitted_sample column of each row, for every antimicrobial in order
+        features_index = self.features_index[vitek_id]
+        submitted_samples = [row['submitted_sample'] for row in data]
+        anti_sample_cols = []
+        for anti in self.anti_names[vitek_id]:
+            binning = self.submitted_sample_binning[vitek_id][anti]
+            for i, submitted_sample in enumerate(submitted_samples):
+                # once binned to "other" the sample stays "other" for the next antimicrobials
+                if not submitted_sample in binning:
+                    submitted_samples[i] = "other"
+            anti_sample_cols.append([features_index.get(f'submitted_sample_{submitted_sample}')
+                                     for submitted_sample in submitted_samples])
+        return anti_sample_cols
+
+    def scores(self, data: list, vitek_id) -> list:
+        # Raw positive class probability of every antimicrobial, one dict per row
+        with metrics.timer(STAGE, stage="encode"):
+            X = np.stack([self.encode(row, vitek_id) for row in data])
+        with metrics.timer(STAGE, stage="binning"):
+            anti_sample_cols = self.sample_columns(data, vitek_id)
+
+        scores = {}
+        engine = self.engines[vitek_id]
+        start = time.perf_counter()
+        if engine is not None:
+            # every model of the vitek in one traversal, each with its own submitted_sample column
+            X_models = np.repeat(X[:, None, :], len(anti_sample_cols), axis=1)
+            for j, sample_cols in enumerate(anti_sample_cols):
+                for i, col in enumerate(sample_cols):
+                    if col is not None:
+                        X_models[i, j, col] = 1
+            proba = engine.predict_proba(X_models)
+            for j, anti in enumerate(self.anti_names[vitek_id]):
+                scores[anti] = proba[:, j]
+            metrics.observe(STAGE, time.perf_counter() - start, stage="tree_engine")
+        else:
+            predict_time = 0.0
+            sample_cols = [None] * len(data)
+            for anti, cols in zip(self.anti_names[vitek_id], anti_sample_cols):
+                model = self.model(vitek_id, anti)
+                for i, col in enumerate(cols):
+                    if col != sample_cols[i]:
+                        if sample_cols[i] is not None:
+                            X[i, sample_cols[i]] = 0
+                        if col is not None:
+                            X[i, col] = 1
+                        sample_cols[i] = col
+                dummies_data = X[:, self.models_index[vitek_id][anti]]
+                predict_start = time.perf_counter()
+                scores[anti] = predict_proba(model, dummies_data)
+                predict_time += time.perf_counter() - predict_start
+            metrics.observe(STAGE, predict_time, stage="predict_proba")
+        return [{anti: score[i] for anti, score in scores.items()} for i in range(len(data))]
+
+    def explain(self, data: list, vitek_id, top: int = EXPLAIN_TOP_MAX) -> list:
+        # Top feature contributions (log-odds) of every recommended antimicrobial, one dict per row
+        X = np.stack([self.encode(row, vitek_id) for row in data])
+        anti_sample_cols = self.sample_columns(data, vitek_id)
+        scores = self.scores(data, vitek_id)
+        explanations = [{} for _ in data]
+        for anti, sample_cols in zip(self.anti_names[vitek_id], anti_sample_cols):
+            rows = [i for i in range(len(data)) if scores[i][anti] >= 0.5]
+            if len(rows) == 0:
+                continue
+            X_anti = X[rows]
+            for j, i in enumerate(rows):
+                if sample_cols[i] is not None:
+                    X_anti[j, sample_cols[i]] = 1
+            X_anti = X_anti[:, self.models_index[vitek_id][anti]]
+            # one native pred_contribs call per model for all rows
+            contribs = self.model(vitek_id, anti).predict(
+                DMatrix(X_anti), pred_contribs=True, validate_features=False)
+            schema = self.models_schema[vitek_id][anti]
+            for j, i in enumerate(rows):
+                order = np.argsort(-np.abs(contribs[j, :-1]))[:top]
+                explanations[i][anti.replace("_", '/')] = {
+                    "score": round(float(scores[i][anti])*100, 2),
+                    "bias": round(float(contribs[j, -1]), 4),
+                    "contributions": [{
+                        "feature": schema[col],
+                        "present": bool(X_anti[j, col]),
+                        "contribution": round(float(contribs[j, col]), 4)
+                    } for col in order if contribs[j, col] != 0]
+                }
+        return [dict(sorted(explanation.items(), key=lambda item: item[1]["score"], reverse=True))
+                for explanation in explanations]
+
+    def answer(self, scores: Dict) -> Dict:
+        result = []
+        for anti, score in scores.items():
+            anti = anti.replace("_", '/')
+            result_single = {
+                "antimicrobial": anti,
+                "score": score,
+            }
+            if result_single["score"] >= 0.5:
+                result.append(result_single)
+        list_sorted = sorted(
+            result, key=lambda item: item['score'], reverse=True)
+        return {item['antimicrobial']: round(float(item['score'])*100, 2) for item in list_sorted}
+
 
 class Predictior:
     GN = 0
     GP = 1
 
-    def __init__(self, conn: Engine,model_location) -> None:
+    def __init__(self, conn: Engine,model_location, cache: PredictionCache = None, workers: int = 4, lazy: bool = False, bundle: str = None, engine: bool = False, thread_budget: ThreadBudget = None,
+                 answer_table: AnswerTable = None, answer_inputs=None, explain_cache: PredictionCache = None) -> None:
         self.conn = conn
+        # answer_inputs(vitek_id) gives the report inputs the answer table is built from
+        self.answer_table = answer_table if answer_inputs is not None else None
+        self.answer_inputs = answer_inputs
+        self.explain_cache = explain_cache
+        self.engine = engine
+        self.thread_budget = thread_budget or ThreadBudget()
         self.model_location = model_location
-        self.startup()
+        self.bundle = bundle
+        self.cache = cache
+        self.workers = workers
+        self.generation = 0
+        self.reload_lock = threading.Lock()
+        self.state = None
+        if not lazy:
+            self.startup()
 
     def startup(self):
-        query = sqlalchemy.text("""SELECT public.model.id , public.antimicrobial_answer.name , public.model.schema AS model_schema, model.model_path , sub_binning.schema AS submitted_sample_binning
+        # Build the new state aside, requests keep using the current one until the swap
+        with self.reload_lock:
+            state = self.load_state(self.generation + 1)
+            state.load_models(self.workers)
+            self.build_answer_table(state)
+            self.state = state
+            self.generation = state.generation
+            if self.cache is not None:
+                self.cache.clear()
+            if self.explain_cache is not None:
+                self.explain_cache.clear()
+
+    def ensure_state(self) -> PredictorState:
+        # Lazy mode, first caller loads the metadata only
+        state = self.state
+        if state is None:
+            with self.reload_lock:
+                state = self.state
+                if state is None:
+                    state = self.load_state(self.generation + 1)
+                    self.state = state
+                    self.generation = state.generation
+        return state
+
+    def warm_up(self):
+        state = self.ensure_state()
+        state.load_models(self.workers)
+        self.build_answer_table(state)
+
+    def build_answer_table(self, state: PredictorState):
+        # Predictions still work without it, a failure is only logged
+        if self.answer_table is None:
+            return
+        start = time.perf_counter()
+        try:
+            self.answer_table.build(
+                state, [self.answer_inputs(vitek_id) for vitek_id in [self.GN, self.GP]])
+        except Exception:
+            logger.exception("predictor: answer table not built")
+            return
+        logger.info("predictor: answer table built in %.2fs",
+                    time.perf_counter() - start)
+
+    def ready(self) -> bool:
+        state = self.state
+        return state is not None and state.loaded()
+
+    def load_state(self, generation: int, version: int = 0, vitek_id=None) -> PredictorState:
+        if version > 0:
+            return self.load_version_state(generation, version, vitek_id)
+        if self.bundle is not None:
+            return self.load_bundle_state(generation)
+
+        query = sqlalchemy.text("""SELECT public.model.id , public.antimicrobial_answer.name , public.model.schema AS model_schema, model.model_path , sub_binning.schema AS submitted_sample_binning , m_group.id AS model_group_id , m_group.version AS model_group_version
             FROM public.model 
             INNER JOIN public.antimicrobial_answer ON public.model.antimicrobial_id = public.antimicrobial_answer.id 
             INNER JOIN (
-                SELECT public.model_group.id , public.model_group_model.model_id 
+                SELECT public.model_group.id , public.model_group.version , public.model_group_model.model_id 
                 FROM public.model_group 
                 INNER JOIN public.model_group_model ON public.model_group.id = public.model_group_model.model_group_id 
                 WHERE public.model_group.version > 0 ) AS m_group ON public.model.id = m_group.model_id 
@@ -26,56 +335,141 @@ class Predictior:
                 SELECT model_id FROM public.model_group_model WHERE model_group_id IN (
                     SELECT id FROM public.model_group WHERE version = 0 AND vitek_id = :v_id ))""")
 
-        database = [pd.read_sql_query(query, self.conn, params={
-            "v_id": self.GN + 1}), pd.read_sql_query(query, self.conn, params={"v_id": self.GP + 1})]
+        return self.query_state(generation, query, {})
 
-        self.anti_names = [[anti for anti in database[self.GN]["name"].values],
-                           [anti for anti in database[self.GP]["name"].values]]
+    def load_version_state(self, generation: int, version: int, vitek_id=None) -> PredictorState:
+        # Historical model group, its binning comes from the group itself, one vitek or both
+        query = sqlalchemy.text("""SELECT ans.name , m.schema AS model_schema, m.model_path , sub_binning.schema AS submitted_sample_binning , mg.id AS model_group_id , mg.version AS model_group_version
+            FROM public.model_group AS mg
+            INNER JOIN public.model_group_model AS mgm ON mgm.model_group_id = mg.id
+            INNER JOIN public.model AS m ON m.id = mgm.model_id
+            INNER JOIN public.antimicrobial_answer AS ans ON ans.id = m.antimicrobial_id
+            INNER JOIN public.submitted_sample_binning_model_group AS sub_binning ON sub_binning.model_group_id = mg.id
+            WHERE mg.version = :version AND mg.vitek_id = :v_id""")
 
-        self.models_schema = [{row[0]: eval(row[1]) for row in database[self.GN][["name", "model_schema"]].values},
-                              {row[0]: eval(row[1]) for row in database[self.GP][["name", "model_schema"]].values}]
+        vitek_ids = [self.GN, self.GP] if vitek_id is None else [vitek_id]
+        return self.query_state(generation, query, {"version": version}, version, vitek_ids)
 
-        self.submitted_sample_binning = [{row[0]: eval(row[1]) for row in database[self.GN][["name", "submitted_sample_binning"]].values},
-                                         {row[0]: eval(row[1]) for row in database[self.GP][["name", "submitted_sample_binning"]].values}]
+    def query_state(self, generation: int, query, params: Dict, version: int = 0, vitek_ids: list = None) -> PredictorState:
+        # GN and GP metadata in parallel, a vitek not asked for has no models
+        start = time.perf_counter()
+        vitek_ids = [self.GN, self.GP] if vitek_ids is None else vitek_ids
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            database = list(executor.map(lambda v_id: pd.read_sql_query(query, self.conn, params={
+                "v_id": v_id + 1, **params}) if v_id in vitek_ids else pd.DataFrame(columns=STATE_COLUMNS), [self.GN, self.GP]))
+        logger.info("predictor: model metadata loaded in %.2fs",
+                    time.perf_counter() - start)
 
-        self.models = [{row[0]: joblib.load(f'{self.model_location}/{row[1]}') for row in database[self.GN][["name", "model_path"]].values},
-                       {row[0]: joblib.load(f'{self.model_location}/{row[1]}') for row in database[self.GP][["name", "model_path"]].values}]
+        anti_names = [[anti for anti in database[self.GN]["name"].values],
+                      [anti for anti in database[self.GP]["name"].values]]
 
-        schema_all = [set(), set()]
+        models_schema = [{row[0]: parse_list(row[1]) for row in database[self.GN][["name", "model_schema"]].values},
+                         {row[0]: parse_list(row[1]) for row in database[self.GP][["name", "model_schema"]].values}]
 
-        for schema in self.models_schema[self.GN].values():
-            schema_all[self.GN].update(schema)
-        for schema in self.models_schema[self.GP].values():
-            schema_all[self.GP].update(schema)
+        submitted_sample_binning = [{row[0]: parse_list(row[1]) for row in database[self.GN][["name", "submitted_sample_binning"]].values},
+                                    {row[0]: parse_list(row[1]) for row in database[self.GP][["name", "submitted_sample_binning"]].values}]
 
-        self.schema_df = [pd.DataFrame(columns=schema_all[self.GN]),
-                          pd.DataFrame(columns=schema_all[self.GP])]
+        model_paths = [{row[0]: row[1] for row in database[self.GN][["name", "model_path"]].values},
+                       {row[0]: row[1] for row in database[self.GP][["name", "model_path"]].values}]
 
-    def predict(self, data: pd.Series, vitek_id):
-        result = []
-        for anti in self.anti_names[vitek_id]:
-            model = self.models[vitek_id][anti]
-            binning = self.submitted_sample_binning[vitek_id][anti]
-            if not data['submitted_sample'] in binning:
-                data['submitted_sample'] = "other"
-            dummies_data_origin = pd.get_dummies(pd.DataFrame(data).T)
-            dummies_df = self.get_dummies_dataframe_columns(
-                self.schema_df[vitek_id], dummies_data_origin)
-            dummies_data = dummies_df.filter(
-                self.models_schema[vitek_id][anti])
-            anti = anti.replace("_", '/')
-            result_single = {
-                "antimicrobial": anti,
-                "score": model.predict_proba(dummies_data)[:, 1][0],
-            }
-            if result_single["score"] >= 0.5:
-                result.append(result_single)
-        list_sorted = sorted(
-            result, key=lambda item: item['score'], reverse=True)
-        return {item['antimicrobial']: round(float(item['score'])*100, 2) for item in list_sorted}
+        # version 0 serves models of a trained group, the latest one is logged
+        model_groups = [None, None]
+        for v_id in [self.GN, self.GP]:
+            if len(database[v_id]) > 0:
+                row = database[v_id].sort_values("model_group_version").iloc[-1]
+                model_groups[v_id] = (int(row["model_group_id"]), int(row["model_group_version"]))
+
+        return PredictorState(generation, anti_names, models_schema, submitted_sample_binning, model_paths, self.load_model, version, self.engine, model_groups)
+
+    def load_bundle_state(self, generation: int) -> PredictorState:
+        start = time.perf_counter()
+        manifest, read = load_bundle(self.bundle)
+        logger.info("predictor: bundle %s loaded in %.2fs",
+                    manifest["version"], time.perf_counter() - start)
+
+        vitek = [manifest["vitek"]["GN"], manifest["vitek"]["GP"]]
+        anti_names = [vitek[self.GN]["anti_names"], vitek[self.GP]["anti_names"]]
+        models_schema = [{anti: model["schema"] for anti, model in vitek[v_id]["models"].items()}
+                         for v_id in [self.GN, self.GP]]
+        submitted_sample_binning = [{anti: model["submitted_sample_binning"] for anti, model in vitek[v_id]["models"].items()}
+                                    for v_id in [self.GN, self.GP]]
+        model_paths = [{anti: model["model_path"] for anti, model in vitek[v_id]["models"].items()}
+                       for v_id in [self.GN, self.GP]]
+
+        return PredictorState(generation, anti_names, models_schema, submitted_sample_binning, model_paths,
+                              lambda model_path: load_booster_raw(read(model_path), self.thread_budget.inference_threads),
+                              engine=self.engine,
+                              model_groups=[vitek[v_id].get("model_group") for v_id in [self.GN, self.GP]])
+
+    def export_bundle(self, path: str = None) -> str:
+        return export_bundle(self.load_state(0), self.model_location, path)
+
+    def load_model(self, model_path: str):
+        return load_booster(self.model_location, model_path, self.thread_budget.inference_threads)
+
+    def predict(self, data: Dict, vitek_id, state: PredictorState = None):
+        return self.predict_batch([data], vitek_id, state)[0]
+
+    def predict_batch(self, data: list, vitek_id, state: PredictorState = None) -> list:
+        # One state for the whole call, a reload in between does not mix models
+        if state is None:
+            state = self.ensure_state()
+        return self.answers(self.score_batch(data, vitek_id, state), state)
+
+    def answers(self, scores: list, state: PredictorState) -> list:
+        with metrics.timer(STAGE, stage="answer"):
+            return [state.answer(row) for row in scores]
+
+    def score_batch(self, data: list, vitek_id, state: PredictorState = None) -> list:
+        # Raw score of every antimicrobial, the answer keeps only those over the threshold
+        if state is None:
+            state = self.ensure_state()
+        # the answer table is built for the current state only
+        answer_table = self.answer_table if state is self.state else None
+        if self.cache is None and answer_table is None:
+            metrics.inc("predictor_answers_total", len(data), source="model")
+            with self.thread_budget.inference():
+                return state.scores(data, vitek_id)
+        with metrics.timer(STAGE, stage="lookup"):
+            keys = [state.cache_key(row, vitek_id) for row in data]
+            scores = [None] * len(data)
+            for i, key in enumerate(keys):
+                # frequent inputs first, then the cache
+                if answer_table is not None:
+                    scores[i] = answer_table.get(key, vitek_id)
+                    if scores[i] is not None:
+                        metrics.inc("predictor_answers_total", source="answer_table")
+                        continue
+                if self.cache is not None:
+                    scores[i] = self.cache.get(key)
+                    if scores[i] is not None:
+                        metrics.inc("predictor_answers_total", source="cache")
+        missing = [i for i, row in enumerate(scores) if row is None]
+        metrics.inc("predictor_answers_total", len(missing), source="model")
+        if len(missing) > 0:
+            with self.thread_budget.inference():
+                scored = state.scores([data[i] for i in missing], vitek_id)
+            for i, row in zip(missing, scored):
+                scores[i] = row
+                if self.cache is not None:
+                    self.cache.put(keys[i], row)
+        return scores
 
-    def get_dummies_dataframe_columns(self, new_df: pd.DataFrame, old_df: pd.DataFrame) -> pd.DataFrame:
-        old_df = old_df.filter(new_df.columns)
-        new_df = new_df.append(old_df)
-        new_df.fillna(0, inplace=True)
-        return new_df
+    def explain_batch(self, data: list, vitek_id, top: int = 5, state: PredictorState = None) -> list:
+        # Cached per state like the answers, so every model version has its own entries
+        if state is None:
+            state = self.ensure_state()
+        keys = [state.cache_key(row, vitek_id) for row in data]
+        explanations = [None] * len(data)
+        if self.explain_cache is not None:
+            explanations = [self.explain_cache.get(key) for key in keys]
+        missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+        if len(missing) > 0:
+            with self.thread_budget.inference():
+                explained = state.explain([data[i] for i in missing], vitek_id)
+            for i, explanation in zip(missing, explained):
+                explanations[i] = explanation
+                if self.explain_cache is not None:
+                    self.explain_cache.put(keys[i], explanation)
+        return [{anti: dict(explanation, contributions=explanation["contributions"][:top])
+                 for anti, explanation in row.items()} for row in explanations]
@@ -0,0 +1,72 @@
+import datetime
+import hashlib
+import json
+import os
+import zipfile
+from src.model_store import NATIVE_EXTENSIONS
+
+# Single file holding everything Predictior needs for version 0, no database required
+BUNDLE_FORMAT = 1
+VITEK = ["GN", "GP"]
+
+
+def export_bundle(state, model_location, path: str = None) -> str:
+    models = {}
+    digest = hashlib.sha256()
+    for vitek_id, vitek in enumerate(VITEK):
+        # the version changes with anything that changes an answer, not only the boosters
+        digest.update(json.dumps([vitek, state.anti_names[vitek_id]]).encode())
+        for anti in state.anti_names[vitek_id]:
+            model_path = state.model_paths[vitek_id][anti]
+            if not model_path.endswith(NATIVE_EXTENSIONS):
+                raise Exception(
+                    f"{model_path} is not a native XGBoost model, run migrate_models.py first.")
+            with open(f'{model_location}/{model_path}', "rb") as f:
+                content = f.read()
+            digest.update(content)
+            digest.update(json.dumps([state.models_schema[vitek_id][anti],
+                                      state.submitted_sample_binning[vitek_id][anti]]).encode())
+            models[(vitek, anti)] = content
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": digest.hexdigest()[:12],
+        "created_at": datetime.datetime.now().isoformat(),
+        "vitek": {},
+    }
+    if path is None:
+        path = f"predictor_{manifest['version']}.zip"
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for vitek_id, vitek in enumerate(VITEK):
+            vitek_models = {}
+            for anti in state.anti_names[vitek_id]:
+                # same extension as the source file, XGBoost reads the format from it
+                arcname = f"{vitek}/{anti.replace('/', '_')}{os.path.splitext(state.model_paths[vitek_id][anti])[1]}"
+                bundle.writestr(arcname, models[(vitek, anti)])
+                vitek_models[anti] = {
+                    "model_path": arcname,
+                    "schema": state.models_schema[vitek_id][anti],
+                    "submitted_sample_binning": state.submitted_sample_binning[vitek_id][anti],
+                }
+            manifest["vitek"][vitek] = {
+                "anti_names": state.anti_names[vitek_id],
+                "model_group": state.model_groups[vitek_id],
+                "models": vitek_models,
+            }
+        bundle.writestr("manifest.json", json.dumps(manifest))
+    return path
+
+
+def load_bundle(path: str):
+    # Models are read from the zip as bytes when loaded, nothing is extracted
+    with zipfile.ZipFile(path) as bundle:
+        manifest = json.loads(bundle.read("manifest.json"))
+        if manifest["format"] != BUNDLE_FORMAT:
+            raise Exception(
+                f"Unsupported bundle format {manifest['format']}.")
+
+    def read(model_path: str) -> bytes:
+        with zipfile.ZipFile(path) as bundle:
+            return bundle.read(model_path)
+    return manifest, read
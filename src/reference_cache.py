@@ -0,0 +1,55 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Dict
+
+
+class ReferenceCache:
+    """Reference data payloads kept in memory with a TTL and a strong ETag, dropped when the tables change."""
+
+    def __init__(self, ttl: float = 300, composites: tuple = ()) -> None:
+        self.ttl = ttl
+        # entries built from the other ones, dropped on every invalidation
+        self.composites = composites
+        self.lock = threading.Lock()
+        # key -> (payload, etag, expires)
+        self.entries = {}
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple, loader):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] > now:
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+
+        payload = loader()
+        etag = '"' + hashlib.sha256(json.dumps(
+            payload, sort_keys=True, default=str).encode()).hexdigest()[:32] + '"'
+        with self.lock:
+            self.entries[key] = (payload, etag, now + self.ttl)
+        return payload, etag
+
+    def invalidate(self, *names):
+        # Every entry of the named tables, whatever its other key parts
+        with self.lock:
+            for key in [key for key in self.entries if key[0] in names or key[0] in self.composites]:
+                del self.entries[key]
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "ttl": self.ttl,
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,653 @@
+import logging
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Union
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# bind parameters, same syntax as sqlalchemy.text
+BIND_PARAM = re.compile(r"(?<![:\w\\]):(\w+)(?!:)")
+
+# name -> Query, every named query of the app
+QUERIES = {}
+lock = threading.Lock()
+
+# engine of the app, created once by configure()
+engine: Optional[Engine] = None
+
+# SQLSTATE of a statement PostgreSQL will never prepare: syntax error or access rule violation, feature not supported
+UNPREPARABLE_CLASSES = ("42", "0A")
+
+
+class Query:
+    """Named SQL statement, run as a server-side prepared statement when the engine allows it."""
+
+    def __init__(self, name: str, sql: str) -> None:
+        self.name = name
+        self.sql = sql
+        self.statement = sqlalchemy.text(sql)
+        # :name -> $n, a repeated name keeps its number
+        self.params = []
+        self.prepare_sql = BIND_PARAM.sub(self.positional, sql)
+        self.execute_sql = f"EXECUTE {name}" + (
+            "(" + ", ".join(["%s"] * len(self.params)) + ")" if self.params else "")
+        self.preparable = True
+
+    def positional(self, match) -> str:
+        if match.group(1) not in self.params:
+            self.params.append(match.group(1))
+        return f"${self.params.index(match.group(1)) + 1}"
+
+
+def named_query(name: str, sql: str) -> Query:
+    # Registered on the first call, later calls return the same Query
+    named = QUERIES.get(name)
+    if named is None:
+        with lock:
+            named = QUERIES.setdefault(name, Query(name, sql))
+    if named.sql != sql:
+        raise ValueError(f"query {name} is already registered with another statement")
+    return named
+
+
+def create_engine(url: str, pool_size: int = 32, max_overflow: int = 10, pool_timeout: float = 30,
+                  pool_recycle: int = 1800, prepare: bool = True) -> Engine:
+    # pre_ping drops connections the server closed, recycle renews them before a firewall does
+    return sqlalchemy.create_engine(
+        url, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle, pool_pre_ping=True,
+        execution_options={"prepare_statements": prepare})
+
+
+def configure(url: str, pool_size: int = 32, max_overflow: int = 10, pool_timeout: float = 30,
+              pool_recycle: int = 1800, prepare: bool = True) -> Engine:
+    global engine
+    engine = create_engine(url, pool_size, max_overflow, pool_timeout, pool_recycle, prepare)
+    return engine
+
+
+def dispose():
+    # connections must not be shared with forked workers
+    if engine is not None:
+        engine.dispose()
+
+
+class NotPrepared(Exception):
+    pass
+
+
+def prepared(con, named: Query) -> bool:
+    # PREPARE once per DBAPI connection, con.info lives and dies with it
+    names = con.info.setdefault("prepared_statements", set())
+    if named.name in names:
+        return True
+    try:
+        con.exec_driver_sql(f"PREPARE {named.name} AS {named.prepare_sql}")
+    except sqlalchemy.exc.DBAPIError as ex:
+        # a lost connection or a timeout is not the statement's fault, it propagates
+        code = getattr(ex.orig, "pgcode", None) or ""
+        if not code.startswith(UNPREPARABLE_CLASSES):
+            raise
+        logger.warning("repository: %s can not be prepared (%s), runs as plain text", named.name, code)
+        named.preparable = False
+        raise NotPrepared(named.name) from ex
+    names.add(named.name)
+    return True
+
+
+def execute(con, named: Union[Query, Any], **params):
+    if isinstance(named, Query):
+        # list parameters (IN :ids) are expanded by sqlalchemy, never prepared
+        if (named.preparable and con.get_execution_options().get("prepare_statements")
+                and not any(isinstance(value, (list, tuple)) for value in params.values())
+                and prepared(con, named)):
+            return con.exec_driver_sql(
+                named.execute_sql, tuple(params[name] for name in named.params))
+        named = named.statement
+    return con.execute(named, **params)
+
+
+def transaction(conn: Engine, work: Callable):
+    # a refused PREPARE aborts the transaction, the retry runs the plain statement
+    try:
+        with conn.begin() as con:
+            return work(con)
+    except NotPrepared:
+        with conn.begin() as con:
+            return work(con)
+
+
+def fetch_all(conn: Engine, named: Union[Query, Any], **params) -> List[tuple]:
+    # Rows as tuples straight from the cursor, no DataFrame round-trip
+    return transaction(conn, lambda con: [tuple(row) for row in execute(con, named, **params)])
+
+
+def fetch_one(conn: Engine, named: Union[Query, Any], **params) -> Optional[tuple]:
+    row = transaction(conn, lambda con: execute(con, named, **params).first())
+    return tuple(row) if row is not None else None
+
+
+def fetch_scalar(conn: Engine, named: Union[Query, Any], **params) -> Any:
+    row = fetch_one(conn, named, **params)
+    return row[0] if row is not None else None
+
+
+def fetch_column(conn: Engine, named: Union[Query, Any], **params) -> list:
+    return [row[0] for row in fetch_all(conn, named, **params)]
+
+
+def fetch_frame(conn: Engine, named: Union[Query, Any], **params) -> pd.DataFrame:
+    # For the callers that work on a DataFrame, same columns as pd.read_sql_query
+    def work(con):
+        result = execute(con, named, **params)
+        return pd.DataFrame([tuple(row) for row in result], columns=list(result.keys()))
+    return transaction(conn, work)
+
+
+def run(conn: Engine, named: Union[Query, Any], **params):
+    # INSERT / UPDATE / DELETE, committed on return
+    transaction(conn, lambda con: execute(con, named, **params))
+
+
+def run_many(conn: Engine, named: Query, rows: List[Dict]):
+    # executemany in one transaction, not prepared
+    if len(rows) > 0:
+        transaction(conn, lambda con: con.execute(named.statement, rows))
+
+
+def append_frame(conn: Engine, table: str, frame: pd.DataFrame):
+    # bulk INSERT of a DataFrame into public.<table>
+    frame.to_sql(table, schema='public', con=conn, if_exists='append', index=False)
+
+
+def stats(conn: Engine) -> Dict:
+    pool = conn.pool
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "queries": len(QUERIES),
+        "unpreparable": sum(not named.preparable for named in list(QUERIES.values())),
+    }
+
+
+# ---------- reference data ----------
+
+query_species = named_query("species", "SELECT id , name FROM public.species")
+query_vitek_id = named_query("vitek_id", "SELECT id , name FROM public.vitek_id_card")
+query_bacteria_genus = named_query("bacteria_genus", "SELECT id , name FROM public.bacteria_genus")
+query_submitted_sample = named_query("submitted_sample", "SELECT id , name FROM public.submitted_sample")
+query_antimicrobial_sir = named_query(
+    "antimicrobial_sir", "SELECT id , name , sir_type_id FROM public.antimicrobial_sir WHERE vitek_id = :v_id")
+query_sir_type = named_query("sir_type", "SELECT id , name FROM public.sir_type WHERE id IN :sir_type")
+query_sir_sub_type = named_query(
+    "sir_sub_type", "SELECT id , sir_type_id ,  symbol FROM public.sir_sub_type WHERE sir_type_id IN :sir_sub_type")
+query_all_sir_sub_type = named_query("all_sir_sub_type", "SELECT id , symbol , sir_type_id FROM public.sir_sub_type")
+query_antimicrobial_answer = named_query(
+    "antimicrobial_answer", "SELECT id , name FROM public.antimicrobial_answer WHERE vitek_id = :v_id")
+query_ordered_antimicrobial_answer = named_query(
+    "ordered_antimicrobial_answer", "SELECT id, name FROM public.antimicrobial_answer WHERE vitek_id = :v_id ORDER BY id")
+query_insert_submitted_sample = named_query(
+    "insert_submitted_sample", "INSERT INTO public.submitted_sample(name) VALUES (:name)")
+query_insert_bacteria_genus = named_query(
+    "insert_bacteria_genus", "INSERT INTO public.bacteria_genus(name) VALUES (:name)")
+query_insert_antimicrobial_sir = named_query(
+    "insert_antimicrobial_sir", "INSERT INTO public.antimicrobial_sir(vitek_id , name , sir_type_id) VALUES (:v_id,:name,:type)")
+query_insert_antimicrobial_answer = named_query(
+    "insert_antimicrobial_answer", "INSERT INTO public.antimicrobial_answer(vitek_id,name) VALUES (:v_id,:name)")
+
+# ---------- upload ----------
+
+query_first_upload = named_query("first_upload", """
+    SELECT MIN(id)
+    FROM public.upload_file_log
+    WHERE vitek_id = :v_id AND (status = 'pending' OR status = 'uploading')
+    """)
+query_start_upload = named_query("start_upload", """
+    UPDATE public.upload_file_log
+    SET start_date=:s_date, status='uploading'
+    WHERE id = :id""")
+query_finish_upload = named_query("finish_upload", """
+    UPDATE public.upload_file_log
+    SET finish_date=:f_date, "time"=:time, amount_row=:count, status=:status
+    WHERE id = :id""")
+query_insert_upload_file_log = named_query(
+    "insert_upload_file_log",
+    "INSERT INTO public.upload_file_log(filename,status , vitek_id) VALUES (:filename, 'pending' , :vitek_id) RETURNING id")
+query_insert_file = named_query(
+    "insert_file", "INSERT INTO public.file(name, upload_at,active,vitek_id) VALUES (:name, :date, true , :v_id) RETURNING id")
+query_file_amount_row = named_query("file_amount_row", "UPDATE public.file SET amount_row = :count WHERE id = :id")
+query_insert_report = named_query("insert_report", """
+        INSERT INTO public.report(hn , date_of_submission, report_issued_date, species_id, bacteria_genus_id,submitted_sample_id,vitek_id,type,file_id) 
+        VALUES (:hn , :date_of_submission, :report_issued_date, :species_id, :bacteria_genus_id,:submitted_sample_id,:vitek_id,:type,:file_id) RETURNING id""")
+query_count_upload_file_log = named_query("count_upload_file_log", "SELECT COUNT(*) FROM public.upload_file_log")
+query_upload_logs = named_query("upload_logs", """
+        SELECT up.id , up.filename ,
+            COALESCE(to_char(up.start_date, 'DD-Mon-YYYY HH24:MI:SS'), '-') ,
+            COALESCE(to_char(up.finish_date, 'DD-Mon-YYYY HH24:MI:SS'), '-') ,
+            up.time , up.amount_row , up.status , vi.name AS vitek_id
+        FROM public.upload_file_log AS up
+        INNER JOIN public.vitek_id_card AS vi ON up.vitek_id = vi.id
+        ORDER BY finish_date DESC , start_date
+        LIMIT :app
+        OFFSET :offset
+        """)
+query_upload_file_results = named_query("upload_file_results", """
+        SELECT upload_file_log_id , type , detail
+        FROM public.upload_file_result
+        WHERE upload_file_log_id IN :log_id
+        """)
+
+# ---------- files ----------
+
+query_view_filename = named_query("view_filename", """
+        SELECT f.id , f.name , to_char(f.upload_at, 'DD-Mon-YYYY HH24:MI:SS') , f.amount_row
+        FROM public.file AS f
+        INNER JOIN public.model_group_file AS mgf ON f.id = mgf.file_id
+        WHERE mgf.model_group_id = :mg_id
+        ORDER BY upload_at DESC
+        """)
+query_count_file = named_query("count_file", "SELECT COUNT(*) FROM public.file")
+query_view_all_files = named_query("view_all_files", """
+        SELECT public.file.id , public.file.name , public.vitek_id_card.name as vitek_id_name ,
+            to_char(public.file.upload_at, 'DD-Mon-YYYY HH24:MI:SS') , public.file.amount_row ,
+            EXTRACT(YEAR FROM public.file.upload_at) > 2021
+        FROM public.file
+        INNER JOIN public.vitek_id_card ON public.vitek_id_card.id = public.file.vitek_id
+        WHERE active AND amount_row IS NOT NULL
+        ORDER BY upload_at DESC
+        LIMIT :app
+        OFFSET :offset
+        """)
+query_view_file_retraining_log = named_query("view_file_retraining_log", """
+        SELECT file_id, name, to_char(upload_at, 'DD-Mon-YYYY HH24:MI:SS'), amount_row
+        FROM public.file_retraining_log AS file_re_log
+        INNER JOIN public.file AS file ON file.id = file_re_log.file_id
+        WHERE retraining_log_id = :re_log_id
+        ORDER BY upload_at DESC
+        """)
+query_file_id = named_query("file_id", "SELECT id FROM public.file")
+query_model_group_file_id = named_query("model_group_file_id", "SELECT DISTINCT file_id FROM public.model_group_file")
+query_deactivate_file = named_query(
+    "deactivate_file", "UPDATE public.file SET active = false WHERE id = :id RETURNING vitek_id")
+query_delete_file = named_query("delete_file", "DELETE FROM public.file WHERE id = :id")
+
+# ---------- retraining ----------
+
+query_cancel_pending_retraining = named_query("cancel_pending_retraining", """
+    UPDATE public.retraining_log
+    SET start_date=:date, status='cancel' , finish_date=:date, time=0
+    WHERE id = :id
+    """)
+query_start_retraining = named_query("start_retraining", """
+    UPDATE public.retraining_log
+    SET start_date=:start_date, status='training'
+    WHERE id = :id
+    """)
+query_cancel_retraining = named_query("cancel_retraining", """
+    UPDATE public.retraining_log
+    SET status='cancel' , finish_date=:finish_date, time=:time
+    WHERE id = :id
+    """)
+query_finish_retraining = named_query("finish_retraining", """
+    UPDATE public.retraining_log
+    SET finish_date=:finish_date, time=:time, status='success', model_group_id=:mg_id
+    WHERE id = :id
+    """)
+query_insert_retraining_log = named_query("insert_retraining_log", """
+    INSERT INTO public.retraining_log(vitek_id, status , cancel)
+    VALUES (:vitek_id, 'pending' , true)
+    RETURNING id
+    """)
+query_insert_file_retraining_log = named_query("insert_file_retraining_log", """
+    INSERT INTO public.file_retraining_log(retraining_log_id, file_id)
+    VALUES (:retraining_log_id, :file_id)
+    """)
+query_count_training = named_query(
+    "count_training", "SELECT COUNT(*) FROM public.retraining_log WHERE status = 'training'")
+query_count_uploading = named_query(
+    "count_uploading", "SELECT COUNT(*) FROM public.upload_file_log WHERE status = 'uploading'")
+query_latest_model_group_file = named_query("latest_model_group_file", """
+    SELECT file_id
+    FROM public.model_group as mg
+    INNER JOIN public.model_group_file as mgf ON mgf.model_group_id = mg.id
+    WHERE mg.vitek_id = :v_id AND version = (SELECT MAX(version)
+                                            FROM public.model_group
+                                            WHERE vitek_id = :v_id)
+    """)
+# files the models served by version 0 were trained on, any trained group they come from
+query_current_model_group_file = named_query("current_model_group_file", """
+    SELECT DISTINCT mgf.file_id
+    FROM public.model_group AS cur
+    INNER JOIN public.model_group_model AS cur_m ON cur_m.model_group_id = cur.id
+    INNER JOIN public.model_group_model AS src_m ON src_m.model_id = cur_m.model_id
+    INNER JOIN public.model_group AS src ON src.id = src_m.model_group_id AND src.version > 0
+    INNER JOIN public.model_group_file AS mgf ON mgf.model_group_id = src.id
+    WHERE cur.vitek_id = :v_id AND cur.version = 0
+    """)
+query_count_retraining_log = named_query("count_retraining_log", "SELECT COUNT(*) FROM public.retraining_log")
+query_retraining_logs = named_query("retraining_logs", """
+        SELECT log.id, vi.id AS vitek_id, vi.name AS vitek_name,
+            COALESCE(to_char(log.start_date, 'DD-Mon-YYYY HH24:MI:SS'), '-'),
+            COALESCE(to_char(log.finish_date, 'DD-Mon-YYYY HH24:MI:SS'), '-'),
+            log.time, log.status, mg.version, log.cancel
+        FROM public.retraining_log AS log 
+        INNER JOIN public.vitek_id_card AS vi ON log.vitek_id = vi.id
+        LEFT JOIN public.model_group AS mg ON mg.id = log.model_group_id
+        ORDER BY finish_date DESC, start_date
+        LIMIT :app
+        OFFSET :offset
+        """)
+query_retraining_status = named_query("retraining_status", """
+    SELECT status
+    FROM public.retraining_log
+    WHERE id = :id
+    """)
+query_retraining_statuses = named_query("retraining_statuses", "SELECT DISTINCT status FROM public.retraining_log")
+query_running_retraining = named_query("running_retraining", """
+    SELECT id , cancel
+    FROM public.retraining_log
+    WHERE status = 'pending' OR status = 'training'
+    """)
+query_request_cancel_retraining = named_query(
+    "request_cancel_retraining", "UPDATE public.retraining_log SET status = 'canceling' , cancel = false WHERE id = :id")
+query_lock_retraining = named_query(
+    "lock_retraining", "UPDATE public.retraining_log SET cancel = false WHERE id = :id")
+
+# ---------- model training ----------
+
+query_insert_model = named_query("insert_model", """
+    INSERT INTO public.model(antimicrobial_id, schema, model_path, create_at, performance, accuracy, precision, recall, f1)
+    VALUES (:antimicrobial_id, :schema, :model_path, :create_at, :performance, :accuracy, :precision, :recall, :f1)
+    RETURNING id
+    """)
+query_insert_model_group = named_query("insert_model_group", """
+    INSERT INTO public.model_group(version, vitek_id)
+    VALUES (:version, :vitek_id)
+    RETURNING id
+    """)
+query_insert_model_group_model = named_query("insert_model_group_model", """
+    INSERT INTO public.model_group_model(model_group_id, model_id)
+    VALUES (:model_group_id, :model_id)
+    """)
+query_insert_model_group_file = named_query("insert_model_group_file", """
+    INSERT INTO public.model_group_file(file_id, model_group_id)
+    VALUES (:file_id, :model_group_id)
+    """)
+query_insert_submitted_sample_binning = named_query("insert_submitted_sample_binning", """
+    INSERT INTO public.submitted_sample_binning_model_group(model_group_id, schema)
+    VALUES (:model_group_id, :schema)
+    """)
+query_model_group_measure = named_query("model_group_measure", """
+    UPDATE public.model_group
+    SET accuracy=:accuracy, precision=:precision, recall=:recall, f1=:f1
+    WHERE id = :id
+    """)
+query_current_model_group_measure = named_query("current_model_group_measure", """
+    UPDATE public.model_group
+    SET accuracy=:accuracy, precision=:precision, recall=:recall, f1=:f1
+    WHERE vitek_id = :vitek_id AND version = 0
+    """)
+query_update_model_group_model = named_query("update_model_group_model", """
+                        UPDATE public.model_group_model
+                        SET model_id = :model_id
+                        WHERE id = :id
+                        """)
+query_model_current_version = named_query("model_current_version", """
+    SELECT MAX(model_current.version)
+    FROM public.model_current AS model_current
+    INNER JOIN public.model AS model ON model.id = model_current.model_id
+    INNER JOIN public.antimicrobial_answer AS anti_answer ON anti_answer.id = model.antimicrobial_id
+    INNER JOIN public.vitek_id_card AS vitek_id_card ON vitek_id_card.id = anti_answer.vitek_id
+    WHERE vitek_id_card.id = :vitek_id
+    """)
+query_model_group_models = named_query("model_group_models", """
+    SELECT m.id , m.model_path FROM public.model_group_model AS mgm
+    INNER JOIN public.model AS m ON m.id = mgm.model_id
+    WHERE model_group_id = :id
+    """)
+query_delete_model = named_query("delete_model", "DELETE FROM public.model WHERE id = :id")
+query_delete_model_group = named_query("delete_model_group", "DELETE FROM public.model_group WHERE id = :id")
+query_report_train_id = named_query("report_train_id", """
+                                         SELECT report_id 
+                                         FROM public.report_train
+                                         INNER JOIN public.report ON public.report.id = public.report_train.report_id
+                                         WHERE sub_type = 'train' AND antimicrobial_id = :anti_id AND file_id = :file_id
+                                         """)
+query_report_test_id = named_query("report_test_id", """
+                                        SELECT report_id
+                                        FROM public.report_train
+                                        INNER JOIN public.report ON public.report.id = public.report_train.report_id
+                                        WHERE sub_type = 'test' AND antimicrobial_id = :anti_id AND file_id = :file_id
+                                        """)
+query_report_test_by_case_id = named_query("report_test_by_case_id", """
+                                        SELECT public.report.id 
+                                        FROM public.report
+                                        WHERE type = 'test' AND public.report.vitek_id = :v_id AND file_id = :file_id
+                                        """)
+query_model_group_model_files = named_query("model_group_model_files", """
+    SELECT ans.id, ans.name, model_path, schema, m.id as model_id
+    FROM public.model_group as mg
+    INNER JOIN public.model_group_model as mgm ON mgm.model_group_id = mg.id
+    INNER JOIN public.model as m ON m.id = mgm.model_id
+    INNER JOIN public.antimicrobial_answer as ans ON ans.id = m.antimicrobial_id
+    WHERE mg.version = :version AND mg.vitek_id = :v_id
+    ORDER BY ans.name""")
+query_model_group_lastest_version = named_query("model_group_lastest_version",
+            """ SELECT MAX(version)
+                FROM public.model_group
+                WHERE vitek_id = :vitek_id
+            """)
+query_model_group_performance = named_query("model_group_performance",
+            """
+            SELECT m.id, m.antimicrobial_id, m.performance
+            FROM public.model_group as mg
+            INNER JOIN public.model_group_model as mgm ON mgm.model_group_id = mg.id
+            INNER JOIN public.model as m ON m.id = mgm.model_id
+            WHERE vitek_id = :v_id AND version = :version
+            """)
+query_model_group_id = named_query("model_group_id",
+            """
+            SELECT id
+            FROM public.model_group
+            WHERE vitek_id = :v_id AND version = :version
+            """)
+query_model_group_model_id = named_query("model_group_model_id",
+            """
+            SELECT mgm.id
+            FROM public.model_group_model as mgm
+            INNER JOIN public.model as m ON m.id = mgm.model_id
+            WHERE model_group_id = :mg_id AND antimicrobial_id = :anti_id
+            """)
+query_model_configuration = named_query(
+    "model_configuration", "SELECT * FROM public.model_configuration WHERE antimicrobial_id = :anti_id")
+
+# ---------- submitted_sample_latest ----------
+
+query_submitted_sample_latest = named_query(
+    "submitted_sample_latest", "SELECT vitek_id , submitted_sample FROM public.submitted_sample_latest")
+query_submitted_sample_latest_binning = named_query("submitted_sample_latest_binning", """
+    SELECT mg.version , binning.schema
+    FROM public.submitted_sample_binning_model_group AS binning
+    INNER JOIN public.model_group AS mg ON mg.id = binning.model_group_id
+    WHERE mg.vitek_id = :vitek_id AND mg.version = (
+        SELECT MAX(version)
+        FROM public.model_group
+        WHERE vitek_id = :vitek_id)""")
+query_submitted_sample_by_name = named_query(
+    "submitted_sample_by_name", "SELECT id , name FROM public.submitted_sample WHERE name IN :names ORDER BY id")
+query_set_submitted_sample_latest = named_query("set_submitted_sample_latest", """
+    INSERT INTO public.submitted_sample_latest(vitek_id, model_group_version, submitted_sample, update_at)
+    VALUES (:vitek_id, :version, :submitted_sample, :update_at)
+    ON CONFLICT (vitek_id) DO UPDATE
+    SET model_group_version = EXCLUDED.model_group_version,
+        submitted_sample = EXCLUDED.submitted_sample,
+        update_at = EXCLUDED.update_at""")
+query_delete_submitted_sample_latest = named_query(
+    "delete_submitted_sample_latest", "DELETE FROM public.submitted_sample_latest WHERE vitek_id = :vitek_id")
+query_submitted_sample_latest_missing = named_query("submitted_sample_latest_missing", """
+    SELECT DISTINCT vitek_id FROM public.model_group
+    WHERE vitek_id NOT IN (SELECT vitek_id FROM public.submitted_sample_latest)""")
+
+# ---------- shadow ----------
+
+query_shadow_candidates = named_query(
+    "shadow_candidates", "SELECT vitek_id , version FROM public.shadow_candidate")
+query_set_shadow_candidate = named_query("set_shadow_candidate", """
+    INSERT INTO public.shadow_candidate(vitek_id, version, update_at)
+    VALUES (:vitek_id, :version, :update_at)
+    ON CONFLICT (vitek_id) DO UPDATE SET version = EXCLUDED.version, update_at = EXCLUDED.update_at""")
+query_delete_shadow_candidate = named_query(
+    "delete_shadow_candidate", "DELETE FROM public.shadow_candidate WHERE vitek_id = :vitek_id")
+
+# ---------- configuration ----------
+
+query_configuration_xgb_parameter = named_query("configuration_xgb_parameter", """
+    SELECT anti.name , n_estimators, gamma, max_depth, subsample, colsample_bytree, learning_rate,  random_state
+    FROM public.model_configuration AS mc
+    INNER JOIN public.antimicrobial_answer AS anti ON anti.id = mc.antimicrobial_id
+    WHERE vitek_id = :v_id""")
+query_configuration_smote = named_query("configuration_smote", """
+    SELECT anti.name , smote
+    FROM public.model_configuration AS mc
+    INNER JOIN public.antimicrobial_answer AS anti ON anti.id = mc.antimicrobial_id
+    WHERE vitek_id = :v_id""")
+
+# ---------- dashboard ----------
+
+query_lastest_version = named_query("lastest_version",
+    """ SELECT MAX(version)
+            FROM public.model_group
+            WHERE vitek_id = :vitek_id
+        """)
+query_antimicrobial_model = named_query("antimicrobial_model",
+    """ SELECT public.antimicrobial_answer.id, public.antimicrobial_answer.name
+            FROM public.model
+            INNER JOIN public.model_group_model ON model.id = model_group_model.model_id
+            INNER JOIN public.model_group ON public.model_group_model.model_group_id = public.model_group.id
+            INNER JOIN public.antimicrobial_answer ON public.model.antimicrobial_id = public.antimicrobial_answer.id
+            WHERE public.model_group.vitek_id = :vitek_id
+            GROUP BY public.antimicrobial_answer.id, public.antimicrobial_answer.name
+            ORDER BY public.antimicrobial_answer.name
+        """)
+query_dashboard_case = named_query("dashboard_case",
+    """ SELECT to_char(public.report.report_issued_date, 'YYYY-MM'), COUNT(public.report.id)
+            FROM public.model_group
+            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
+            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
+            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
+            GROUP BY to_char(public.report.report_issued_date, 'YYYY-MM')
+            ORDER BY 1
+        """)
+query_dashboard_species = named_query("dashboard_species",
+    """ SELECT public.species.name, COUNT(public.report.id)
+            FROM public.model_group
+            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
+            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
+            INNER JOIN public.species ON public.report.species_id = public.species.id
+            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
+            GROUP BY public.species.name
+            ORDER BY COUNT(public.report.id) DESC
+        """)
+query_dashboard_bacteria_genus = named_query("dashboard_bacteria_genus",
+    """ SELECT public.bacteria_genus.name, COUNT(public.report.id)
+            FROM public.model_group
+            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
+            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
+            INNER JOIN public.bacteria_genus ON public.report.bacteria_genus_id = public.bacteria_genus.id
+            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
+            GROUP BY public.bacteria_genus.name
+            ORDER BY COUNT(public.report.id) DESC
+            LIMIT 10
+        """)
+query_dashboard_submitted_sample = named_query("dashboard_submitted_sample",
+    """ SELECT public.submitted_sample.name, COUNT(public.report.id)
+            FROM public.model_group
+            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
+            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
+            INNER JOIN public.submitted_sample ON public.report.submitted_sample_id = public.submitted_sample.id
+            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
+            GROUP BY public.submitted_sample.name
+            ORDER BY COUNT(public.report.id) DESC
+            LIMIT 10
+        """)
+query_dashboard_antimicrobial_sir = named_query("dashboard_antimicrobial_sir",
+    """ SELECT public.antimicrobial_sir.name,
+	            COUNT(CASE WHEN public.sir_sub_type.id=1 THEN 1 END) as "POS",
+	            COUNT(CASE WHEN public.sir_sub_type.id=2 THEN 1 END) as "NEG",
+ 	            COUNT(CASE WHEN public.sir_sub_type.id=3 THEN 1 END) as "S",
+	            COUNT(CASE WHEN public.sir_sub_type.id=4 THEN 1 END) as "I",
+	            COUNT(CASE WHEN public.sir_sub_type.id=5 THEN 1 END) as "R"
+            FROM public.model_group
+            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
+            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
+            INNER JOIN public.report_sir ON public.report.id = public.report_sir.report_id
+            INNER JOIN public.antimicrobial_sir ON public.report_sir.antimicrobial_id = public.antimicrobial_sir.id
+            INNER JOIN public.sir_sub_type ON public.report_sir.sir_sub_id = public.sir_sub_type.id
+            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
+            GROUP BY public.antimicrobial_sir.name
+            ORDER BY public.antimicrobial_sir.name
+        """)
+query_dashboard_antimicrobial_answer = named_query("dashboard_antimicrobial_answer",
+    """ SELECT public.antimicrobial_answer.name, COUNT(public.report.id)
+            FROM public.model_group
+            INNER JOIN public.model_group_file ON public.model_group.id = public.model_group_file.model_group_id
+            INNER JOIN public.report ON public.model_group_file.file_id = public.report.file_id
+            INNER JOIN public.report_answer ON public.report.id = public.report_answer.report_id
+            INNER JOIN public.antimicrobial_answer ON antimicrobial_answer.id = public.report_answer.antimicrobial_id
+            WHERE public.model_group.vitek_id = :vitek_id AND public.model_group.version = :version
+            GROUP BY public.antimicrobial_answer.name
+            ORDER BY COUNT(public.report.id) DESC
+            LIMIT 11
+        """)
+query_dashboard_performance_by_antimicrobial = named_query("dashboard_performance_by_antimicrobial",
+    """ SELECT mg.version, m.accuracy, m.precision, m.recall, m.f1
+            FROM public.model as m
+            INNER JOIN public.model_group_model ON m.id = public.model_group_model.model_id
+            INNER JOIN public.model_group AS mg ON public.model_group_model.model_group_id =  mg.id
+            WHERE m.antimicrobial_id = :antimicrobial_id AND mg.version > 0
+        """)
+query_dashboard_performance_by_version = named_query("dashboard_performance_by_version",
+    """ SELECT public.antimicrobial_answer.name, m_group.version, m.accuracy, m.precision, m.recall, m.f1, m.performance, m_group.model_group_id
+            FROM public.model_group as mg
+            INNER JOIN public.model_group_model as mgm ON mg.id = mgm.model_group_id
+            INNER JOIN public.model as m ON mgm.model_id = m.id
+            INNER JOIN public.antimicrobial_answer ON m.antimicrobial_id = public.antimicrobial_answer.id
+            INNER JOIN (
+            	SELECT *
+            	FROM public.model_group_model
+            	INNER JOIN public.model_group ON public.model_group_model.model_group_id = public.model_group.id
+             	WHERE public.model_group.version > 0
+            	) as m_group ON m.id = m_group.model_id
+            WHERE mg.vitek_id = :vitek_id AND mg.version = :version
+            ORDER BY public.antimicrobial_answer.name
+        """)
+query_dashboard_performance_current = named_query("dashboard_performance_current",
+    """ SELECT 
+            anti_answer.name, m_group.version, model_current.accuracy , model_current.precision , model_current.recall , model_current.f1, '-' as performance, m_group.model_group_id
+            FROM public.model_current AS model_current
+            INNER JOIN public.model AS model ON model.id = model_current.model_id
+            INNER JOIN public.antimicrobial_answer AS anti_answer ON anti_answer.id = model.antimicrobial_id
+            INNER JOIN public.vitek_id_card AS vitek_id_card ON vitek_id_card.id = anti_answer.vitek_id
+            INNER JOIN (
+                        	SELECT *
+                        	FROM public.model_group_model
+                        	INNER JOIN public.model_group ON public.model_group_model.model_group_id = public.model_group.id
+                         	WHERE public.model_group.version > 0
+                        	) as m_group ON model.id = m_group.model_id
+            WHERE vitek_id_card.id = :vitek_id AND model_current.version = (SELECT MAX(model_current.version) 
+            													   	FROM public.model_current AS model_current
+            														INNER JOIN public.model AS model ON model.id = model_current.model_id
+            														INNER JOIN public.antimicrobial_answer AS anti_answer ON anti_answer.id = model.antimicrobial_id
+            														INNER JOIN public.vitek_id_card AS vitek_id_card ON vitek_id_card.id = anti_answer.vitek_id
+            													   	WHERE vitek_id_card.id = :vitek_id)
+            ORDER BY model_current.id ASC
+        """)
+query_dashboard_performance_test_by_case = named_query("dashboard_performance_test_by_case",
+    """ SELECT 'All Model (Test By Case)' as name, mg.version, mg.accuracy, mg.precision, mg.recall, mg.f1, '-' as performance, mg.id as model_group_id
+            FROM public.model_group as mg
+            WHERE mg.vitek_id = :vitek_id AND mg.version = :version
+        """)
@@ -0,0 +1,77 @@
+import logging
+import sqlalchemy
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Tables written by the backend itself, created once by migrate_schema.py and not on the request path
+MIGRATIONS = {
+    "drift_sketch": """
+        CREATE TABLE IF NOT EXISTS public.drift_sketch (
+            id BIGSERIAL PRIMARY KEY,
+            create_at TIMESTAMP,
+            vitek_id INTEGER,
+            feature VARCHAR,
+            total INTEGER,
+            counts JSONB,
+            sketch BYTEA)
+        """,
+    "drift_sketch_create_at": """
+        CREATE INDEX IF NOT EXISTS drift_sketch_vitek_id_create_at
+        ON public.drift_sketch (vitek_id, create_at)
+        """,
+    "prediction_log": """
+        CREATE TABLE IF NOT EXISTS public.prediction_log (
+            id BIGSERIAL PRIMARY KEY,
+            create_at TIMESTAMP,
+            vitek_id INTEGER,
+            model_group_id INTEGER,
+            version INTEGER,
+            input JSONB,
+            scores JSONB,
+            answers JSONB,
+            latency_ms DOUBLE PRECISION)
+        """,
+    "shadow_score": """
+        CREATE TABLE IF NOT EXISTS public.shadow_score (
+            id SERIAL PRIMARY KEY,
+            vitek_id INTEGER,
+            version INTEGER,
+            antimicrobial VARCHAR,
+            samples INTEGER,
+            disagreements INTEGER,
+            score_delta_sum DOUBLE PRECISION,
+            score_delta_max DOUBLE PRECISION,
+            create_at TIMESTAMP)
+        """,
+    # one candidate version per vitek, read by every worker
+    "shadow_candidate": """
+        CREATE TABLE IF NOT EXISTS public.shadow_candidate (
+            vitek_id INTEGER PRIMARY KEY,
+            version INTEGER,
+            update_at TIMESTAMP)
+        """,
+    # latest submitted_sample vocabulary of each vitek, backfilled by migrate_schema.py
+    "submitted_sample_latest": """
+        CREATE TABLE IF NOT EXISTS public.submitted_sample_latest (
+            vitek_id INTEGER PRIMARY KEY,
+            model_group_version INTEGER,
+            submitted_sample JSONB,
+            update_at TIMESTAMP)
+        """,
+    # tables created by the request path before the model group was logged
+    "prediction_log_model_group_id": """
+        ALTER TABLE public.prediction_log ADD COLUMN IF NOT EXISTS model_group_id INTEGER
+        """,
+    # raw score of every antimicrobial, answers only keeps those over the threshold
+    "prediction_log_scores": """
+        ALTER TABLE public.prediction_log ADD COLUMN IF NOT EXISTS scores JSONB
+        """,
+}
+
+
+def migrate(conn: Engine):
+    with conn.begin() as con:
+        for name, ddl in MIGRATIONS.items():
+            con.execute(sqlalchemy.text(ddl))
+            logger.info("schema: %s", name)
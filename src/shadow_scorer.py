@@ -0,0 +1,179 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+import pandas as pd
+from sqlalchemy.engine import Engine
+from src.repository import (fetch_all, run, append_frame, query_shadow_candidates,
+                            query_set_shadow_candidate, query_delete_shadow_candidate)
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowScorer:
+    """Score live predict inputs with a candidate model group version in the background and compare with the live models."""
+
+    def __init__(self, predictor, registry, conn: Engine, workers: int = 2, flush_interval: float = 60, max_pending: int = 256) -> None:
+        self.predictor = predictor
+        self.registry = registry
+        self.conn = conn
+        self.workers = workers
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        # vitek index -> candidate version, copy of public.shadow_candidate refreshed with every flush
+        self.candidates = {}
+        # (vitek index, version, antimicrobial) -> [samples, disagreements, score delta sum, score delta max]
+        self.pending_rows = {}
+        self.totals = {}
+
+        # metrics
+        self.pending = 0
+        self.scored = 0
+        self.dropped = 0
+        self.errors = 0
+        self.flushes = 0
+
+        # started by the first call of each process, threads do not survive a gunicorn fork
+        self.pid = None
+        self.executor = None
+
+    def start(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="shadow")
+                threading.Thread(target=self.run, name="shadow-flush",
+                                 daemon=True).start()
+                self.pending = 0
+                self.pid = os.getpid()
+
+    def set_candidate(self, vitek_id, version: int = None):
+        # the other workers see it at their next flush
+        if version is None or version == 0:
+            run(self.conn, query_delete_shadow_candidate, vitek_id=vitek_id + 1)
+        else:
+            run(self.conn, query_set_shadow_candidate, vitek_id=vitek_id + 1,
+                version=version, update_at=datetime.datetime.now())
+        self.refresh_candidates()
+
+    def refresh_candidates(self):
+        try:
+            candidates = {vitek_id - 1: version for vitek_id, version in fetch_all(
+                self.conn, query_shadow_candidates)}
+        except Exception:
+            logger.exception("shadow: candidates not refreshed")
+            with self.lock:
+                self.errors += 1
+            return
+        with self.lock:
+            self.candidates = candidates
+
+    def submit(self, data: Dict, vitek_id):
+        if self.pid != os.getpid():
+            self.start()
+        version = self.candidates.get(vitek_id)
+        if version is None:
+            return
+        # shadow work is dropped rather than queued behind live traffic
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending += 1
+        self.executor.submit(self.score, data, vitek_id, version)
+
+    def score(self, data: Dict, vitek_id, version: int):
+        try:
+            candidate = self.registry.get(vitek_id, version)
+            if candidate is None:
+                raise Exception(f"version {version} not found.")
+            with self.predictor.thread_budget.inference():
+                live_scores = self.predictor.ensure_state().scores([data], vitek_id)[0]
+                candidate_scores = candidate.scores([data], vitek_id)[0]
+            with self.lock:
+                self.scored += 1
+                for anti, live_score in live_scores.items():
+                    if anti not in candidate_scores:
+                        continue
+                    delta = abs(float(candidate_scores[anti]) - float(live_score))
+                    disagree = int((live_score >= 0.5) != (candidate_scores[anti] >= 0.5))
+                    for rows in [self.pending_rows, self.totals]:
+                        row = rows.setdefault((vitek_id, version, anti), [0, 0, 0.0, 0.0])
+                        row[0] += 1
+                        row[1] += disagree
+                        row[2] += delta
+                        row[3] = max(row[3], delta)
+        except Exception:
+            logger.exception("shadow: version %d failed", version)
+            with self.lock:
+                self.errors += 1
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def run(self):
+        while True:
+            self.refresh_candidates()
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            rows = self.pending_rows
+            self.pending_rows = {}
+        if len(rows) == 0:
+            return
+
+        # One batch insert per flush
+        create_at = datetime.datetime.now()
+        shadow_score = pd.DataFrame([{
+            "vitek_id": vitek_id + 1,
+            "version": version,
+            "antimicrobial": anti,
+            "samples": row[0],
+            "disagreements": row[1],
+            "score_delta_sum": row[2],
+            "score_delta_max": row[3],
+            "create_at": create_at,
+        } for (vitek_id, version, anti), row in rows.items()])
+        try:
+            append_frame(self.conn, 'shadow_score', shadow_score)
+            with self.lock:
+                self.flushes += 1
+        except Exception:
+            logger.exception("shadow: flush failed")
+            with self.lock:
+                self.errors += 1
+                # kept for the next flush
+                for key, row in rows.items():
+                    current = self.pending_rows.get(key)
+                    if current is not None:
+                        row[0] += current[0]
+                        row[1] += current[1]
+                        row[2] += current[2]
+                        row[3] = max(row[3], current[3])
+                    self.pending_rows[key] = row
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "candidates": {["GN", "GP"][vitek_id]: version for vitek_id, version in self.candidates.items()},
+                "pending": self.pending,
+                "scored": self.scored,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "flushes": self.flushes,
+                "antimicrobials": [{
+                    "vitek": ["GN", "GP"][vitek_id],
+                    "version": version,
+                    "antimicrobial": anti.replace("_", "/"),
+                    "samples": row[0],
+                    "disagreement_rate": row[1] / row[0],
+                    "score_delta_mean": row[2] / row[0],
+                    "score_delta_max": row[3],
+                } for (vitek_id, version, anti), row in self.totals.items()],
+            }
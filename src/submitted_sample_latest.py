@@ -0,0 +1,51 @@
+import ast
+import datetime
+import json
+from sqlalchemy.engine import Engine
+from src.repository import (execute, transaction, fetch_all, fetch_column,
+                            query_submitted_sample_latest, query_submitted_sample_latest_binning,
+                            query_submitted_sample_by_name, query_set_submitted_sample_latest,
+                            query_delete_submitted_sample_latest, query_submitted_sample_latest_missing)
+
+
+def refresh_submitted_sample_latest(conn: Engine, vitek_id: int):
+    # Vocabulary of the latest model_group of the vitek, resolved to submitted_sample rows once here
+    def refresh(con):
+        rows = [tuple(row) for row in execute(
+            con, query_submitted_sample_latest_binning, vitek_id=vitek_id)]
+
+        if len(rows) == 0:
+            execute(con, query_delete_submitted_sample_latest, vitek_id=vitek_id)
+            return
+
+        names = set()
+        for _, schema in rows:
+            # schema is str() of a list of names
+            names.update(ast.literal_eval(schema))
+        samples = []
+        if len(names) > 0:
+            samples = [{"id": row[0], "name": row[1]} for row in execute(
+                con, query_submitted_sample_by_name, names=tuple(names))]
+
+        execute(con, query_set_submitted_sample_latest, vitek_id=vitek_id, version=rows[0][0],
+                submitted_sample=json.dumps(samples), update_at=datetime.datetime.now())
+    transaction(conn, refresh)
+
+
+def backfill_submitted_sample_latest(conn: Engine) -> int:
+    # model_groups written before the table existed, materialized once by migrate_schema.py
+    missing = fetch_column(conn, query_submitted_sample_latest_missing)
+    for vitek_id in missing:
+        refresh_submitted_sample_latest(conn, vitek_id)
+    return len(missing)
+
+
+def load_submitted_sample_latest(conn: Engine) -> list:
+    # Union of the latest vocabulary of every vitek, sorted by id
+    samples = {}
+    for _, submitted_sample in fetch_all(conn, query_submitted_sample_latest):
+        if isinstance(submitted_sample, str):
+            submitted_sample = json.loads(submitted_sample)
+        for sample in submitted_sample:
+            samples[sample["id"]] = sample
+    return [samples[id] for id in sorted(samples)]
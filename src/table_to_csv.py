@@ -1,27 +1,67 @@
 import pandas as pd
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.engine import Engine
 import sqlalchemy
+from src.drift_monitor import training_distribution
+from src.repository import fetch_column, query_latest_model_group_file
+
+logger = logging.getLogger(__name__)
 
 
 class TableToCsv:
 
-    def __init__(self, conn: Engine, vitek_id: int) -> None:
+    def __init__(self, conn: Engine, vitek_id: int, workers: int = 3, lazy: bool = False) -> None:
         self.conn = conn
         self.vitek_id = vitek_id
-        self.startup()
+        self.workers = workers
+        self.loaded = False
+        # value counts of the latest model group's reports, served by /api/drift
+        self.training = None
+        self.startup_lock = threading.Lock()
+        if not lazy:
+            self.startup()
+
+    def ensure_startup(self):
+        # Lazy mode, first caller builds the table
+        if not self.loaded:
+            with self.startup_lock:
+                if not self.loaded:
+                    self.startup()
+        return self
 
     def startup(self):
-        master_table = self.query_report_table()
-        answer_table = self.query_answer_table()
-        sir_table = self.query_sir_table()
-        self.table = master_table.join(answer_table, how="left")
-        self.table.loc[:, self.table.columns[self.table.columns.str.startswith(
-            "ans_")]] = self.table.loc[:, self.table.columns[self.table.columns.str.startswith(
+        # Report, answer and S/I/R queries in parallel
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            master_future = executor.submit(self.query_report_table)
+            answer_future = executor.submit(self.query_answer_table)
+            sir_future = executor.submit(self.query_sir_table)
+            master_table = master_future.result()
+            answer_table = answer_future.result()
+            sir_table = sir_future.result()
+        logger.info("table_to_csv %d: queries loaded in %.2fs",
+                    self.vitek_id, time.perf_counter() - start)
+
+        table = master_table.join(answer_table, how="left")
+        table.loc[:, table.columns[table.columns.str.startswith(
+            "ans_")]] = table.loc[:, table.columns[table.columns.str.startswith(
                 "ans_")]].fillna(False)
-        self.table = self.table.join(sir_table, how="left")
-        self.table.loc[:, self.table.columns[self.table.columns.str.startswith(
-            "S/I/R_")]] = self.table.loc[:, self.table.columns[self.table.columns.str.startswith(
+        table = table.join(sir_table, how="left")
+        table.loc[:, table.columns[table.columns.str.startswith(
+            "S/I/R_")]] = table.loc[:, table.columns[table.columns.str.startswith(
                 "S/I/R_")]].fillna("")
+        self.table = table
+        self.refresh_training()
+        self.loaded = True
+
+    def refresh_training(self):
+        # Once per table or model group load, not per /api/drift call
+        file_id = fetch_column(self.conn, query_latest_model_group_file, v_id=self.vitek_id)
+        self.training = training_distribution(
+            self.table[self.table["file_id"].isin(file_id)])
 
     def query_report_table(self):
         query = sqlalchemy.text("""
@@ -0,0 +1,75 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadBudget:
+    """XGBoost threads of each inference call and of training, inside one CPU budget."""
+
+    def __init__(self, cpu_budget: int = None, inference_threads: int = 1, training_threads: int = None, workers: int = 1) -> None:
+        # cpu_budget is for the host, every gunicorn worker gets its share
+        self.workers = max(1, workers)
+        self.cpu_budget = max(1, (cpu_budget or os.cpu_count() or 1) // self.workers)
+        self.inference_threads = inference_threads
+        # training keeps half of the budget by default, at least one inference call still fits next to it
+        self.training_threads = training_threads or max(
+            1, min(self.cpu_budget // 2, self.cpu_budget - self.inference_threads))
+
+        # metrics
+        self.lock = threading.Lock()
+        self.inference_active = 0
+        self.training_active = 0
+        self.threads_peak = 0
+
+    def max_in_flight(self) -> int:
+        # predictions that fit in the budget next to one training run
+        return max(1, (self.cpu_budget - self.training_threads) // self.inference_threads)
+
+    def check(self, max_in_flight: int, strict: bool = True):
+        # XGBoost threads over the budget only fight for the same cores
+        threads = max_in_flight * self.inference_threads + self.training_threads
+        if threads > self.cpu_budget:
+            message = (f"PREDICT_MAX_IN_FLIGHT x INFERENCE_THREADS + TRAINING_THREADS = {threads} "
+                       f"is over the budget of {self.cpu_budget} CPU per worker (CPU_BUDGET / WEB_CONCURRENCY).")
+            # limits set by the operator are refused, defaults on a too small host only warn
+            if strict:
+                raise Exception(message)
+            logger.warning(message)
+
+    def threads_in_use(self) -> int:
+        return self.inference_active * self.inference_threads + self.training_active * self.training_threads
+
+    @contextmanager
+    def use(self, kind: str):
+        with self.lock:
+            setattr(self, f"{kind}_active", getattr(self, f"{kind}_active") + 1)
+            self.threads_peak = max(self.threads_peak, self.threads_in_use())
+        try:
+            yield
+        finally:
+            with self.lock:
+                setattr(self, f"{kind}_active", getattr(self, f"{kind}_active") - 1)
+
+    def inference(self):
+        return self.use("inference")
+
+    def training(self):
+        return self.use("training")
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "cpu_budget": self.cpu_budget,
+                "workers": self.workers,
+                "inference_threads": self.inference_threads,
+                "training_threads": self.training_threads,
+                "inference_active": self.inference_active,
+                "training_active": self.training_active,
+                "threads_in_use": self.threads_in_use(),
+                "threads_peak": self.threads_peak,
+                "process_threads": threading.active_count(),
+            }
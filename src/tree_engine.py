@@ -0,0 +1,92 @@
+import json
+import numpy as np
+from xgboost import Booster
+
+
+class TreeEngine:
+    """Trees of several binary:logistic boosters flattened into arrays and traversed together with NumPy."""
+
+    def __init__(self, boosters: list, features_maps: list) -> None:
+        # node 0 is an empty leaf used to pad models with fewer trees
+        self.nodes = {"feature": [-1], "threshold": [0.0], "yes": [0], "no": [0],
+                      "missing": [0], "value": [0.0]}
+        self.depth = 0
+        roots = []
+        base_margin = []
+        for booster, features_map in zip(boosters, features_maps):
+            base_margin.append(self.base_margin(booster))
+            roots.append([self.add_tree(json.loads(tree), booster.feature_names, features_map)
+                          for tree in booster.get_dump(dump_format="json")])
+
+        trees = max(len(model_roots) for model_roots in roots)
+        self.roots = np.array([model_roots + [0] * (trees - len(model_roots)) for model_roots in roots],
+                              dtype=np.intp)
+        self.base_margin = np.array(base_margin, dtype=np.float32)
+        self.feature = np.array(self.nodes["feature"], dtype=np.intp)
+        self.threshold = np.array(self.nodes["threshold"], dtype=np.float32)
+        self.yes = np.array(self.nodes["yes"], dtype=np.intp)
+        self.no = np.array(self.nodes["no"], dtype=np.intp)
+        self.missing = np.array(self.nodes["missing"], dtype=np.intp)
+        self.value = np.array(self.nodes["value"], dtype=np.float32)
+        del self.nodes
+
+    def base_margin(self, booster: Booster) -> float:
+        config = json.loads(booster.save_config())["learner"]
+        if config["gradient_booster"]["name"] != "gbtree" or config["objective"]["name"] != "binary:logistic":
+            raise Exception("only gbtree binary:logistic models are supported.")
+        base_score = float(config["learner_model_param"]["base_score"])
+        return float(np.log(base_score / (1 - base_score)))
+
+    def add_tree(self, root: dict, feature_names: list, features_map: np.ndarray) -> int:
+        # Leaves point to themselves, so traversing past a leaf keeps it
+        stack = [(root, 0)]
+        indexes = {}
+        while len(stack) > 0:
+            node, depth = stack.pop()
+            index = len(self.nodes["feature"])
+            indexes[id(node)] = index
+            for key in self.nodes:
+                self.nodes[key].append(0)
+            self.depth = max(self.depth, depth)
+            if "leaf" in node:
+                self.nodes["feature"][index] = -1
+                self.nodes["value"][index] = node["leaf"]
+                self.nodes["yes"][index] = self.nodes["no"][index] = self.nodes["missing"][index] = index
+                continue
+            split = node["split"]
+            column = feature_names.index(split) if feature_names is not None else int(split[1:])
+            self.nodes["feature"][index] = features_map[column]
+            self.nodes["threshold"][index] = node["split_condition"]
+            stack += [(child, depth + 1) for child in node["children"]]
+
+        # children are known once every node has an index
+        stack = [root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if "leaf" in node:
+                continue
+            children = {child["nodeid"]: indexes[id(child)] for child in node["children"]}
+            index = indexes[id(node)]
+            self.nodes["yes"][index] = children[node["yes"]]
+            self.nodes["no"][index] = children[node["no"]]
+            self.nodes["missing"][index] = children[node["missing"]]
+            stack += node["children"]
+        return indexes[id(root)]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        # X is (rows, models, vocabulary), one input row per model
+        rows = np.arange(X.shape[0])[:, None, None]
+        models = np.arange(X.shape[1])[None, :, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0],) + self.roots.shape)
+        for _ in range(self.depth):
+            x = X[rows, models, self.feature[nodes]]
+            nodes = np.where(np.isnan(x), self.missing[nodes],
+                             np.where(x < self.threshold[nodes], self.yes[nodes], self.no[nodes]))
+        leaves = self.value[nodes]
+
+        # trees added one by one in float32 like XGBoost
+        margin = np.broadcast_to(self.base_margin, leaves.shape[:2]).copy()
+        for tree in range(leaves.shape[2]):
+            margin += leaves[:, :, tree]
+        return 1 / (1 + np.exp(-margin))
+
@@ -1,21 +1,31 @@
 import numpy as np
 import pandas as pd
 from sqlalchemy.engine import Engine
-import sqlalchemy
 from sklearn.model_selection import train_test_split
 from src.utility import cleanSubmittedSample
+from src.reference_cache import ReferenceCache
+from src.repository import (fetch_all, run, transaction, execute, append_frame,
+                            query_species, query_submitted_sample, query_bacteria_genus,
+                            query_antimicrobial_sir, query_all_sir_sub_type, query_antimicrobial_answer,
+                            query_insert_report, query_insert_submitted_sample, query_insert_bacteria_genus,
+                            query_insert_antimicrobial_sir, query_insert_antimicrobial_answer)
 
 
 class UploadTranformation:
-    def __init__(self, vitek_id: int, conn: Engine) -> None:
+    def __init__(self, vitek_id: int, conn: Engine, reference_cache: ReferenceCache = None) -> None:
         self.conn = conn
         self.vitek_id = vitek_id
+        self.reference_cache = reference_cache
+
+    def invalidate(self, *names):
+        # Cached reference endpoints must not miss the new row
+        if self.reference_cache is not None:
+            self.reference_cache.invalidate(*names)
 
     def tranform_species(self, series: pd.Series):
         series = series.str.strip().str.lower()
 
-        species = {row[1]: row[0] for row in pd.read_sql_query(
-            "SELECT id , name FROM public.species", self.conn).values}
+        species = {row[1]: row[0] for row in fetch_all(self.conn, query_species)}
 
         def clean_species(s: str):
             if s not in species.keys():
@@ -27,20 +37,16 @@ class UploadTranformation:
     def tranform_submitted_sample(self, series: pd.Series):
         series = series.str.strip().str.lower()
 
-        submitted_sample = {row[1]: row[0] for row in pd.read_sql_query(
-            "SELECT id , name FROM public.submitted_sample", self.conn).values}
+        submitted_sample = {row[1]: row[0] for row in fetch_all(self.conn, query_submitted_sample)}
 
         def clean_submitted_sample(sample: str):
             nonlocal submitted_sample
             sample = cleanSubmittedSample(sample)
 
             if sample not in submitted_sample.keys():
-                with self.conn.connect() as con:
-                    query = sqlalchemy.text(
-                        "INSERT INTO public.submitted_sample(name) VALUES (:name);")
-                    con.execute(query, name=sample)
-                submitted_sample = {row[1]: row[0] for row in pd.read_sql_query(
-                    "SELECT id , name FROM public.submitted_sample", self.conn).values}
+                run(self.conn, query_insert_submitted_sample, name=sample)
+                self.invalidate("submitted_sample")
+                submitted_sample = {row[1]: row[0] for row in fetch_all(self.conn, query_submitted_sample)}
             return submitted_sample[sample]
 
         return series.map(clean_submitted_sample)
@@ -48,8 +54,7 @@ class UploadTranformation:
     def tranform_bacteria_genus(self, series: pd.Series):
         series = series.str.strip().str.lower()
 
-        bacteria_genus = {row[1]: row[0] for row in pd.read_sql_query(
-            "SELECT id , name FROM public.bacteria_genus", self.conn).values}
+        bacteria_genus = {row[1]: row[0] for row in fetch_all(self.conn, query_bacteria_genus)}
 
         def clean_bacteria_genus(bact: str):
 
@@ -58,12 +63,9 @@ class UploadTranformation:
             bact = bact.split()[0]
 
             if bact not in bacteria_genus.keys():
-                with self.conn.connect() as con:
-                    query = sqlalchemy.text(
-                        "INSERT INTO public.bacteria_genus(name) VALUES (:name);")
-                    con.execute(query, name=bact)
-                bacteria_genus = {row[1]: row[0] for row in pd.read_sql_query(
-                    "SELECT id , name FROM public.bacteria_genus", self.conn).values}
+                run(self.conn, query_insert_bacteria_genus, name=bact)
+                self.invalidate("bacteria_genus")
+                bacteria_genus = {row[1]: row[0] for row in fetch_all(self.conn, query_bacteria_genus)}
             return bacteria_genus[bact]
 
         return series.map(clean_bacteria_genus)
@@ -75,13 +77,9 @@ class UploadTranformation:
         sir = sir[sir["sir_sub_type"].isin(['+', '-', 'S', 'I', 'R'])]
         sir["name"] = sir["name"].str.replace("S/I/R_", "")
 
-        query_sir = sqlalchemy.text(
-            "SELECT id , name , sir_type_id FROM public.antimicrobial_sir WHERE vitek_id = :v_id")
-        sir_name = {row[1]: row[0] for row in pd.read_sql_query(
-            query_sir, self.conn, params={"v_id": self.vitek_id}).values}
-
-        sir_type = {row[0]: row[2] for row in pd.read_sql_query(
-            query_sir, self.conn, params={"v_id": self.vitek_id}).values}
+        sirs = fetch_all(self.conn, query_antimicrobial_sir, v_id=self.vitek_id)
+        sir_name = {row[1]: row[0] for row in sirs}
+        sir_type = {row[0]: row[2] for row in sirs}
 
         def clean_tranform_sir_name(anti: str):
 
@@ -105,17 +103,13 @@ class UploadTranformation:
                 else:
                     return 0  # ผิดพลาด
 
-                with self.conn.connect() as con:
-                    query = sqlalchemy.text(
-                        "INSERT INTO public.antimicrobial_sir(vitek_id , name , sir_type_id) VALUES (:v_id,:name,:type);")
-                    con.execute(query, v_id=self.vitek_id,
-                                name=anti, type=sir_type)
-
-                sir_name = {row[1]: row[0] for row in pd.read_sql_query(
-                    query_sir, self.conn, params={"v_id": self.vitek_id}).values}
+                run(self.conn, query_insert_antimicrobial_sir, v_id=self.vitek_id,
+                    name=anti, type=sir_type)
+                self.invalidate("antimicrobial_sir")
 
-                sir_type = {row[0]: row[2] for row in pd.read_sql_query(
-                    query_sir, self.conn, params={"v_id": self.vitek_id}).values}
+                sirs = fetch_all(self.conn, query_antimicrobial_sir, v_id=self.vitek_id)
+                sir_name = {row[1]: row[0] for row in sirs}
+                sir_type = {row[0]: row[2] for row in sirs}
 
             return sir_name[anti]
 
@@ -125,8 +119,7 @@ class UploadTranformation:
         sir = sir.rename(
             {"index": "report_id", "name": "antimicrobial_id"}, axis=1)
 
-        sir_sub = {row[1]: (row[0], row[2]) for row in pd.read_sql_query(
-            "SELECT id , symbol , sir_type_id FROM public.sir_sub_type", self.conn).values}
+        sir_sub = {row[1]: (row[0], row[2]) for row in fetch_all(self.conn, query_all_sir_sub_type)}
 
         sir_sub_id = []
 
@@ -160,23 +153,17 @@ class UploadTranformation:
 
         ans = ans[ans["value"]]
 
-        query_ans = sqlalchemy.text(
-            "SELECT id , name FROM public.antimicrobial_answer WHERE vitek_id = :v_id")
-
-        ans_name = {row[1]: row[0] for row in pd.read_sql_query(
-            query_ans, self.conn, params={"v_id": self.vitek_id}).values}
+        ans_name = {row[1]: row[0] for row in fetch_all(
+            self.conn, query_antimicrobial_answer, v_id=self.vitek_id)}
 
         def clean_answer(ans: str):
 
             nonlocal ans_name
 
             if ans not in ans_name.keys():
-                with self.conn.connect() as con:
-                    query = sqlalchemy.text(
-                        "INSERT INTO public.antimicrobial_answer(vitek_id,name) VALUES (:v_id,:name);")
-                    con.execute(query, v_id=self.vitek_id, name=ans)
-                ans_name = {row[1]: row[0] for row in pd.read_sql_query(
-                    query_ans, self.conn, params={"v_id": self.vitek_id}).values}
+                run(self.conn, query_insert_antimicrobial_answer, v_id=self.vitek_id, name=ans)
+                ans_name = {row[1]: row[0] for row in fetch_all(
+                    self.conn, query_antimicrobial_answer, v_id=self.vitek_id)}
             return ans_name[ans]
 
         ans["name"] = ans["name"].map(clean_answer)
@@ -246,10 +233,9 @@ class UploadTranformation:
         index_train, index_test = self.split_train_test_bycase(report)
         report.loc[index_train, "type"] = "train"
         report.loc[index_test, "type"] = "test"
-        query = sqlalchemy.text("""
-        INSERT INTO public.report(hn , date_of_submission, report_issued_date, species_id, bacteria_genus_id,submitted_sample_id,vitek_id,type,file_id) 
-        VALUES (:hn , :date_of_submission, :report_issued_date, :species_id, :bacteria_genus_id,:submitted_sample_id,:vitek_id,:type,:file_id) RETURNING id""")
-        with self.conn.connect() as con:
+
+        # one transaction, the INSERT is prepared once for every row
+        def insert_report(con):
             id_arr = []
             for i in report.index:
                 new = {i: v for i, v in report.loc[i].items()}
@@ -260,11 +246,11 @@ class UploadTranformation:
                     new["submitted_sample_id"])
                 new["vitek_id"] = int(new["vitek_id"])
                 new["file_id"] = int(new["file_id"])
-                rs = con.execute(
-                    query, **new)
+                rs = execute(con, query_insert_report, **new)
                 for row in rs:
                     id_arr.append(row[0])
-            report["id"] = id_arr
+            return id_arr
+        report["id"] = transaction(self.conn, insert_report)
 
         def mapping_id(k):
             return {i: v for i,
@@ -272,11 +258,8 @@ class UploadTranformation:
 
         report_sir["report_id"] = report_sir["report_id"].map(mapping_id)
         report_ans["report_id"] = report_ans["report_id"].map(mapping_id)
-        report_sir.to_sql('report_sir', schema='public',
-                          con=self.conn, if_exists='append', index=False)
-        report_ans.to_sql('report_answer', schema='public',
-                          con=self.conn, if_exists='append', index=False)
+        append_frame(self.conn, 'report_sir', report_sir)
+        append_frame(self.conn, 'report_answer', report_ans)
         report_train = self.split_train_test_byanti(report, report_ans)
-        report_train.to_sql('report_train', schema='public',
-                            con=self.conn, if_exists='append', index=False)
+        append_frame(self.conn, 'report_train', report_train)
         return len(report)
@@ -0,0 +1,71 @@
+import itertools
+import numpy as np
+import pandas as pd
+from xgboost import XGBClassifier
+from src.model_store import MODEL_EXTENSION, save_model, load_booster
+
+SPECIES = ["dog", "cat"]
+SAMPLES = ["urine", "blood", "skin"]
+SIR = {"S/I/R_amikacin": ["S", "I", "R"], "S/I/R_imipenem": ["S", "R"], "S/I/R_gentamicin": ["S", "R"]}
+
+# antimicrobial -> submitted samples kept by its binning, the rest are "other"
+BINNING = {
+    "amoxicillin": ["urine", "blood", "skin"],
+    "cefalexin": ["urine", "blood"],
+    "enrofloxacin": ["urine"],
+    # knows "blood" again, but a sample binned to "other" before stays "other"
+    "marbofloxacin": ["urine", "blood"],
+}
+
+
+def model_schema(anti: str, rng: np.random.Generator) -> list:
+    # Columns of pd.get_dummies over the training reports, a different subset per model
+    schema = [f"species_{species}" for species in SPECIES]
+    # training column is bacteria_genus, predict sends bact_genus: never matched
+    schema += ["bacteria_genus_pseudomonas", "bacteria_genus_escherichia"]
+    schema += [f"submitted_sample_{sample}" for sample in BINNING[anti] + ["other"]]
+    schema += [f"{key}_{value}" for key, values in SIR.items() for value in values
+               if rng.random() < 0.8]
+    return schema
+
+
+def build_models(model_location, vitek: str = "GN", antis: list = None, seed: int = 0):
+    # Small XGBClassifiers saved the way ModelRetraining saves them
+    rng = np.random.default_rng(seed)
+    antis = antis or list(BINNING)
+    models = {}
+    for anti in antis:
+        schema = model_schema(anti, rng)
+        X = pd.DataFrame((rng.random((400, len(schema))) < 0.3).astype(np.uint8), columns=schema)
+        y = (X.values @ rng.normal(size=len(schema)) + rng.normal(size=len(X)) > 0.5).astype(int)
+        model = XGBClassifier(n_estimators=20, max_depth=3, learning_rate=0.3,
+                              random_state=0, verbosity=0)
+        model.fit(X, y)
+        model_path = f"{vitek}_{anti}{MODEL_EXTENSION}"
+        save_model(model, model_location, model_path, schema, BINNING[anti])
+        models[anti] = {"classifier": model, "schema": schema,
+                        "binning": BINNING[anti], "model_path": model_path}
+    return models
+
+
+def state_args(models: dict, model_location) -> tuple:
+    # PredictorState arguments with the GN models only
+    anti_names = [list(models), []]
+    models_schema = [{anti: model["schema"] for anti, model in models.items()}, {}]
+    binning = [{anti: model["binning"] for anti, model in models.items()}, {}]
+    model_paths = [{anti: model["model_path"] for anti, model in models.items()}, {}]
+    return (anti_names, models_schema, binning, model_paths,
+            lambda model_path: load_booster(model_location, model_path))
+
+
+def predict_inputs() -> list:
+    # Every species / sample combination, known and unknown values, with a few S/I/R panels
+    inputs = []
+    panels = [{}, {"S/I/R_amikacin": "S"}, {"S/I/R_amikacin": "R", "S/I/R_imipenem": "S"},
+              {"S/I/R_gentamicin": "R", "S/I/R_imipenem": "R", "S/I/R_colistin": "S"}]
+    for species, sample, panel in itertools.product(SPECIES + ["rabbit"], SAMPLES + ["csf"], panels):
+        data = {"species": species, "bact_genus": "pseudomonas",
+                "submitted_sample": sample, "vitek_id": "GN"}
+        data.update(panel)
+        inputs.append(data)
+    return inputs
@@ -0,0 +1,65 @@
+import itertools
+import numpy as np
+from src.drift_monitor import CountMinSketch, FeatureSketch
+
+
+def test_sketch_rows_collide_independently():
+    # values colliding in row 0 must not collide in every other row too
+    sketch = CountMinSketch(width=512, depth=4)
+    rng = np.random.default_rng(0)
+    values = ["".join(rng.choice(list("abcdefghijklmnopqrstuvwxyz0123456789"), 8)) for _ in range(3000)]
+    columns = {value: sketch.columns(value) for value in values}
+    row0 = {}
+    for value, cols in columns.items():
+        row0.setdefault(cols[0], []).append(value)
+    pairs = [(a, b) for group in row0.values() for a, b in itertools.combinations(group, 2)]
+    assert len(pairs) > 1000
+    every_row = sum(columns[a] == columns[b] for a, b in pairs)
+    # independent rows: 1 / 512^3 of the pairs
+    assert every_row <= 1
+
+
+def test_sketch_estimate_never_undercounts():
+    sketch = CountMinSketch(width=64, depth=4)
+    counts = {f"value-{i}": i % 7 + 1 for i in range(500)}
+    for value, count in counts.items():
+        sketch.add(value, count)
+    assert all(sketch.estimate(value) >= count for value, count in counts.items())
+
+
+def test_merge_across_max_values():
+    # "q" is in the sketch only of the second window, it must not keep the first window's exact count
+    first = FeatureSketch(max_values=3)
+    first.add("q")
+    second = FeatureSketch(max_values=3)
+    for value in ["x", "y", "z", "q"]:
+        second.add(value)
+    assert not second.exact and "q" not in second.counts
+
+    merged = FeatureSketch(max_values=3)
+    merged.merge(first)
+    merged.merge(second)
+    assert merged.total == 5
+    assert merged.estimate("q") == 2
+    assert all(merged.estimate(value) == 1 for value in ["x", "y", "z"])
+    assert not merged.exact
+
+
+def test_merge_of_exact_windows_stays_exact():
+    first = FeatureSketch(max_values=4)
+    second = FeatureSketch(max_values=4)
+    for value in ["a", "b", "a"]:
+        first.add(value)
+    for value in ["b", "c"]:
+        second.add(value)
+    first.merge(second)
+    assert first.exact and first.counts == {"a": 2, "b": 2, "c": 1}
+    assert first.estimate("d") == 0
+    # one more distinct value than max_values, the least frequent goes to the sketch
+    third = FeatureSketch(max_values=4)
+    for value in ["d", "e"]:
+        third.add(value)
+    first.merge(third)
+    assert not first.exact and len(first.counts) == 4
+    assert all(first.estimate(value) >= 1 for value in ["c", "d", "e"])
+    assert first.estimate("a") == 2
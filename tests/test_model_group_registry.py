@@ -0,0 +1,38 @@
+import pytest
+from src.model_group_registry import ModelGroupRegistry
+from src.predictor import PredictorState
+from tests.fixtures import build_models, state_args
+
+
+class FakePredictor:
+    # GN models only, like a version trained for GN
+    workers = 1
+
+    def __init__(self, models, model_location) -> None:
+        self.args = state_args(models, model_location)
+        self.calls = []
+
+    def load_state(self, generation, version, vitek_id=None):
+        self.calls.append((version, vitek_id))
+        anti_names, models_schema, binning, model_paths, loader = self.args
+        if vitek_id == 1:
+            return PredictorState(generation, [[], []], [{}, {}], [{}, {}], [{}, {}], loader, version)
+        return PredictorState(generation, anti_names, models_schema, binning, model_paths, loader, version)
+
+
+@pytest.fixture(scope="module")
+def models(tmp_path_factory):
+    model_location = tmp_path_factory.mktemp("models")
+    return build_models(model_location, seed=3), model_location
+
+
+def test_registry_loads_the_requested_vitek(models):
+    predictor = FakePredictor(*models)
+    registry = ModelGroupRegistry(predictor)
+    state = registry.get(0, 3)
+    assert state is not None and state.loaded()
+    assert registry.get(0, 3) is state
+    # the same version of the other vitek is its own entry
+    assert registry.get(1, 3) is None
+    assert predictor.calls == [(3, 0), (3, 1)]
+    assert registry.stats()["versions"] == [[1, 3]]
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from xgboost import XGBClassifier
+from src.model_store import (MODEL_EXTENSION, METADATA_EXTENSION, save_model, load_booster, load_booster_raw,
+                              load_metadata, remove_model, predict_proba, parse_list)
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    rng = np.random.default_rng(0)
+    X = (rng.random((200, 6)) < 0.4).astype(np.float32)
+    y = (X[:, 0] + X[:, 3] > 0.5).astype(int)
+    return XGBClassifier(n_estimators=10, max_depth=2, verbosity=0).fit(X, y), X
+
+
+def test_binary_and_json_models_load(classifier, tmp_path):
+    model, X = classifier
+    expected = model.predict_proba(X)[:, 1]
+    save_model(model, tmp_path, "anti" + MODEL_EXTENSION, ["species_dog", "submitted_sample_urine"], ["urine"])
+    # models saved before the binary format
+    model.get_booster().save_model(f"{tmp_path}/anti.json")
+    for model_path in ["anti" + MODEL_EXTENSION, "anti.json"]:
+        booster = load_booster(tmp_path, model_path, 1)
+        np.testing.assert_allclose(predict_proba(booster, X), expected, rtol=0, atol=1e-6)
+        # bundles load the same files from bytes
+        booster = load_booster_raw((tmp_path / model_path).read_bytes(), 1)
+        np.testing.assert_allclose(predict_proba(booster, X), expected, rtol=0, atol=1e-6)
+    # the model and its schema / binning sidecar
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "anti.json", "anti" + METADATA_EXTENSION, "anti" + MODEL_EXTENSION]
+    assert load_metadata(tmp_path, "anti" + MODEL_EXTENSION) == {
+        "schema": ["species_dog", "submitted_sample_urine"], "submitted_sample_binning": ["urine"]}
+    remove_model(tmp_path, "anti" + MODEL_EXTENSION)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["anti.json"]
+
+
+def test_parse_list_reads_literals_only():
+    assert parse_list("['species_dog', 'S/I/R_amikacin_S']") == ["species_dog", "S/I/R_amikacin_S"]
+    with pytest.raises(ValueError):
+        parse_list("__import__('os').getcwd()")
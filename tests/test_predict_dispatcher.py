@@ -0,0 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.predict_dispatcher import PredictDispatcher
+
+
+class RecordingPredictor:
+    def __init__(self):
+        self.calls = []
+
+    def score_batch(self, data, vitek_id, state=None):
+        self.calls.append((len(data), vitek_id, state))
+        return [{"state": state} for _ in data]
+
+
+def test_answers_come_from_the_callers_state():
+    # requests of different model group states are batched apart
+    predictor = RecordingPredictor()
+    dispatcher = PredictDispatcher(predictor, window_ms=50)
+    states = ["current", "version_3", "current", "version_3", None]
+    with ThreadPoolExecutor(max_workers=len(states)) as executor:
+        answers = list(executor.map(lambda state: dispatcher.predict({}, 0, state), states))
+    assert [answer["state"] for answer in answers] == states
+    assert sum(size for size, _, _ in predictor.calls) == len(states)
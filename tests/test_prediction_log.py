@@ -0,0 +1,47 @@
+import csv
+import json
+import numpy as np
+from src.prediction_log import PredictionLog
+
+
+class CopyConnection:
+    # raw_connection() of an engine, keeps what COPY reads
+    def __init__(self):
+        self.rows = []
+
+    def raw_connection(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def copy_expert(self, sql, buffer):
+        self.rows += list(csv.reader(buffer))
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_every_score_is_logged():
+    conn = CopyConnection()
+    log = PredictionLog(conn)
+    scores = {"amikacin": np.float32(0.91), "amoxicillin_clavulanic acid": np.float32(0.12)}
+    log.record({"species": "dog"}, 0, (7, 3), scores, {"amikacin": 91.0}, 0.002)
+    log.flush()
+    assert log.stats()["logged"] == 1
+    (row,) = conn.rows
+    assert row[1:4] == ["1", "7", "3"]
+    # the antimicrobial under the threshold keeps its score
+    logged = json.loads(row[5])
+    assert list(logged) == ["amikacin", "amoxicillin/clavulanic acid"]
+    assert abs(logged["amoxicillin/clavulanic acid"] - 0.12) < 1e-6
+    assert json.loads(row[6]) == {"amikacin": 91.0}
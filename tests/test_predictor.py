@@ -0,0 +1,102 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from src.predictor import Predictior, PredictorState
+from src.prediction_cache import PredictionCache
+from tests.fixtures import build_models, state_args, predict_inputs
+
+
+def get_dummies_dataframe_columns(new_df: pd.DataFrame, old_df: pd.DataFrame) -> pd.DataFrame:
+    old_df = old_df.filter(new_df.columns)
+    new_df = new_df.append(old_df)
+    new_df.fillna(0, inplace=True)
+    return new_df
+
+
+def legacy_scores(data: dict, models: dict) -> dict:
+    # The pd.get_dummies path of the original Predictior.predict
+    schema_all = set()
+    for model in models.values():
+        schema_all.update(model["schema"])
+    schema_df = pd.DataFrame(columns=list(schema_all))
+    data = pd.Series(data)
+    scores = {}
+    for anti, model in models.items():
+        if not data['submitted_sample'] in model["binning"]:
+            data['submitted_sample'] = "other"
+        dummies_data_origin = pd.get_dummies(pd.DataFrame(data).T)
+        dummies_df = get_dummies_dataframe_columns(schema_df, dummies_data_origin)
+        dummies_data = dummies_df.filter(model["schema"])
+        # object columns after append, newer XGBoost only takes numeric frames
+        scores[anti] = model["classifier"].predict_proba(dummies_data.astype(np.float32))[:, 1][0]
+    return scores
+
+
+def legacy_answer(scores: dict) -> dict:
+    result = [{"antimicrobial": anti.replace("_", '/'), "score": score}
+              for anti, score in scores.items() if score >= 0.5]
+    list_sorted = sorted(result, key=lambda item: item['score'], reverse=True)
+    return {item['antimicrobial']: round(float(item['score'])*100, 2) for item in list_sorted}
+
+
+@pytest.fixture(scope="module")
+def models(tmp_path_factory):
+    model_location = tmp_path_factory.mktemp("models")
+    return build_models(model_location), model_location
+
+
+@pytest.fixture(scope="module")
+def legacy(models):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        return [legacy_scores(data, models[0]) for data in predict_inputs()]
+
+
+def test_scores_match_get_dummies(models, legacy):
+    state = PredictorState(1, *state_args(*models))
+    scores = state.scores(predict_inputs(), 0)
+    for row, expected in zip(scores, legacy):
+        assert list(row) == list(expected)
+        for anti in expected:
+            assert np.float32(row[anti]) == np.float32(expected[anti])
+
+
+def test_answers_match_get_dummies(models, legacy):
+    state = PredictorState(1, *state_args(*models))
+    answers = state.predict_batch(predict_inputs(), 0)
+    assert answers == [legacy_answer(scores) for scores in legacy]
+    # the fixture must reach both sides of the threshold
+    assert any(len(answer) > 0 for answer in answers)
+    assert any(len(answer) < len(models[0]) for answer in answers)
+
+
+def test_submitted_sample_stays_other(models):
+    # "blood" is binned to "other" by enrofloxacin and marbofloxacin must see "other" too
+    state = PredictorState(1, *state_args(*models))
+    data = {"species": "dog", "bact_genus": "pseudomonas", "submitted_sample": "blood", "vitek_id": "GN"}
+    cols = state.sample_columns([data], 0)
+    features = state.features[0]
+    assert [features[col[0]] for col in cols] == [
+        "submitted_sample_blood", "submitted_sample_blood",
+        "submitted_sample_other", "submitted_sample_other"]
+
+
+def test_cache_key_ignores_unknown_values(models):
+    state = PredictorState(1, *state_args(*models))
+    data = {"species": "dog", "bact_genus": "pseudomonas", "submitted_sample": "csf", "vitek_id": "GN"}
+    other = dict(data, submitted_sample="unknown", bact_genus="escherichia", species="dog")
+    assert state.cache_key(data, 0) == state.cache_key(other, 0)
+    assert state.predict_batch([data], 0) == state.predict_batch([other], 0)
+
+
+def test_cached_scores_give_the_same_answers(models):
+    # the cache holds every score, answers are cut from them on each call
+    state = PredictorState(1, *state_args(*models))
+    predictor = Predictior(None, models[1], cache=PredictionCache(), lazy=True)
+    predictor.state = state
+    data = predict_inputs()
+    scores = predictor.score_batch(data, 0)
+    assert all(list(row) == list(models[0]) for row in scores)
+    assert predictor.predict_batch(data, 0) == state.predict_batch(data, 0)
+    assert predictor.cache.stats()["hits"] >= len(data) - len({state.cache_key(row, 0) for row in data})
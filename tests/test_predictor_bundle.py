@@ -0,0 +1,53 @@
+import json
+import zipfile
+import numpy as np
+import pytest
+from src.model_store import load_booster_raw, predict_proba
+from src.predictor import PredictorState
+from src.predictor_bundle import export_bundle, load_bundle
+from tests.fixtures import build_models, state_args
+
+
+@pytest.fixture(scope="module")
+def models(tmp_path_factory):
+    model_location = tmp_path_factory.mktemp("models")
+    return build_models(model_location, seed=2), model_location
+
+
+def bundle_version(path) -> str:
+    with zipfile.ZipFile(path) as bundle:
+        return json.loads(bundle.read("manifest.json"))["version"]
+
+
+def test_bundle_models_load_from_bytes(models, tmp_path):
+    state = PredictorState(1, *state_args(*models))
+    path = export_bundle(state, models[1], f"{tmp_path}/predictor.zip")
+    manifest, read = load_bundle(path)
+    for anti, model in manifest["vitek"]["GN"]["models"].items():
+        booster = load_booster_raw(read(model["model_path"]), 1)
+        classifier = models[0][anti]["classifier"]
+        X = (np.random.default_rng(0).random((50, len(model["schema"]))) < 0.5).astype(np.float32)
+        np.testing.assert_allclose(predict_proba(booster, X), classifier.predict_proba(X)[:, 1],
+                                   rtol=0, atol=1e-6)
+    # only the bundle, nothing extracted next to it
+    assert [p.name for p in tmp_path.iterdir()] == ["predictor.zip"]
+
+
+def test_bundle_version_follows_metadata(models, tmp_path):
+    models, model_location = models
+    args = state_args(models, model_location)
+    version = bundle_version(export_bundle(PredictorState(1, *args), model_location, f"{tmp_path}/a.zip"))
+    assert version == bundle_version(export_bundle(PredictorState(1, *args), model_location, f"{tmp_path}/b.zip"))
+
+    anti_names, models_schema, binning, model_paths, loader = args
+    rebinned = [{**binning[0], "enrofloxacin": ["urine", "blood"]}, {}]
+    changed = PredictorState(1, anti_names, models_schema, rebinned, model_paths, loader)
+    assert version != bundle_version(export_bundle(changed, model_location, f"{tmp_path}/c.zip"))
+
+    schema = [{**models_schema[0], "cefalexin": models_schema[0]["cefalexin"][:-1]}, {}]
+    changed = PredictorState(1, anti_names, schema, binning, model_paths, loader)
+    assert version != bundle_version(export_bundle(changed, model_location, f"{tmp_path}/d.zip"))
+
+    reordered = [list(reversed(anti_names[0])), []]
+    changed = PredictorState(1, reordered, models_schema, binning, model_paths, loader)
+    assert version != bundle_version(export_bundle(changed, model_location, f"{tmp_path}/e.zip"))
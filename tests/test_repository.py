@@ -0,0 +1,42 @@
+import pytest
+import sqlalchemy
+from src.repository import Query, NotPrepared, prepared
+
+
+class DriverError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+
+class RefusingConnection:
+    # PREPARE fails with the given SQLSTATE
+    def __init__(self, pgcode):
+        self.info = {}
+        self.pgcode = pgcode
+
+    def exec_driver_sql(self, sql, params=None):
+        raise sqlalchemy.exc.DBAPIError(sql, params, DriverError(self.pgcode))
+
+
+def test_repeated_parameters_keep_their_number():
+    named = Query("test_positional", "SELECT id FROM t WHERE a = :v_id AND b = (SELECT MAX(b) FROM t WHERE a = :v_id) AND c = :c")
+    assert named.prepare_sql == "SELECT id FROM t WHERE a = $1 AND b = (SELECT MAX(b) FROM t WHERE a = $1) AND c = $2"
+    assert named.execute_sql == "EXECUTE test_positional(%s, %s)"
+
+
+@pytest.mark.parametrize("pgcode", ["42601", "42P01", "0A000"])
+def test_permanent_refusal_runs_as_plain_text(pgcode):
+    named = Query("test_refused", "SELECT 1")
+    with pytest.raises(NotPrepared):
+        prepared(RefusingConnection(pgcode), named)
+    assert not named.preparable
+
+
+@pytest.mark.parametrize("pgcode", ["08006", "57014", "40001", None])
+def test_other_errors_propagate(pgcode):
+    # a dropped connection or a cancelled statement says nothing about the statement
+    named = Query("test_transient", "SELECT 1")
+    with pytest.raises(sqlalchemy.exc.DBAPIError):
+        prepared(RefusingConnection(pgcode), named)
+    assert named.preparable
@@ -0,0 +1,45 @@
+import pytest
+from src import shadow_scorer as shadow_module
+from src.shadow_scorer import ShadowScorer
+
+
+def test_failed_flush_keeps_rows(monkeypatch):
+    scorer = ShadowScorer(None, None, None)
+    writes = []
+
+    def append_frame(conn, table, frame):
+        if len(writes) == 0:
+            writes.append(None)
+            # rows scored while the insert runs are added to the kept ones
+            scorer.pending_rows[(0, 5, "amikacin")] = [1, 0, 0.1, 0.1]
+            scorer.pending_rows[(0, 5, "imipenem")] = [1, 1, 0.6, 0.6]
+            raise Exception("database is down")
+        writes.append(frame)
+
+    monkeypatch.setattr(shadow_module, "append_frame", append_frame)
+    scorer.pending_rows = {(0, 5, "amikacin"): [2, 1, 0.4, 0.3]}
+    scorer.flush()
+    assert scorer.errors == 1 and scorer.flushes == 0
+
+    scorer.flush()
+    assert scorer.flushes == 1 and scorer.pending_rows == {}
+    rows = writes[1].set_index("antimicrobial")
+    assert rows.loc["amikacin", ["samples", "disagreements"]].tolist() == [3, 1]
+    assert rows.loc["amikacin", "score_delta_sum"] == pytest.approx(0.5)
+    assert rows.loc["amikacin", "score_delta_max"] == pytest.approx(0.3)
+    assert rows.loc["imipenem", "samples"] == 1
+
+
+def test_candidates_come_from_the_database(monkeypatch):
+    monkeypatch.setattr(shadow_module, "fetch_all", lambda conn, named: [(1, 5), (2, 3)])
+    scorer = ShadowScorer(None, None, None)
+    scorer.refresh_candidates()
+    assert scorer.candidates == {0: 5, 1: 3}
+
+    def fetch_all(conn, named):
+        raise Exception("database is down")
+
+    # a failed read keeps the last candidates
+    monkeypatch.setattr(shadow_module, "fetch_all", fetch_all)
+    scorer.refresh_candidates()
+    assert scorer.candidates == {0: 5, 1: 3} and scorer.errors == 1
@@ -0,0 +1,34 @@
+import logging
+import pytest
+from src.thread_budget import ThreadBudget
+
+
+def test_max_in_flight_fits_the_budget():
+    budget = ThreadBudget(8, 1)
+    assert budget.training_threads == 4
+    assert budget.max_in_flight() == 4
+    budget.check(budget.max_in_flight())
+    assert ThreadBudget(8, 2, 2).max_in_flight() == 3
+
+
+def test_budget_is_split_between_workers():
+    budget = ThreadBudget(8, 1, workers=4)
+    assert budget.cpu_budget == 2
+    assert budget.training_threads == 1 and budget.max_in_flight() == 1
+    budget.check(budget.max_in_flight())
+
+
+def test_config_over_the_budget_is_refused():
+    with pytest.raises(Exception, match="over the budget"):
+        ThreadBudget(8, 1).check(5)
+    with pytest.raises(Exception, match="over the budget"):
+        ThreadBudget(8, 2, 4).check(3)
+
+
+def test_defaults_on_one_cpu_only_warn(caplog):
+    # the baseline served on a single CPU host, the defaults must still start there
+    budget = ThreadBudget(1, 1)
+    assert budget.training_threads == 1 and budget.max_in_flight() == 1
+    with caplog.at_level(logging.WARNING):
+        budget.check(budget.max_in_flight(), strict=False)
+    assert "over the budget" in caplog.text
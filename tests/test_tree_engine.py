@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from src.predictor import PredictorState
+from src.tree_engine import TreeEngine
+from tests.fixtures import build_models, state_args, predict_inputs
+
+
+@pytest.fixture(scope="module")
+def models(tmp_path_factory):
+    model_location = tmp_path_factory.mktemp("models")
+    return build_models(model_location, seed=1), model_location
+
+
+def test_engine_matches_predict_proba(models):
+    # every model of the vitek flattened together, against each XGBClassifier on random one-hot rows
+    state = PredictorState(1, *state_args(*models))
+    state.load_models(1)
+    antis = state.anti_names[0]
+    features_maps = [state.models_index[0][anti] for anti in antis]
+    engine = TreeEngine([state.model(0, anti) for anti in antis], features_maps)
+
+    rng = np.random.default_rng(0)
+    X = (rng.random((5000, len(antis), len(state.features[0]))) < 0.3).astype(np.float32)
+    proba = engine.predict_proba(X)
+    for j, (anti, features_map) in enumerate(zip(antis, features_maps)):
+        expected = models[0][anti]["classifier"].predict_proba(X[:, j, features_map])[:, 1]
+        np.testing.assert_allclose(proba[:, j], expected, rtol=0, atol=1e-6)
+
+
+def test_engine_answers_match_xgboost(models):
+    data = predict_inputs()
+    xgboost_state = PredictorState(1, *state_args(*models))
+    engine_state = PredictorState(2, *state_args(*models), engine=True)
+    engine_state.load_models(1)
+    assert engine_state.engines[0] is not None
+    assert engine_state.predict_batch(data, 0) == xgboost_state.predict_batch(data, 0)